@@ -0,0 +1,314 @@
+"""
+Content-addressed Cache for Figures and Tables
+Author: Ing. Patricio Palacios Msc.
+Date: October 19, 2026
+
+Description:
+------------
+The plotting and table functions rebuild their outputs on every call even
+when nothing changed. This module caches those artifacts under a key that
+hashes:
+
+- the fingerprints (path, size, mtime) of the input files,
+- the parameters of the call (PoEs, periods, PRY name, title, ...),
+- the name of the function, the installed package version and a hash of
+  the package source code (so an edited working copy never reuses stale
+  artifacts).
+
+A hit restores the stored SVG/PDF files to the requested paths (or leaves
+them untouched when they are already identical) or returns the stored
+table. Entries are evicted least recently used first once the cache exceeds
+`max_bytes`.
+
+Caching is opt-in: the functions only use a cache when called with
+`cache=True` (the default cache) or an `ArtifactCache` instance. The
+default cache lives in $OPENQUAKEUHS_CACHE_DIR, or ~/.cache/OpenQuakeUHS.
+"""
+
+import filecmp
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import pandas as pd
+
+_MANIFEST = "manifest.json"
+_TABLE = "table.pkl"
+_default_cache = None
+_code_hash = None
+
+
+def package_version():
+    """Returns the installed version of OpenQuakeUHS ('dev' when not installed)."""
+    try:
+        from importlib.metadata import PackageNotFoundError, version
+    except ImportError:
+        return "dev"
+    try:
+        return version("OpenQuakeUHS")
+    except PackageNotFoundError:
+        return "dev"
+
+
+def code_hash():
+    """
+    Returns the SHA-256 of the package source files (computed once per
+    process), so artifacts are invalidated when the code that produced
+    them changes.
+    """
+    global _code_hash
+    if _code_hash is None:
+        package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        digest = hashlib.sha256()
+        for dirpath, dirnames, filenames in os.walk(package_root):
+            dirnames.sort()
+            for name in sorted(filenames):
+                if not name.endswith(".py"):
+                    continue
+                path = os.path.join(dirpath, name)
+                digest.update(os.path.relpath(path, package_root).encode("utf-8"))
+                with open(path, "rb") as f:
+                    digest.update(f.read())
+        _code_hash = digest.hexdigest()
+    return _code_hash
+
+
+def file_fingerprint(path):
+    """
+    Returns (absolute path, size, mtime_ns) of a file, or (path, None, None)
+    when it does not exist.
+    """
+    path = os.path.abspath(path)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return (path, None, None)
+    return (path, st.st_size, st.st_mtime_ns)
+
+
+def artifact_key(name, files, params=None):
+    """
+    Builds the cache key of an artifact.
+
+    Parameters:
+    -----------
+    name : str
+        Name of the producing function.
+    files : iterable of str
+        Input files.
+    params : dict, optional
+        Parameters affecting the output (must be JSON serializable or have a
+        stable repr).
+
+    Returns:
+    --------
+    str
+        SHA-256 hex digest.
+    """
+    payload = {
+        "name": name,
+        "version": package_version(),
+        "code": code_hash(),
+        "files": [file_fingerprint(f) for f in files],
+        "params": params or {},
+    }
+    text = json.dumps(payload, sort_keys=True, default=repr)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _dir_size(path):
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+
+class ArtifactCache:
+    """
+    On-disk store of rendered figures and derived tables keyed by
+    `artifact_key`, with a total size cap and LRU eviction.
+    """
+    def __init__(self, root=None, max_bytes=512 * 1024 ** 2):
+        """
+        Parameters:
+        - root (str): Cache folder ($OPENQUAKEUHS_CACHE_DIR or ~/.cache/OpenQuakeUHS by default)
+        - max_bytes (int): Maximum total size of the stored artifacts
+        """
+        if root is None:
+            root = os.environ.get("OPENQUAKEUHS_CACHE_DIR") or os.path.join(
+                os.path.expanduser("~"), ".cache", "OpenQuakeUHS")
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(self.root, exist_ok=True)
+
+    def _entry(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def _manifest(self, key):
+        """Returns the manifest of an entry and marks it as recently used."""
+        path = os.path.join(self._entry(key), _MANIFEST)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            os.utime(path)  # el mtime del manifiesto marca el último uso
+        except (OSError, ValueError):
+            return None
+        return manifest
+
+    def _commit(self, key, fill):
+        """
+        Writes an entry into a temporary folder with `fill(folder)` (which
+        returns the manifest) and moves it into place atomically.
+        """
+        entry = self._entry(key)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=os.path.dirname(entry), prefix=".tmp-")
+        try:
+            manifest = fill(tmp)
+            manifest["created"] = time.time()
+            with open(os.path.join(tmp, _MANIFEST), "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+            if os.path.isdir(entry):
+                shutil.rmtree(entry, ignore_errors=True)
+            os.replace(tmp, entry)
+        except Exception:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        self.evict()
+
+    # --- Figuras ---
+    def store_files(self, key, paths):
+        """
+        Stores copies of the output files of an artifact.
+
+        Parameters:
+        - key (str): Key from `artifact_key`
+        - paths (list of str): Files written by the producing function
+        """
+        def fill(folder):
+            names = []
+            for i, path in enumerate(paths):
+                name = f"{i}{os.path.splitext(path)[1]}"
+                shutil.copy2(path, os.path.join(folder, name))
+                names.append(name)
+            return {"type": "files", "files": names}
+
+        self._commit(key, fill)
+
+    def restore_files(self, key, paths):
+        """
+        Restores the files of a cached artifact to `paths` (same order as in
+        `store_files`), skipping targets that are already identical.
+
+        Returns:
+        - list of str or None: `paths` on a hit, None on a miss
+        """
+        manifest = self._manifest(key)
+        if manifest is None or manifest.get("type") != "files" or len(manifest["files"]) != len(paths):
+            return None
+
+        entry = self._entry(key)
+        for name, path in zip(manifest["files"], paths):
+            source = os.path.join(entry, name)
+            if not os.path.exists(source):
+                return None
+            if os.path.exists(path) and filecmp.cmp(source, path, shallow=False):
+                continue
+            folder = os.path.dirname(os.path.abspath(path))
+            os.makedirs(folder, exist_ok=True)
+            shutil.copyfile(source, path)
+        return list(paths)
+
+    # --- Tablas ---
+    def store_table(self, key, df):
+        """Stores a DataFrame under `key`."""
+        def fill(folder):
+            df.to_pickle(os.path.join(folder, _TABLE))
+            return {"type": "table"}
+
+        self._commit(key, fill)
+
+    def load_table(self, key):
+        """Returns the DataFrame stored under `key`, or None on a miss."""
+        manifest = self._manifest(key)
+        if manifest is None or manifest.get("type") != "table":
+            return None
+        try:
+            return pd.read_pickle(os.path.join(self._entry(key), _TABLE))
+        except (OSError, ValueError):
+            return None
+
+    # --- Mantenimiento ---
+    def entries(self):
+        """
+        Returns the cached entries, least recently used first.
+
+        Returns:
+        - list of (key, last use, size in bytes)
+        """
+        out = []
+        for prefix in os.listdir(self.root):
+            folder = os.path.join(self.root, prefix)
+            if len(prefix) != 2 or not os.path.isdir(folder):
+                continue
+            for key in os.listdir(folder):
+                entry = os.path.join(folder, key)
+                try:
+                    used = os.path.getmtime(os.path.join(entry, _MANIFEST))
+                except OSError:
+                    continue  # entrada incompleta
+                out.append((key, used, _dir_size(entry)))
+        return sorted(out, key=lambda e: e[1])
+
+    def size(self):
+        """Total size of the cached entries [bytes]."""
+        return sum(e[2] for e in self.entries())
+
+    def evict(self):
+        """
+        Removes least recently used entries until the cache fits `max_bytes`.
+
+        Returns:
+        - int: Number of removed entries
+        """
+        entries = self.entries()
+        total = sum(e[2] for e in entries)
+        removed = 0
+        for key, _, size in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(self._entry(key), ignore_errors=True)
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self):
+        """Removes every cached entry."""
+        for key, _, _ in self.entries():
+            shutil.rmtree(self._entry(key), ignore_errors=True)
+
+
+def default_cache():
+    """Returns the shared `ArtifactCache` of the process."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ArtifactCache()
+    return _default_cache
+
+
+def resolve_cache(cache):
+    """
+    Maps the `cache` argument of the plotting/table functions to a cache:
+    False or None -> no caching, True -> `default_cache()`, or the given
+    instance.
+    """
+    if cache is None or cache is False:
+        return None
+    return default_cache() if cache is True else cache
@@ -0,0 +1,224 @@
+"""
+Concurrent Loader for OpenQuake Outputs
+Author: Ing. Patricio Palacios Msc.
+Date: October 19, 2026
+
+Description:
+------------
+This module reads many OpenQuake CSV outputs concurrently. On NFS or
+object-store mounts the per-file latency dominates, so files are opened and
+parsed in a thread pool driven by asyncio, with a bounded number of reads in
+flight. Parsed files are handed to the stack builders of `hazard_stack` as
+soon as they complete.
+
+The blocking loaders can be called from plain scripts and from notebooks
+(where an event loop is already running); the `aload_*` coroutines are for
+code that is itself asynchronous. `read_files` reads any list of files with
+any reader concurrently and returns the results in input order (used by
+`validation` to parse files it does not stack).
+
+Typical usage:
+
+    stack = load_hazard_curves("outputs/hazard_curves", max_in_flight=64)
+    uhs = load_uhs("outputs/uhs")
+    parsed = read_files(paths, read_uhs_file)   # [(path, result, error), ...]
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from OpenQuakeUHS.core.folder_classifier import classify_csv_files
+from OpenQuakeUHS.core.hazard_classifier import classify_hazard_files
+from OpenQuakeUHS.core.hazard_stack import (
+    HazardCurveStackBuilder,
+    UHSStackBuilder,
+    group_by_calc,
+    parse_output_filename,
+    read_hazard_curve_file,
+    read_uhs_file,
+)
+
+
+async def iter_parsed_files(paths, reader, max_in_flight=32, executor=None):
+    """
+    Reads files concurrently and yields them in completion order.
+
+    Parameters:
+    -----------
+    paths : iterable of str
+        Files to read.
+    reader : callable
+        Function `reader(path)` returning the parsed content of a file.
+    max_in_flight : int
+        Maximum number of files being read at the same time.
+    executor : concurrent.futures.Executor, optional
+        Executor running the reads. A thread pool of `max_in_flight` workers
+        is created (and shut down) when omitted.
+
+    Yields:
+    -------
+    (path, result, error)
+        `result` is the parsed content, or None if the read raised `error`.
+    """
+    if max_in_flight < 1:
+        raise ValueError("max_in_flight must be at least 1.")
+
+    loop = asyncio.get_running_loop()
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=max_in_flight)
+
+    pending = {}
+    paths = iter(paths)
+
+    def submit_next():
+        path = next(paths, None)
+        if path is None:
+            return False
+        future = loop.run_in_executor(executor, reader, path)
+        pending[future] = path
+        return True
+
+    try:
+        while len(pending) < max_in_flight and submit_next():
+            pass
+
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                path = pending.pop(future)
+                error = future.exception()
+                yield path, (None if error else future.result()), error
+                submit_next()
+    finally:
+        for future in pending:
+            future.cancel()
+        if own_executor:
+            executor.shutdown(wait=False)
+
+
+def read_files(paths, reader, max_in_flight=32, executor=None):
+    """
+    Blocking counterpart of `iter_parsed_files`: reads the files concurrently
+    and returns them in the order of `paths`.
+
+    Returns:
+    --------
+    list of (path, result, error)
+        `result` is the parsed content, or None if the read raised `error`.
+    """
+    paths = list(paths)
+
+    async def gather():
+        return [item async for item in iter_parsed_files(paths, reader, max_in_flight, executor)]
+
+    position = {path: i for i, path in enumerate(paths)}
+    return sorted(_run(gather()), key=lambda item: position[item[0]])
+
+
+async def _build_stack(paths, reader, builder, max_in_flight, executor):
+    async for path, result, error in iter_parsed_files(paths, reader, max_in_flight, executor):
+        if error is not None:
+            print(f"[load] Skipping {path}: {error}")
+            continue
+        builder.add(path, result)
+    return builder.build()
+
+
+def _run(coro):
+    """
+    Runs a coroutine to completion from synchronous code. Inside a running
+    event loop (e.g. a Jupyter kernel) it runs on a new loop in a worker
+    thread, so the blocking loaders work there as well.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as runner:
+        return runner.submit(asyncio.run, coro).result()
+
+
+async def aload_hazard_curves(files, max_in_flight=32, executor=None):
+    """
+    Coroutine version of `load_hazard_curves` taking an explicit list of files.
+    """
+    paths = [f for f in files if (parse_output_filename(f) or {}).get("output") == "hazard_curve"]
+    return await _build_stack(paths, read_hazard_curve_file, HazardCurveStackBuilder(),
+                              max_in_flight, executor)
+
+
+async def aload_uhs(files, max_in_flight=32, executor=None):
+    """
+    Coroutine version of `load_uhs` taking an explicit list of files.
+    """
+    paths = [f for f in files if (parse_output_filename(f) or {}).get("output") == "hazard_uhs"]
+    return await _build_stack(paths, read_uhs_file, UHSStackBuilder(),
+                              max_in_flight, executor)
+
+
+def _select_calc(files, calc_id, folder_path):
+    """Keeps the files of one calculation (the only one when `calc_id` is None)."""
+    groups = group_by_calc(files)
+    if calc_id is None:
+        if len(groups) > 1:
+            raise ValueError(f"{folder_path} holds the calculations {list(groups)}; "
+                             f"choose one with `calc_id`.")
+        return files
+    if calc_id not in groups:
+        raise ValueError(f"Calculation {calc_id} not found in {folder_path}.")
+    return groups[calc_id]
+
+
+def load_hazard_curves(folder_path, include_rlz=True, max_in_flight=32, executor=None, calc_id=None):
+    """
+    Loads every hazard curve file of a folder concurrently into a stack.
+
+    Parameters:
+    -----------
+    folder_path : str
+        Directory with 'hazard_curve-*' / 'quantile_curve-*' CSV files.
+    include_rlz : bool
+        Whether to read the realization files.
+    max_in_flight : int
+        Maximum number of files being read at the same time.
+    executor : concurrent.futures.Executor, optional
+        Executor running the reads.
+    calc_id : int, optional
+        Calculation to load (required when the folder holds several).
+
+    Returns:
+    --------
+    HazardCurveStack
+    """
+    mean_files, rlz_files, quantile_files = classify_hazard_files(folder_path)
+    files = mean_files + quantile_files + (rlz_files if include_rlz else [])
+    files = _select_calc(files, calc_id, folder_path)
+    return _run(aload_hazard_curves(files, max_in_flight, executor))
+
+
+def load_uhs(folder_path, include_rlz=True, max_in_flight=32, executor=None, calc_id=None):
+    """
+    Loads every UHS file of a folder concurrently into a stack.
+
+    Parameters:
+    -----------
+    folder_path : str
+        Directory with 'hazard_uhs-*' / 'quantile_uhs-*' CSV files.
+    include_rlz : bool
+        Whether to read the realization files.
+    max_in_flight : int
+        Maximum number of files being read at the same time.
+    executor : concurrent.futures.Executor, optional
+        Executor running the reads.
+    calc_id : int, optional
+        Calculation to load (required when the folder holds several).
+
+    Returns:
+    --------
+    UHSStack
+    """
+    mean_files, rlz_files, quantile_files = classify_csv_files(folder_path)
+    files = mean_files + quantile_files + (rlz_files if include_rlz else [])
+    files = _select_calc(files, calc_id, folder_path)
+    return _run(aload_uhs(files, max_in_flight, executor))
@@ -0,0 +1,355 @@
+"""
+Calculation Diff Engine for Regression Testing
+Author: Ing. Patricio Palacios Msc.
+Date: October 19, 2026
+
+Description:
+------------
+This module compares two OpenQuake calculations (e.g. before and after a
+source-model update) across sites, IMTs, PoEs and realizations:
+
+- hazard curves: PoE per (kind, site, imt, level)
+- UHS: Sa per (kind, site, poe, period)
+- disaggregation: mean/modal magnitude, distance and epsilon per site
+
+Outputs are aligned by site coordinates, kind, IMT, PoE and period, the
+difference and ratio statistics are computed with array reductions, and
+values outside `rtol`/`atol` (numpy.isclose semantics) are flagged.
+
+`diff_hazard_curve_stacks` / `diff_uhs_stacks` work on in-memory stacks;
+`diff_calculation_folders` streams through both export folders one file
+pair (or one site) at a time, so calculations larger than memory can be
+compared.
+
+Both return a compact report (one row per compared group) and an outlier
+table capped at `max_outliers` rows.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from OpenQuakeUHS.core.disaggregation_batch import summarize_site
+from OpenQuakeUHS.core.disaggregation_loader import list_disaggregation_files
+from OpenQuakeUHS.core.hazard_stack import (
+    parse_output_filename,
+    read_hazard_curve_file,
+    read_uhs_file,
+)
+
+_DISAGG_FIELDS = ("mean_mag", "mean_dist", "mean_eps", "mode_mag", "mode_dist", "mode_eps")
+_DISAGG_ATOL = {"mag": 0.1, "dist": 5.0, "eps": 0.1}
+
+
+def _align_sites(lons_a, lats_a, lons_b, lats_b, decimals=4):
+    """Returns the indices of the sites present in both calculations."""
+    index_b = {(round(float(lo), decimals), round(float(la), decimals)): j
+               for j, (lo, la) in enumerate(zip(lons_b, lats_b))}
+    ia, ib = [], []
+    for i, (lo, la) in enumerate(zip(lons_a, lats_a)):
+        j = index_b.get((round(float(lo), decimals), round(float(la), decimals)))
+        if j is not None:
+            ia.append(i)
+            ib.append(j)
+    return np.array(ia, dtype=int), np.array(ib, dtype=int)
+
+
+def _align_values(values_a, values_b, rtol=1e-6):
+    """Returns the indices of the matching values of two 1D arrays."""
+    values_a = np.asarray(values_a, dtype=float)
+    values_b = np.asarray(values_b, dtype=float)
+    close = np.isclose(values_a[:, None], values_b[None, :], rtol=rtol, atol=0.0)
+    ia, ib = np.nonzero(close)
+    _, first = np.unique(ia, return_index=True)
+    return ia[first], ib[first]
+
+
+def compare_arrays(a, b, rtol, atol, axis=None):
+    """
+    Difference and ratio statistics of two aligned arrays, reduced over `axis`.
+
+    Parameters:
+    -----------
+    a, b : ndarray
+        Reference and new values (same shape, np.nan where missing).
+    rtol, atol : float
+        Tolerances; values with not isclose(b, a, rtol, atol) are outliers.
+    axis : int or tuple, optional
+        Axes reduced by the statistics (all when omitted).
+
+    Returns:
+    --------
+    stats : dict of ndarray
+        'n_values', 'n_outliers', 'max_abs_diff', 'max_rel_diff',
+        'min_ratio', 'max_ratio', 'mean_ratio' (geometric).
+    outliers : ndarray of bool
+        Outlier mask with the shape of `a`.
+    """
+    a = np.asarray(a, dtype=float)
+    b = np.asarray(b, dtype=float)
+    valid = np.isfinite(a) & np.isfinite(b)
+    positive = valid & (a > 0) & (b > 0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        abs_diff = np.where(valid, np.abs(b - a), np.nan)
+        rel_diff = np.where(valid & (a != 0), abs_diff / np.abs(a), np.nan)
+        log_ratio = np.where(positive, np.log(b) - np.log(a), np.nan)
+        outliers = valid & ~np.isclose(b, a, rtol=rtol, atol=atol)
+
+        def nanreduce(func, x):
+            fill = -np.inf if func is np.max else np.inf
+            out = func(np.where(np.isnan(x), fill, x), axis=axis, initial=fill)
+            return np.where(np.isinf(out), np.nan, out)
+
+        n_pos = positive.sum(axis=axis)
+        stats = {
+            "n_values": valid.sum(axis=axis),
+            "n_outliers": outliers.sum(axis=axis),
+            "max_abs_diff": nanreduce(np.max, abs_diff),
+            "max_rel_diff": nanreduce(np.max, rel_diff),
+            "min_ratio": np.exp(nanreduce(np.min, log_ratio)),
+            "max_ratio": np.exp(nanreduce(np.max, log_ratio)),
+            "mean_ratio": np.where(n_pos > 0,
+                                   np.exp(np.nansum(log_ratio, axis=axis) / np.maximum(n_pos, 1)),
+                                   np.nan),
+        }
+    return stats, outliers
+
+
+def _report_rows(stats, labels):
+    """Turns flattened statistics into report rows (one per label dict)."""
+    rows = []
+    flat = {k: np.ravel(v) for k, v in stats.items()}
+    for n, label in enumerate(labels):
+        row = dict(label)
+        row["status"] = "ok" if flat["n_outliers"][n] == 0 else "outliers"
+        row.update({k: v[n].item() for k, v in flat.items()})
+        rows.append(row)
+    return rows
+
+
+def _collect_outliers(mask, columns, max_rows):
+    """Returns up to `max_rows` outlier records built by `columns(idx)`."""
+    idx = np.argwhere(mask)[:max_rows]
+    return [columns(tuple(i)) for i in idx]
+
+
+def diff_hazard_curve_stacks(stack_a, stack_b, rtol=0.05, atol=1e-6, max_outliers=1000):
+    """
+    Compares two `HazardCurveStack` objects.
+
+    Returns:
+    --------
+    report : pandas.DataFrame
+        One row per (kind, imt).
+    outliers : pandas.DataFrame
+        Flagged (kind, site, imt, level) values.
+    """
+    kinds = [k for k in stack_a.kinds if k in stack_b.kinds]
+    imts = [m for m in stack_a.imts if m in stack_b.imts]
+    sa_idx, sb_idx = _align_sites(stack_a.lons, stack_a.lats, stack_b.lons, stack_b.lats)
+
+    ka = [stack_a.kinds.index(k) for k in kinds]
+    kb = [stack_b.kinds.index(k) for k in kinds]
+    ma = [stack_a.imts.index(m) for m in imts]
+    mb = [stack_b.imts.index(m) for m in imts]
+
+    a = stack_a.poes[np.ix_(ka, sa_idx, ma)]
+    b = stack_b.poes[np.ix_(kb, sb_idx, mb)]
+    n_levels = min(a.shape[-1], b.shape[-1])
+    a, b = a[..., :n_levels], b[..., :n_levels]
+
+    # Niveles distintos entre cálculos no son comparables punto a punto
+    same_levels = np.all(np.isclose(stack_a.imls[ma, :n_levels], stack_b.imls[mb, :n_levels],
+                                    rtol=1e-6, equal_nan=True), axis=-1)
+    b = np.where(same_levels[None, None, :, None], b, np.nan)
+
+    stats, mask = compare_arrays(a, b, rtol, atol, axis=(1, 3))
+    labels = [{"quantity": "hazard_curve", "kind": k, "imt": m} for k in kinds for m in imts]
+    report = pd.DataFrame(_report_rows(stats, labels))
+    if len(report):
+        report.loc[np.tile(~same_levels, len(kinds)), "status"] = "levels_differ"
+
+    imls = stack_a.imls[ma]
+    outliers = _collect_outliers(mask, lambda i: {
+        "quantity": "hazard_curve", "kind": kinds[i[0]], "imt": imts[i[2]],
+        "lon": stack_a.lons[sa_idx[i[1]]], "lat": stack_a.lats[sa_idx[i[1]]],
+        "x": imls[i[2], i[3]], "value_a": a[i], "value_b": b[i],
+    }, max_outliers)
+    return report, pd.DataFrame(outliers)
+
+
+def diff_uhs_stacks(stack_a, stack_b, rtol=0.05, atol=1e-6, max_outliers=1000):
+    """
+    Compares two `UHSStack` objects.
+
+    Returns:
+    --------
+    report : pandas.DataFrame
+        One row per (kind, poe).
+    outliers : pandas.DataFrame
+        Flagged (kind, site, poe, period) values.
+    """
+    kinds = [k for k in stack_a.kinds if k in stack_b.kinds]
+    ka = [stack_a.kinds.index(k) for k in kinds]
+    kb = [stack_b.kinds.index(k) for k in kinds]
+    sa_idx, sb_idx = _align_sites(stack_a.lons, stack_a.lats, stack_b.lons, stack_b.lats)
+    pa, pb = _align_values(stack_a.poes, stack_b.poes)
+    ta, tb = _align_values(stack_a.periods, stack_b.periods)
+
+    a = stack_a.sa[np.ix_(ka, sa_idx, pa, ta)]
+    b = stack_b.sa[np.ix_(kb, sb_idx, pb, tb)]
+
+    stats, mask = compare_arrays(a, b, rtol, atol, axis=(1, 3))
+    poes = stack_a.poes[pa]
+    periods = stack_a.periods[ta]
+    labels = [{"quantity": "uhs", "kind": k, "poe": float(p)} for k in kinds for p in poes]
+    report = pd.DataFrame(_report_rows(stats, labels))
+
+    outliers = _collect_outliers(mask, lambda i: {
+        "quantity": "uhs", "kind": kinds[i[0]], "poe": poes[i[2]],
+        "lon": stack_a.lons[sa_idx[i[1]]], "lat": stack_a.lats[sa_idx[i[1]]],
+        "x": periods[i[3]], "value_a": a[i], "value_b": b[i],
+    }, max_outliers)
+    return report, pd.DataFrame(outliers)
+
+
+def _index_outputs(folder_path):
+    """{(output, kind, imt): path} for the curve/UHS exports of a folder."""
+    files = {}
+    for root, _, names in os.walk(folder_path):
+        for name in names:
+            info = parse_output_filename(name)
+            if info is not None:
+                files[(info["output"], info["kind"], info["imt"])] = os.path.join(root, name)
+    return files
+
+
+def _diff_curve_files(path_a, path_b, kind, imt, rtol, atol, max_outliers):
+    a_file = read_hazard_curve_file(path_a)
+    b_file = read_hazard_curve_file(path_b)
+    label = {"quantity": "hazard_curve", "kind": kind, "imt": imt}
+
+    if (len(a_file["imls"]) != len(b_file["imls"])
+            or not np.allclose(a_file["imls"], b_file["imls"], rtol=1e-6)):
+        return [dict(label, status="levels_differ")], []
+
+    ia, ib = _align_sites(a_file["lons"], a_file["lats"], b_file["lons"], b_file["lats"])
+    a, b = a_file["poes"][ia], b_file["poes"][ib]
+    stats, mask = compare_arrays(a, b, rtol, atol)
+    outliers = _collect_outliers(mask, lambda i: dict(
+        label, lon=a_file["lons"][ia[i[0]]], lat=a_file["lats"][ia[i[0]]],
+        x=a_file["imls"][i[1]], value_a=a[i], value_b=b[i]), max_outliers)
+    return _report_rows(stats, [label]), outliers
+
+
+def _diff_uhs_files(path_a, path_b, kind, rtol, atol, max_outliers):
+    a_file = read_uhs_file(path_a)
+    b_file = read_uhs_file(path_b)
+
+    ia, ib = _align_sites(a_file["lons"], a_file["lats"], b_file["lons"], b_file["lats"])
+    pa, pb = _align_values(a_file["poes"], b_file["poes"])
+    ta, tb = _align_values(a_file["periods"], b_file["periods"])
+    a = a_file["sa"][np.ix_(ia, pa, ta)]
+    b = b_file["sa"][np.ix_(ib, pb, tb)]
+
+    stats, mask = compare_arrays(a, b, rtol, atol, axis=(0, 2))
+    poes = a_file["poes"][pa]
+    periods = a_file["periods"][ta]
+    labels = [{"quantity": "uhs", "kind": kind, "poe": float(p)} for p in poes]
+    outliers = _collect_outliers(mask, lambda i: {
+        "quantity": "uhs", "kind": kind, "poe": poes[i[1]],
+        "lon": a_file["lons"][ia[i[0]]], "lat": a_file["lats"][ia[i[0]]],
+        "x": periods[i[2]], "value_a": a[i], "value_b": b[i]}, max_outliers)
+    return _report_rows(stats, labels), outliers
+
+
+def _diff_disaggregation(folder_a, folder_b, targets, stat, disagg_atol, max_outliers):
+    sites_a = list_disaggregation_files(folder_a, stat)
+    sites_b = list_disaggregation_files(folder_b, stat)
+    common = [s for s in sites_a if s in sites_b]
+
+    rows, outliers = [], []
+    for imt, poe in targets:
+        values = {f: np.full((len(common), 2), np.nan) for f in _DISAGG_FIELDS}
+        coords = np.full((len(common), 2), np.nan)
+        for n, site in enumerate(common):
+            sa = summarize_site(sites_a[site], imt, poe)
+            sb = summarize_site(sites_b[site], imt, poe)
+            coords[n] = sa.get("lon", np.nan), sa.get("lat", np.nan)
+            for field in _DISAGG_FIELDS:
+                values[field][n] = sa.get(field, np.nan), sb.get(field, np.nan)
+
+        for field in _DISAGG_FIELDS:
+            a, b = values[field][:, 0], values[field][:, 1]
+            stats, mask = compare_arrays(a, b, 0.0, disagg_atol[field.split("_")[1]])
+            label = {"quantity": "disagg", "imt": imt, "poe": float(poe), "field": field}
+            rows.extend(_report_rows(stats, [label]))
+            outliers.extend(_collect_outliers(mask, lambda i: dict(
+                label, site=common[i[0]], lon=coords[i[0], 0], lat=coords[i[0], 1],
+                value_a=a[i], value_b=b[i]), max_outliers - len(outliers)))
+    return rows, outliers
+
+
+def diff_calculation_folders(folder_a, folder_b, rtol=0.05, atol=1e-6,
+                             disagg_folders=None, disagg_targets=None, stat="mean",
+                             disagg_atol=None, max_outliers=1000):
+    """
+    Compares two calculations file pair by file pair.
+
+    Parameters:
+    -----------
+    folder_a, folder_b : str
+        Export folders (searched recursively) with hazard curve and UHS files
+        of the reference and the new calculation.
+    rtol, atol : float
+        Tolerances for hazard curves and UHS.
+    disagg_folders : tuple of str, optional
+        (folder_a, folder_b) with per-site disaggregation files.
+    disagg_targets : list of (imt, poe), optional
+        Disaggregation groups to compare.
+    stat : str
+        Statistic part of the disaggregation filenames.
+    disagg_atol : dict, optional
+        Absolute tolerance for 'mag', 'dist' and 'eps' values.
+    max_outliers : int
+        Maximum number of outlier rows kept.
+
+    Returns:
+    --------
+    report : pandas.DataFrame
+        One row per compared group, with 'status' in {'ok', 'outliers',
+        'levels_differ', 'missing_in_a', 'missing_in_b'}.
+    outliers : pandas.DataFrame
+        Flagged values (at most `max_outliers`).
+    """
+    files_a = _index_outputs(folder_a)
+    files_b = _index_outputs(folder_b)
+
+    rows, outliers = [], []
+    for key in sorted(set(files_a) | set(files_b), key=lambda k: tuple(str(x) for x in k)):
+        output, kind, imt = key
+        quantity = "hazard_curve" if output == "hazard_curve" else "uhs"
+        if key not in files_a or key not in files_b:
+            missing = "missing_in_a" if key not in files_a else "missing_in_b"
+            rows.append({"quantity": quantity, "kind": kind, "imt": imt, "status": missing})
+            continue
+
+        remaining = max(max_outliers - len(outliers), 0)
+        if output == "hazard_curve":
+            r, o = _diff_curve_files(files_a[key], files_b[key], kind, imt, rtol, atol, remaining)
+        else:
+            r, o = _diff_uhs_files(files_a[key], files_b[key], kind, rtol, atol, remaining)
+        rows.extend(r)
+        outliers.extend(o)
+
+    if disagg_folders is not None and disagg_targets:
+        tolerances = dict(_DISAGG_ATOL, **(disagg_atol or {}))
+        remaining = max(max_outliers - len(outliers), 0)
+        r, o = _diff_disaggregation(disagg_folders[0], disagg_folders[1], disagg_targets,
+                                    stat, tolerances, remaining)
+        rows.extend(r)
+        outliers.extend(o)
+
+    return pd.DataFrame(rows), pd.DataFrame(outliers)
@@ -0,0 +1,220 @@
+"""
+Conditional Mean Spectrum (CMS) Engine
+Author: Ing. Patricio Palacios Msc.
+Date: October 19, 2026
+
+Description:
+------------
+This module builds conditional mean spectra and conditional standard
+deviations from a stacked UHS target and the mean epsilon obtained from the
+disaggregation, for every site, PoE and conditioning period in one batch.
+The mean epsilon per (IMT, PoE) of a 'Mag_Dist_Eps' table is aligned with
+the UHS PoEs and the conditioning periods by `epsilon_from_disaggregation`.
+
+The UHS-based approximation of Baker (2011) is used: the UHS ordinate at
+each period is taken as exp(mu + eps * sigma) with the disaggregation mean
+epsilon, so that
+
+    ln CMS(Ti | T*) = ln UHS(Ti) - (1 - rho(Ti, T*)) * eps(T*) * sigma(Ti)
+    sigma(Ti | T*) = sigma(Ti) * sqrt(1 - rho(Ti, T*)^2)
+
+which is exact at T* and only requires the logarithmic standard deviation
+of the ground-motion model at each period.
+
+References:
+- Baker, J.W. (2011). Conditional Mean Spectrum: Tool for ground motion
+  selection. J. Struct. Eng. 137(3), 322-331.
+- Baker, J.W. & Jayaram, N. (2008). Correlation of spectral acceleration
+  values from NGA ground motion models. Earthquake Spectra 24(1), 299-317.
+"""
+
+import numpy as np
+import pandas as pd
+
+from OpenQuakeUHS.core.hazard_stack import imt_period
+
+
+def baker_jayaram_2008(t1, t2):
+    """
+    Correlation coefficient between ln Sa(t1) and ln Sa(t2) (Baker & Jayaram, 2008).
+
+    Parameters:
+    -----------
+    t1, t2 : float or array-like
+        Periods [s]; arrays are broadcast against each other.
+
+    Returns:
+    --------
+    ndarray
+        Correlation coefficients.
+    """
+    t1 = np.asarray(t1, dtype=float)
+    t2 = np.asarray(t2, dtype=float)
+    t_min = np.minimum(t1, t2)
+    t_max = np.maximum(t1, t2)
+
+    c1 = 1.0 - np.cos(np.pi / 2.0 - 0.366 * np.log(t_max / np.maximum(t_min, 0.109)))
+    with np.errstate(over="ignore"):  # exp(100 T - 5) -> inf para T largos, c2 no se usa ahí
+        c2 = np.where(
+            t_max < 0.2,
+            1.0 - 0.105 * (1.0 - 1.0 / (1.0 + np.exp(100.0 * t_max - 5.0)))
+            * ((t_max - t_min) / (t_max - 0.0099)),
+            0.0,
+        )
+    c3 = np.where(t_max < 0.109, c2, c1)
+    c4 = c1 + 0.5 * (np.sqrt(c3) - c3) * (1.0 + np.cos(np.pi * t_min / 0.109))
+
+    return np.where(
+        t_max < 0.109, c2,
+        np.where(t_min > 0.109, c1,
+                 np.where(t_max < 0.2, np.minimum(c2, c4), c4)),
+    )
+
+
+def mean_mre_by_poe(data, imt=None):
+    """
+    Computes the mean magnitude, distance and epsilon for every (IMT, PoE)
+    of a 'Mag_Dist_Eps' disaggregation table in a single grouped pass.
+
+    Parameters:
+    -----------
+    data : pandas.DataFrame
+        Content of a 'Mag_Dist_Eps-*.csv' file (e.g. `Disaggregation.data`).
+    imt : str, optional
+        IMT to keep (all rows are used when omitted).
+
+    Returns:
+    --------
+    pandas.DataFrame
+        Indexed by ('imt', 'poe') with columns 'mag', 'dist' and 'eps'.
+    """
+    if imt is not None:
+        data = data[data["imt"] == imt]
+
+    hz_key = [col for col in data.columns if col.startswith("mean") or col.startswith("rlz")][0]
+    weights = data[hz_key].to_numpy(dtype=float)
+    weighted = data[["mag", "dist", "eps"]].mul(weights, axis=0)
+    weighted["w"] = weights
+    sums = weighted.groupby([data["imt"], data["poe"]]).sum()
+
+    return sums[["mag", "dist", "eps"]].div(sums["w"], axis=0)
+
+
+def epsilon_from_disaggregation(mre, uhs, conditioning_periods=None, rtol=1e-3):
+    """
+    Aligns the mean epsilon of `mean_mre_by_poe` with the PoEs of a UHS stack
+    and the conditioning periods.
+
+    Parameters:
+    -----------
+    mre : pandas.DataFrame
+        Output of `mean_mre_by_poe`, indexed by ('imt', 'poe').
+    uhs : UHSStack
+        Stacked target spectra.
+    conditioning_periods : array-like, optional
+        Conditioning periods T* [s]. Defaults to the disaggregated periods
+        that are also UHS periods.
+    rtol : float
+        Relative tolerance to match PoEs and periods.
+
+    Returns:
+    --------
+    epsilon : ndarray (n_poe, n_cond)
+        Mean epsilon for every (UHS PoE, T*).
+    conditioning_periods : ndarray (n_cond,)
+    """
+    imts = mre.index.get_level_values("imt")
+    periods = np.array([imt_period(imt) for imt in imts])
+    poes = mre.index.get_level_values("poe").to_numpy(dtype=float)
+    eps = mre["eps"].to_numpy(dtype=float)
+
+    if conditioning_periods is None:
+        unique = np.unique(periods)
+        conditioning_periods = unique[np.isclose(unique[:, None], uhs.periods[None, :],
+                                                 rtol=rtol).any(axis=1)]
+        if not len(conditioning_periods):
+            raise LookupError(f"None of the disaggregated IMTs {sorted(set(imts))} is a UHS period.")
+    conditioning_periods = np.atleast_1d(np.asarray(conditioning_periods, dtype=float))
+
+    epsilon = np.full((len(uhs.poes), len(conditioning_periods)), np.nan)
+    missing = []
+    for i, poe in enumerate(uhs.poes):
+        for j, period in enumerate(conditioning_periods):
+            match = np.flatnonzero(np.isclose(poes, poe, rtol=rtol)
+                                   & np.isclose(periods, period, rtol=rtol))
+            if len(match):
+                epsilon[i, j] = eps[match[0]]
+            else:
+                missing.append((float(poe), float(period)))
+    if missing:
+        raise LookupError(f"No disaggregation for the (poe, T*) pairs {missing}; "
+                          f"available: {list(mre.index)}.")
+    return epsilon, conditioning_periods
+
+
+def conditional_mean_spectra(uhs, epsilon, sigma_ln, conditioning_periods=None,
+                             kind="mean", correlation=baker_jayaram_2008):
+    """
+    Computes conditional mean spectra and conditional standard deviations
+    for all sites, PoEs and conditioning periods at once.
+
+    Parameters:
+    -----------
+    uhs : UHSStack
+        Stacked target spectra.
+    epsilon : float, array-like or pandas.DataFrame
+        Mean disaggregation epsilon, broadcastable to (n_sites, n_poe, n_cond).
+        Pass per-PoE values as an (n_poe, 1) array and per-period values as
+        a (1, n_cond) array; 1-D arrays are rejected as ambiguous. The output
+        of `mean_mre_by_poe` is aligned with `epsilon_from_disaggregation`
+        (T* then defaults to the disaggregated periods).
+    sigma_ln : float or array-like
+        Logarithmic standard deviation of Sa, broadcastable to
+        (n_sites, n_poe, n_period) (e.g. a (n_period,) array from a GMPE).
+    conditioning_periods : array-like, optional
+        Conditioning periods T* [s]. Defaults to all UHS periods.
+    kind : str
+        Spectrum kind of the stack to condition on.
+    correlation : callable
+        Correlation model `correlation(t1, t2)` accepting broadcast arrays.
+
+    Returns:
+    --------
+    cms : ndarray (n_sites, n_poe, n_cond, n_period)
+        Conditional mean spectra [g].
+    cond_std : ndarray (n_sites, n_poe, n_cond, n_period)
+        Conditional logarithmic standard deviation.
+    """
+    periods = uhs.periods
+    if isinstance(epsilon, pd.DataFrame):
+        epsilon, conditioning_periods = epsilon_from_disaggregation(epsilon, uhs, conditioning_periods)
+    if conditioning_periods is None:
+        conditioning_periods = periods
+    conditioning_periods = np.atleast_1d(np.asarray(conditioning_periods, dtype=float))
+
+    sa = uhs.select(kind)  # (site, poe, period)
+    n_sites, n_poe, n_period = sa.shape
+    n_cond = len(conditioning_periods)
+
+    epsilon = np.asarray(epsilon, dtype=float)
+    if epsilon.ndim == 1 and epsilon.size != 1:
+        raise ValueError(
+            f"epsilon of shape {epsilon.shape} is ambiguous; pass ({n_poe}, 1) for one value "
+            f"per PoE or (1, {n_cond}) for one value per conditioning period.")
+    try:
+        epsilon = np.broadcast_to(epsilon, (n_sites, n_poe, n_cond))
+    except ValueError:
+        raise ValueError(f"epsilon of shape {epsilon.shape} does not broadcast to "
+                         f"(n_sites, n_poe, n_cond) = {(n_sites, n_poe, n_cond)}.") from None
+    sigma = np.broadcast_to(np.asarray(sigma_ln, dtype=float), (n_sites, n_poe, n_period))
+
+    rho = correlation(conditioning_periods[:, None], periods[None, :])  # (cond, period)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ln_uhs = np.log(sa)
+
+    ln_cms = (ln_uhs[:, :, None, :]
+              - (1.0 - rho)[None, None, :, :] * epsilon[..., None] * sigma[:, :, None, :])
+    cond_std = sigma[:, :, None, :] * np.sqrt(np.clip(1.0 - rho ** 2, 0.0, None))[None, None, :, :]
+
+    return np.exp(ln_cms), cond_std
@@ -0,0 +1,402 @@
+"""
+Compact Encoding of Hazard Curves
+Author: Ing. Patricio Palacios Msc.
+Date: October 19, 2026
+
+Description:
+------------
+Hazard curves are exported as 20+ PoE values per intensity level in '%.6E'
+text, and realization sets repeat that for thousands of files. This module
+encodes batches of curves sharing the same intensity levels in a compact
+form with a bounded reconstruction error, to cache them or move them
+between nodes:
+
+- 'delta'   : ln(PoE) quantized with a step fixed by `rtol`, first level
+              stored as int32 and the rest as differences in the smallest
+              integer type that fits (int8 for smooth curves). The relative
+              PoE error is at most `rtol`.
+- 'float16' : ln(PoE) stored as float16 (relative error about 1e-2 for
+              PoEs down to 1e-10).
+- 'poly'    : least-squares polynomial of ln(PoE) vs ln(IML) per curve,
+              float32 coefficients. Curves whose fit misses a level by more
+              than `rtol` (or with too few levels to fit) are stored with
+              the 'delta' encoding instead, so the relative PoE error stays
+              at most `rtol` for every curve.
+
+PoEs of 0 (and below `min_poe`) are decoded as 0 and missing levels as
+np.nan. Encoding and decoding are array operations over the whole batch.
+
+Typical usage:
+
+    encoded = encode_stack(load_hazard_curves("results/"), rtol=1e-3)
+    save_encoded(encoded, "curves.npz")
+    stack = decode_stack(load_encoded("curves.npz"))
+"""
+
+import json
+
+import numpy as np
+import pandas as pd
+
+from OpenQuakeUHS.core.hazard_stack import HazardCurveStack
+
+METHODS = ("delta", "float16", "poly")
+
+
+class EncodedCurves:
+    """
+    Batch of hazard curves with common intensity levels in encoded form.
+    """
+    def __init__(self, method, imls, arrays, params):
+        """
+        Parameters:
+        - method (str): One of `METHODS`
+        - imls (ndarray): Intensity levels shared by the curves (n_levels,)
+        - arrays (dict): Encoded arrays {name: ndarray}
+        - params (dict): Scalar parameters of the encoding (shape, step, ...)
+        """
+        self.method = method
+        self.imls = np.asarray(imls, dtype=float)
+        self.arrays = arrays
+        self.params = params
+
+    @property
+    def shape(self):
+        """Shape of the decoded PoE array (..., n_levels)."""
+        return tuple(self.params["shape"])
+
+    @property
+    def nbytes(self):
+        """Size of the encoded arrays [bytes] (before any file compression)."""
+        return int(sum(a.nbytes for a in self.arrays.values()) + self.imls.astype(np.float32).nbytes)
+
+    def decode(self):
+        """Returns the PoEs (float64) with the original shape."""
+        return decode_curves(self)
+
+    def __repr__(self):
+        return f"EncodedCurves(method={self.method!r}, shape={self.shape}, nbytes={self.nbytes})"
+
+
+def _masks(poes, min_poe):
+    missing = np.isnan(poes)
+    zero = ~missing & (poes < min_poe)
+    return missing, zero
+
+
+def _pack(mask):
+    return np.packbits(mask, axis=-1) if mask.any() else np.zeros((0,), dtype=np.uint8)
+
+
+def _unpack(packed, shape):
+    if packed.size == 0:
+        return np.zeros(shape, dtype=bool)
+    return np.unpackbits(packed, axis=-1, count=shape[-1]).astype(bool)
+
+
+def _encode_delta(log_poe, valid, rtol):
+    # |ln p' - ln p| <= step / 2 = ln(1 + rtol)
+    step = 2.0 * np.log1p(rtol)
+    codes = np.rint(log_poe / step).astype(np.int64)
+    # Niveles sin valor: se repite el código anterior para no romper las diferencias
+    codes = np.where(valid, codes, 0)
+    if codes.shape[1] > 1 and (~valid).any():
+        idx = np.where(valid, np.arange(codes.shape[1])[None, :], 0)
+        codes = np.take_along_axis(codes, np.maximum.accumulate(idx, axis=1), axis=1)
+    deltas = np.diff(codes, axis=1)
+    span = np.abs(deltas).max() if deltas.size else 0
+    dtype = np.int8 if span <= 127 else np.int16 if span <= 32767 else np.int32
+    return codes[:, 0].astype(np.int32), deltas.astype(dtype), step
+
+
+def _decode_delta(first, deltas, step):
+    codes = np.empty((len(first), deltas.shape[1] + 1), dtype=np.int64)
+    codes[:, 0] = first
+    if codes.shape[1] > 1:
+        codes[:, 1:] = first[:, None] + np.cumsum(deltas.astype(np.int64), axis=1)
+    return codes * step
+
+
+def encode_curves(imls, poes, method="delta", rtol=1e-3, degree=5, min_poe=1e-30):
+    """
+    Encodes a batch of hazard curves.
+
+    Parameters:
+    -----------
+    imls : array-like
+        Intensity levels shared by the curves (n_levels,).
+    poes : array-like
+        PoEs (..., n_levels); np.nan marks missing levels.
+    method : str
+        'delta', 'float16' or 'poly'.
+    rtol : float
+        Maximum relative PoE error of the 'delta' and 'poly' methods ('poly'
+        curves that exceed it are stored with the 'delta' encoding).
+    degree : int
+        Polynomial degree of the 'poly' method.
+    min_poe : float
+        PoEs below this value are stored as 0.
+
+    Returns:
+    --------
+    EncodedCurves
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown method {method}; use one of {METHODS}.")
+    imls = np.asarray(imls, dtype=float)
+    poes = np.asarray(poes, dtype=float)
+    if poes.shape[-1] != len(imls):
+        raise ValueError(f"The curves have {poes.shape[-1]} levels but {len(imls)} IMLs were given.")
+
+    shape = poes.shape
+    flat = poes.reshape(-1, shape[-1])
+    missing, zero = _masks(flat, min_poe)
+    valid = ~(missing | zero)
+    log_poe = np.log(np.where(valid, flat, 1.0))
+    params = {"shape": list(shape), "min_poe": min_poe}
+    arrays = {"missing": _pack(missing), "zero": _pack(zero)}
+
+    if method == "delta":
+        first, deltas, step = _encode_delta(log_poe, valid, rtol)
+        arrays.update(first=first, deltas=deltas)
+        params["step"] = step
+        params["rtol"] = rtol
+
+    elif method == "float16":
+        arrays["log_poe"] = log_poe.astype(np.float16)
+
+    else:
+        # Ajuste por mínimos cuadrados de todas las curvas con una sola pseudo-inversa
+        x = np.log(imls)
+        x0, scale = x.mean(), (x.max() - x.min()) / 2 or 1.0
+        vander = np.vander((x - x0) / scale, degree + 1, increasing=True)  # (level, degree + 1)
+        coefs = np.empty((len(flat), degree + 1))
+        full = valid.all(axis=1)
+        coefs[full] = log_poe[full] @ np.linalg.pinv(vander).T
+        for i in np.flatnonzero(~full):  # curvas con niveles faltantes o nulos
+            sel = valid[i]
+            coefs[i] = np.linalg.lstsq(vander[sel], log_poe[i, sel], rcond=None)[0] if sel.sum() > degree + 1 else 0.0
+        coefs = coefs.astype(np.float32)
+
+        # Curvas cuyo ajuste supera rtol en algún nivel (o sin niveles suficientes) -> 'delta'
+        with np.errstate(over="ignore", invalid="ignore"):
+            fitted = coefs.astype(np.float64) @ vander.T
+            error = np.where(valid, np.abs(np.expm1(fitted - log_poe)), 0.0)
+        bad = ~np.isfinite(error).all(axis=1) | (error > rtol).any(axis=1)
+        bad |= valid.any(axis=1) & (valid.sum(axis=1) <= degree + 1)
+        fallback = np.flatnonzero(bad)
+        coefs[fallback] = 0.0
+        first, deltas, step = _encode_delta(log_poe[fallback], valid[fallback], rtol)
+        arrays.update(coefs=coefs, fallback=fallback.astype(np.int32),
+                      fallback_first=first, fallback_deltas=deltas)
+        params.update(degree=degree, x0=x0, scale=scale, step=step, rtol=rtol)
+
+    return EncodedCurves(method, imls, arrays, params)
+
+
+def decode_curves(encoded):
+    """
+    Decodes an `EncodedCurves` batch.
+
+    Returns:
+    --------
+    ndarray
+        PoEs (float64) with the original shape.
+    """
+    shape = encoded.shape
+    n_levels = shape[-1]
+    n_curves = int(np.prod(shape[:-1])) if len(shape) > 1 else 1
+    a, p = encoded.arrays, encoded.params
+
+    if encoded.method == "delta":
+        log_poe = _decode_delta(a["first"], a["deltas"], p["step"])
+    elif encoded.method == "float16":
+        log_poe = a["log_poe"].astype(np.float64)
+    elif encoded.method == "poly":
+        x = (np.log(encoded.imls) - p["x0"]) / p["scale"]
+        vander = np.vander(x, p["degree"] + 1, increasing=True)
+        log_poe = a["coefs"].astype(np.float64) @ vander.T
+        if "fallback" in a and len(a["fallback"]):
+            log_poe[a["fallback"]] = _decode_delta(a["fallback_first"], a["fallback_deltas"], p["step"])
+    else:
+        raise ValueError(f"Unknown method {encoded.method}.")
+
+    poes = np.exp(log_poe)
+    poes[_unpack(a["zero"], (n_curves, n_levels))] = 0.0
+    poes[_unpack(a["missing"], (n_curves, n_levels))] = np.nan
+    return poes.reshape(shape)
+
+
+def reconstruction_error(original, decoded, min_poe=1e-10):
+    """
+    Error of decoded curves against the original ones.
+
+    Parameters:
+    -----------
+    original, decoded : array-like
+        PoEs (..., n_levels).
+    min_poe : float
+        Levels with an original PoE below this value are left out of the
+        relative error (a relative error there has no practical meaning).
+
+    Returns:
+    --------
+    dict
+        'max_rel_error', 'mean_rel_error', 'p99_rel_error' and
+        'max_abs_error' over the compared levels, 'per_curve_max_rel_error'
+        (ndarray (...,)), 'n_compared' and 'zero_mismatch' (levels where
+        exactly one of the two is 0).
+    """
+    original = np.asarray(original, dtype=float)
+    decoded = np.asarray(decoded, dtype=float)
+    if original.shape != decoded.shape:
+        raise ValueError(f"Shapes differ: {original.shape} vs {decoded.shape}.")
+
+    compared = np.isfinite(original) & (original >= min_poe)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rel = np.where(compared, np.abs(decoded - original) / original, np.nan)
+    absolute = np.where(np.isfinite(original), np.abs(decoded - original), np.nan)
+    values = rel[compared]
+    per_curve = np.where(compared.any(axis=-1), np.nanmax(np.where(compared, rel, -np.inf), axis=-1), np.nan)
+    return {
+        "max_rel_error": float(values.max()) if values.size else np.nan,
+        "mean_rel_error": float(values.mean()) if values.size else np.nan,
+        "p99_rel_error": float(np.percentile(values, 99)) if values.size else np.nan,
+        "max_abs_error": float(np.nanmax(absolute)) if np.isfinite(absolute).any() else np.nan,
+        "per_curve_max_rel_error": per_curve,
+        "n_compared": int(compared.sum()),
+        "zero_mismatch": int(((original == 0) != (decoded == 0)).sum()),
+    }
+
+
+# === Pilas de curvas (HazardCurveStack) ===
+def encode_stack(stack, method="delta", rtol=1e-3, degree=5, min_poe=1e-30):
+    """
+    Encodes a `HazardCurveStack`, one batch per IMT (kinds x sites curves).
+
+    Returns:
+    --------
+    dict
+        {'stack': site/kind metadata, 'imts': {imt: EncodedCurves}}
+    """
+    encoded = {}
+    for k, imt in enumerate(stack.imts):
+        levels = np.isfinite(stack.imls[k])
+        encoded[imt] = encode_curves(stack.imls[k][levels], stack.poes[:, :, k][..., levels],
+                                     method, rtol, degree, min_poe)
+    return {
+        "stack": {"kinds": stack.kinds, "lons": stack.lons, "lats": stack.lats,
+                  "n_levels": stack.imls.shape[1], "investigation_time": stack.investigation_time},
+        "imts": encoded,
+    }
+
+
+def decode_stack(encoded):
+    """
+    Rebuilds the `HazardCurveStack` of an `encode_stack` result.
+    """
+    meta = encoded["stack"]
+    imts = list(encoded["imts"])
+    n_levels = int(meta["n_levels"])
+    imls = np.full((len(imts), n_levels), np.nan)
+    poes = np.full((len(meta["kinds"]), len(meta["lons"]), len(imts), n_levels), np.nan)
+    for k, imt in enumerate(imts):
+        batch = encoded["imts"][imt]
+        n = len(batch.imls)
+        imls[k, :n] = batch.imls
+        poes[:, :, k, :n] = batch.decode()
+    return HazardCurveStack(meta["kinds"], meta["lons"], meta["lats"], imts, imls, poes,
+                            meta["investigation_time"])
+
+
+def stack_error_report(stack, encoded, min_poe=1e-10):
+    """
+    Returns one row per (IMT, kind) with the reconstruction error of an
+    `encode_stack` result and the encoded size.
+    """
+    rows = []
+    for k, imt in enumerate(stack.imts):
+        batch = encoded["imts"][imt]
+        levels = np.isfinite(stack.imls[k])
+        original = stack.poes[:, :, k][..., levels]
+        decoded = batch.decode()
+        for j, kind in enumerate(stack.kinds):
+            err = reconstruction_error(original[j], decoded[j], min_poe)
+            rows.append({"imt": imt, "kind": kind, "method": batch.method,
+                         "max_rel_error": err["max_rel_error"],
+                         "mean_rel_error": err["mean_rel_error"],
+                         "p99_rel_error": err["p99_rel_error"],
+                         "max_abs_error": err["max_abs_error"],
+                         "zero_mismatch": err["zero_mismatch"]})
+    df = pd.DataFrame(rows)
+    df.attrs["original_bytes"] = int(stack.poes.nbytes)
+    df.attrs["encoded_bytes"] = int(sum(b.nbytes for b in encoded["imts"].values()))
+    return df
+
+
+def encode_hazard_curves(curves, method="delta", rtol=1e-3, degree=5, min_poe=1e-30):
+    """
+    Encodes a list of `HazardCurve` objects with the same Sa levels (e.g.
+    the realizations of one IMT at one site).
+
+    Returns:
+    --------
+    EncodedCurves
+        Batch of shape (n_curves, n_levels).
+    """
+    if not curves:
+        raise ValueError("No curves given.")
+    imls = np.asarray(curves[0].sa_values, dtype=float)
+    for c in curves[1:]:
+        if len(c.sa_values) != len(imls) or not np.allclose(c.sa_values, imls, rtol=1e-6):
+            raise ValueError(f"{c.filename} has different Sa levels than {curves[0].filename}.")
+    poes = np.array([c.poe_values for c in curves], dtype=float)
+    return encode_curves(imls, poes, method, rtol, degree, min_poe)
+
+
+# === Archivos ===
+def save_encoded(encoded, path):
+    """
+    Writes an `encode_stack` result (or a single `EncodedCurves`) into one
+    compressed .npz file.
+    """
+    single = isinstance(encoded, EncodedCurves)
+    batches = {"": encoded} if single else encoded["imts"]
+    arrays, index = {}, []
+    for n, (imt, batch) in enumerate(batches.items()):
+        index.append({"imt": imt, "method": batch.method, "params": batch.params,
+                      "names": list(batch.arrays)})
+        arrays[f"b{n}_imls"] = batch.imls
+        for name, value in batch.arrays.items():
+            arrays[f"b{n}_{name}"] = value
+
+    header = {"single": single, "batches": index}
+    if not single:
+        meta = encoded["stack"]
+        header["stack"] = {"kinds": meta["kinds"], "n_levels": int(meta["n_levels"]),
+                           "investigation_time": meta["investigation_time"]}
+        arrays["lons"] = np.asarray(meta["lons"], dtype=float)
+        arrays["lats"] = np.asarray(meta["lats"], dtype=float)
+    np.savez_compressed(path, header=np.asarray(json.dumps(header)), **arrays)
+
+
+def load_encoded(path):
+    """
+    Reads a file written by `save_encoded`.
+
+    Returns:
+    --------
+    dict or EncodedCurves
+        Same form that was saved.
+    """
+    with np.load(path) as data:
+        header = json.loads(str(data["header"]))
+        batches = {}
+        for n, entry in enumerate(header["batches"]):
+            arrays = {name: data[f"b{n}_{name}"] for name in entry["names"]}
+            batches[entry["imt"]] = EncodedCurves(entry["method"], data[f"b{n}_imls"], arrays,
+                                                  entry["params"])
+        if header["single"]:
+            return batches[""]
+        stack = dict(header["stack"], lons=data["lons"], lats=data["lats"])
+    return {"stack": stack, "imts": batches}
@@ -0,0 +1,199 @@
+"""
+Design Spectrum Derivation over Batched UHS
+Author: Ing. Patricio Palacios Msc.
+Date: October 19, 2026
+
+Description:
+------------
+This module turns uniform hazard spectra into code-type design spectra for
+all sites and PoEs at once, working on the (site, poe, period) arrays of a
+`UHSStack`:
+
+1. Site amplification with pluggable factors (scalar, array or callable)
+2. Code parameters (site-specific procedure of ASCE 7-16, Sec. 21.4):
+   SMS = 0.9 max Sa(0.2 s <= T <= 5 s), SM1 = max T*Sa(1 s <= T <= 5 s),
+   SDS = 2/3 SMS, SD1 = 2/3 SM1, Ts = SD1/SDS, T0 = 0.2 Ts
+3. Two-parameter spectral shape fitted from SDS/SD1 and its smallest
+   scaled version enveloping the site-specific design spectrum
+
+Every step is a broadcast numpy operation; no loops over sites or PoEs.
+"""
+
+import numpy as np
+
+
+def tabulated_amplification(site_classes, table_periods, table, periods):
+    """
+    Builds per-site amplification factors from a site-class table.
+
+    Parameters:
+    -----------
+    site_classes : array-like of int
+        Row of `table` used for each site (n_sites,).
+    table_periods : array-like
+        Periods [s] at which the table is defined.
+    table : array-like
+        Amplification factors (n_classes, n_table_periods).
+    periods : array-like
+        Periods [s] of the spectra to amplify.
+
+    Returns:
+    --------
+    ndarray (n_sites, 1, n_period)
+        Factors broadcastable to the (site, poe, period) UHS array.
+        The table is interpolated linearly in log-period and held constant
+        outside its range.
+    """
+    table = np.atleast_2d(np.asarray(table, dtype=float))
+    log_tp = np.log(np.asarray(table_periods, dtype=float))
+    log_p = np.log(np.asarray(periods, dtype=float))
+
+    per_class = np.stack([np.interp(log_p, log_tp, row) for row in table])
+    return per_class[np.asarray(site_classes, dtype=int)][:, None, :]
+
+
+def apply_amplification(sa, periods, amplification=None):
+    """
+    Applies site amplification to a (site, poe, period) spectra array.
+
+    Parameters:
+    -----------
+    sa : ndarray
+        Rock spectral accelerations [g] (n_sites, n_poe, n_period).
+    periods : array-like
+        Spectral periods [s] (n_period,).
+    amplification : None, float, array-like or callable
+        Factors broadcastable to `sa`, or a function
+        `amplification(sa, periods)` returning such factors (this allows
+        nonlinear, intensity-dependent models).
+
+    Returns:
+    --------
+    ndarray
+        Amplified spectral accelerations [g].
+    """
+    if amplification is None:
+        return sa
+    if callable(amplification):
+        amplification = amplification(sa, np.asarray(periods, dtype=float))
+    return sa * np.asarray(amplification, dtype=float)
+
+
+def code_parameters(sa, periods, short_range=(0.2, 5.0), long_range=(1.0, 5.0),
+                    short_factor=0.9, design_factor=2.0 / 3.0):
+    """
+    Extracts the code design parameters from site spectra.
+
+    Parameters:
+    -----------
+    sa : ndarray
+        Site spectral accelerations [g] (n_sites, n_poe, n_period).
+    periods : array-like
+        Spectral periods [s] (n_period,).
+    short_range : tuple
+        Period range used for SMS.
+    long_range : tuple
+        Period range used for SM1.
+    short_factor : float
+        Fraction of the peak spectral ordinate taken as SMS.
+    design_factor : float
+        Ratio between design and MCE-level parameters.
+
+    Returns:
+    --------
+    dict of ndarray (n_sites, n_poe)
+        'SMS', 'SM1', 'SDS', 'SD1', 'Ts', 'T0'.
+    """
+    periods = np.asarray(periods, dtype=float)
+    in_short = (periods >= short_range[0]) & (periods <= short_range[1])
+    in_long = (periods >= long_range[0]) & (periods <= long_range[1])
+
+    sms = short_factor * np.nanmax(sa[..., in_short], axis=-1)
+    sm1 = np.nanmax(sa[..., in_long] * periods[in_long], axis=-1)
+    sds = design_factor * sms
+    sd1 = design_factor * sm1
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ts = sd1 / sds
+
+    return {"SMS": sms, "SM1": sm1, "SDS": sds, "SD1": sd1, "Ts": ts, "T0": 0.2 * ts}
+
+
+def design_spectrum_shape(sds, sd1, periods, TL=8.0):
+    """
+    Evaluates the two-parameter design spectrum for every (site, poe).
+
+    Parameters:
+    -----------
+    sds, sd1 : ndarray
+        Design parameters (n_sites, n_poe).
+    periods : array-like
+        Spectral periods [s] (n_period,).
+    TL : float
+        Long-period transition period [s].
+
+    Returns:
+    --------
+    ndarray (n_sites, n_poe, n_period)
+        Design spectral accelerations [g].
+    """
+    T = np.asarray(periods, dtype=float)
+    sds = np.asarray(sds, dtype=float)[..., None]
+    sd1 = np.asarray(sd1, dtype=float)[..., None]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ts = sd1 / sds
+        t0 = 0.2 * ts
+        ramp = sds * (0.4 + 0.6 * T / t0)
+        descending = sd1 / T
+        long = sd1 * TL / T ** 2
+
+    return np.where(T < t0, ramp,
+                    np.where(T <= ts, sds,
+                             np.where(T <= TL, descending, long)))
+
+
+def design_spectra(uhs, amplification=None, kind="mean", TL=8.0,
+                   short_range=(0.2, 5.0), long_range=(1.0, 5.0),
+                   short_factor=0.9, design_factor=2.0 / 3.0):
+    """
+    Derives design spectra for every site and PoE of a UHS stack.
+
+    Parameters:
+    -----------
+    uhs : UHSStack
+        Stacked rock spectra.
+    amplification : None, float, array-like or callable
+        Site amplification (see `apply_amplification`).
+    kind : str
+        Spectrum kind of the stack to use.
+    TL : float
+        Long-period transition period [s].
+    short_range, long_range, short_factor, design_factor :
+        See `code_parameters`.
+
+    Returns:
+    --------
+    dict
+        'periods' (n_period,), 'site_sa' amplified spectra, the code
+        parameters of `code_parameters`, 'shape' the fitted design spectra,
+        'envelope_factor' (n_sites, n_poe) and 'envelope' the shape scaled to
+        envelope `design_factor * site_sa`.
+    """
+    periods = uhs.periods
+    site_sa = apply_amplification(uhs.select(kind), periods, amplification)
+
+    params = code_parameters(site_sa, periods, short_range, long_range,
+                             short_factor, design_factor)
+    shape = design_spectrum_shape(params["SDS"], params["SD1"], periods, TL)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = design_factor * site_sa / shape
+    envelope_factor = np.maximum(np.nanmax(ratio, axis=-1), 1.0)
+
+    result = {"periods": periods, "site_sa": site_sa}
+    result.update(params)
+    result["shape"] = shape
+    result["envelope_factor"] = envelope_factor
+    result["envelope"] = shape * envelope_factor[..., None]
+    return result
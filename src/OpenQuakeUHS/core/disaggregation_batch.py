@@ -0,0 +1,342 @@
+"""
+Out-of-core Disaggregation Summaries for Multi-site Runs
+Author: Ing. Patricio Palacios Msc.
+Date: October 19, 2026
+
+Description:
+------------
+National disaggregation runs write one set of files per site, and the
+'Mag_Lon_Lat' / 'TRT_Mag_Dist_Eps' outputs can add up to far more than the
+available memory. This module processes the sites one at a time, streaming
+each file in row chunks into fixed-size bin accumulators, and reduces them
+into per-site summaries:
+
+- mean and modal magnitude, distance and epsilon
+- contribution share of each tectonic region type
+- contribution grid over the lon/lat bins
+
+Contributions are reduced onto each summary by plain sums over the dropped
+axes, normalized to one, as `Disaggregation.disaggregation_mod_mean` and
+`Disaggregation.disaggregation_TRT` do, so both paths report the same means,
+modes and shares for a site.
+
+Summaries are appended to a JSON-lines checkpoint, so an interrupted run
+resumes with the first site that was not written. Peak memory depends on
+`rows_per_chunk` and on the bin counts only, not on the number of sites.
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from OpenQuakeUHS.core.disaggregation_loader import (
+    DISAGG_SCHEMA,
+    bins_from_metadata,
+    list_disaggregation_files,
+)
+from OpenQuakeUHS.core.oq_metadata import read_metadata
+
+# Archivos candidatos (en orden de preferencia) para cada resumen
+_MRE_SOURCES = ("Mag_Dist_Eps", "TRT_Mag_Dist_Eps")
+_TRT_SOURCES = ("TRT", "TRT_Mag", "TRT_Lon_Lat", "TRT_Mag_Dist", "TRT_Mag_Dist_Eps")
+_LON_LAT_SOURCES = ("Lon_Lat", "TRT_Lon_Lat", "Mag_Lon_Lat")
+
+
+def _pick_source(files, candidates):
+    present = [k for k in candidates if k in files]
+    if not present:
+        return None
+    return min(present, key=lambda k: os.path.getsize(files[k]))
+
+
+def stream_marginal(path, kind, target_axes, target_imt, target_poe,
+                    rows_per_chunk=200_000, rtol=1e-4, reduction="pprod"):
+    """
+    Streams a disaggregation file in row chunks and reduces one (imt, poe)
+    group onto `target_axes`, either with OpenQuake's 1 - prod(1 - p)
+    aggregation or with a plain sum.
+
+    Parameters:
+    -----------
+    path : str
+        Disaggregation CSV file.
+    kind : str
+        Kind of the file (key of `DISAGG_SCHEMA`).
+    target_axes : tuple of str
+        Axes to keep, a subset of the axes of `kind`.
+    target_imt : str
+        IMT to keep.
+    target_poe : float
+        PoE to keep (matched with `rtol`).
+    rows_per_chunk : int
+        Number of rows read at a time.
+    reduction : str
+        'pprod' for 1 - prod(1 - p) over the dropped axes, 'sum' for the
+        linear sum of the contributions.
+
+    Returns:
+    --------
+    values : ndarray
+        Contributions with one dimension per target axis.
+    bins : dict
+        {axis: bin centers or TRT names}
+    meta : dict
+        File metadata.
+
+    Raises LookupError when the file has no rows for (target_imt, target_poe).
+    """
+    if not set(target_axes) <= set(DISAGG_SCHEMA[kind]):
+        raise ValueError(f"{target_axes} cannot be derived from {kind}.")
+    if reduction not in ("pprod", "sum"):
+        raise ValueError(f"Unknown reduction '{reduction}', expected 'pprod' or 'sum'.")
+
+    meta = read_metadata(path)
+    bins, edges = {}, {}
+    for axis in target_axes:
+        bins[axis], edges[axis] = bins_from_metadata(axis, meta)
+    sizes = tuple(len(bins[a]) for a in target_axes)
+    trt_lookup = {name: i for i, name in enumerate(bins.get("trt", []))}
+
+    acc = np.zeros(int(np.prod(sizes)))  # suma de log(1 - p) (o de p) por bin
+    value_column = None
+    found, available = False, set()  # pares (imt, poe) del archivo, para el mensaje de error
+    for chunk in pd.read_csv(path, comment="#", chunksize=rows_per_chunk):
+        if value_column is None:
+            value_column = [c for c in chunk.columns
+                            if c not in ("imt", "iml", "poe") + DISAGG_SCHEMA[kind]][0]
+
+        imts = chunk["imt"].to_numpy().astype(str)
+        poes = chunk["poe"].to_numpy(dtype=float)
+        sel = (imts == target_imt) & np.isclose(poes, target_poe, rtol=rtol)
+        if not sel.any():
+            if not found:
+                available.update(zip(imts, poes.tolist()))
+            continue
+        found = True
+        chunk = chunk[sel]
+
+        flat = np.zeros(len(chunk), dtype=np.int64)
+        for axis, size in zip(target_axes, sizes):
+            if axis == "trt":
+                idx = chunk["trt"].map(trt_lookup).to_numpy(dtype=np.int64)
+            else:
+                idx = np.searchsorted(edges[axis], chunk[axis].to_numpy(dtype=float), side="right") - 1
+                idx = np.clip(idx, 0, size - 1)
+            flat = flat * size + idx
+
+        p = chunk[value_column].to_numpy(dtype=float)
+        acc += np.bincount(flat, weights=p if reduction == "sum" else np.log1p(-p),
+                           minlength=acc.size)
+
+    if not found:
+        pairs = ", ".join(f"({imt}, {poe:g})" for imt, poe in sorted(available))
+        raise LookupError(f"{os.path.basename(path)} has no rows for ({target_imt}, {target_poe:g}); "
+                          f"available (imt, poe): {pairs or 'none'}.")
+
+    values = acc if reduction == "sum" else -np.expm1(acc)
+    return values.reshape(sizes), bins, meta
+
+
+def _normalize(values):
+    total = values.sum()
+    return values / total if total > 0 else np.zeros_like(values)
+
+
+def summarize_site(files, target_imt, target_poe, rows_per_chunk=200_000, rtol=1e-4):
+    """
+    Builds the summary of one site from its disaggregation files.
+
+    Every marginal is the linear sum of the contributions over the dropped
+    axes, normalized to one (the reduction used by `Disaggregation`).
+
+    Parameters:
+    -----------
+    files : dict
+        {kind: path} of the site (see `list_disaggregation_files`).
+    target_imt : str
+        IMT to summarize.
+    target_poe : float
+        PoE to summarize.
+    rows_per_chunk : int
+        Number of rows read at a time.
+
+    Returns:
+    --------
+    dict
+        JSON-serializable summary of the site.
+
+    Raises LookupError when a file of the site lacks (target_imt, target_poe).
+    """
+    summary = {"imt": target_imt, "poe": float(target_poe)}
+
+    kind = _pick_source(files, _MRE_SOURCES)
+    if kind is not None:
+        values, bins, meta = stream_marginal(files[kind], kind, ("mag", "dist", "eps"),
+                                             target_imt, target_poe, rows_per_chunk, rtol,
+                                             reduction="sum")
+        w = _normalize(values)
+        w_md = w.sum(axis=2)
+        i_mag, i_dist = np.unravel_index(np.argmax(w_md), w_md.shape)
+        summary.update({
+            "lon": meta.get("lon"),
+            "lat": meta.get("lat"),
+            "mean_mag": float(np.sum(w.sum(axis=(1, 2)) * bins["mag"])),
+            "mean_dist": float(np.sum(w.sum(axis=(0, 2)) * bins["dist"])),
+            "mean_eps": float(np.sum(w.sum(axis=(0, 1)) * bins["eps"])),
+            "mode_mag": float(bins["mag"][i_mag]),
+            "mode_dist": float(bins["dist"][i_dist]),
+            "mode_eps": float(bins["eps"][np.argmax(w.sum(axis=(0, 1)))]),
+        })
+
+    kind = _pick_source(files, _TRT_SOURCES)
+    if kind is not None:
+        values, bins, meta = stream_marginal(files[kind], kind, ("trt",),
+                                             target_imt, target_poe, rows_per_chunk, rtol,
+                                             reduction="sum")
+        summary["trt_shares"] = dict(zip(bins["trt"], _normalize(values).tolist()))
+        summary.setdefault("lon", meta.get("lon"))
+        summary.setdefault("lat", meta.get("lat"))
+
+    kind = _pick_source(files, _LON_LAT_SOURCES)
+    if kind is not None:
+        values, bins, meta = stream_marginal(files[kind], kind, ("lon", "lat"),
+                                             target_imt, target_poe, rows_per_chunk, rtol,
+                                             reduction="sum")
+        summary["grid_lon"] = bins["lon"].tolist()
+        summary["grid_lat"] = bins["lat"].tolist()
+        summary["lon_lat_grid"] = _normalize(values).tolist()
+        summary.setdefault("lon", meta.get("lon"))
+        summary.setdefault("lat", meta.get("lat"))
+
+    return summary
+
+
+def _read_checkpoint(checkpoint_path, target_imt, target_poe, rtol):
+    """
+    Returns the sites already summarized for (imt, poe) and drops a partially
+    written last line left by an interrupted run.
+    """
+    done = set()
+    if not os.path.exists(checkpoint_path):
+        return done
+
+    with open(checkpoint_path, "rb+") as f:
+        content = f.read()
+        if content and not content.endswith(b"\n"):
+            f.truncate(content.rfind(b"\n") + 1)
+            content = content[:content.rfind(b"\n") + 1]
+
+    for line in content.splitlines():
+        record = json.loads(line)
+        if record["imt"] == target_imt and np.isclose(record["poe"], target_poe, rtol=rtol):
+            done.add(record["site"])
+    return done
+
+
+def summarize_disaggregation_sites(base_path, target_imt, target_poe, checkpoint_path,
+                                   stat="mean", sites=None, sites_per_flush=50,
+                                   rows_per_chunk=200_000, rtol=1e-4):
+    """
+    Summarizes the disaggregation of every site of a folder out of core,
+    appending the results to a resumable checkpoint.
+
+    Parameters:
+    -----------
+    base_path : str
+        Folder with the per-site disaggregation CSV files.
+    target_imt : str
+        IMT to summarize, e.g. 'SA(1.0)'.
+    target_poe : float
+        PoE to summarize.
+    checkpoint_path : str
+        JSON-lines file receiving one summary per site. Sites already present
+        for the same (imt, poe) are skipped.
+    stat : str
+        Statistic part of the filenames, e.g. 'mean'.
+    sites : list of int, optional
+        Site ids to process (all when omitted).
+    sites_per_flush : int
+        Number of summaries buffered before they are written and synced.
+    rows_per_chunk : int
+        Number of CSV rows read at a time.
+
+    Returns:
+    --------
+    int
+        Number of sites summarized in this call.
+
+    A site whose files lack (target_imt, target_poe) raises LookupError after
+    the summaries computed so far are written to the checkpoint, so nothing
+    empty is ever stored as a summary.
+    """
+    all_files = list_disaggregation_files(base_path, stat)
+    if sites is not None:
+        unknown = [s for s in sites if s not in all_files]
+        if unknown:
+            raise ValueError(f"Sites {unknown} have no '{stat}' disaggregation files in "
+                             f"{base_path}; available sites: {sorted(all_files)}.")
+    done = _read_checkpoint(checkpoint_path, target_imt, target_poe, rtol)
+    todo = [s for s in (sites if sites is not None else all_files) if s not in done]
+
+    buffer = []
+
+    def flush():
+        if not buffer:
+            return
+        with open(checkpoint_path, "a", encoding="utf-8") as f:
+            f.write("".join(buffer))
+            f.flush()
+            os.fsync(f.fileno())
+        buffer.clear()
+
+    try:
+        for n, site in enumerate(todo, start=1):
+            try:
+                summary = summarize_site(all_files[site], target_imt, target_poe, rows_per_chunk, rtol)
+            except LookupError as e:
+                raise LookupError(f"Site {site}: {e}") from e
+            summary["site"] = site
+            buffer.append(json.dumps(summary) + "\n")
+            if n % sites_per_flush == 0:
+                flush()
+    finally:
+        flush()
+
+    return len(todo)
+
+
+def load_site_summaries(checkpoint_path, include_grids=False):
+    """
+    Reads a checkpoint written by `summarize_disaggregation_sites`.
+
+    Parameters:
+    -----------
+    checkpoint_path : str
+        JSON-lines checkpoint file.
+    include_grids : bool
+        Whether to keep the lon/lat contribution grids (as ndarrays).
+
+    Returns:
+    --------
+    pandas.DataFrame
+        One row per (site, imt, poe); TRT shares are expanded into
+        'trt:<name>' columns.
+    """
+    rows = []
+    with open(checkpoint_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.endswith("\n"):
+                break  # escritura interrumpida
+            record = json.loads(line)
+            for name, share in record.pop("trt_shares", {}).items():
+                record[f"trt:{name}"] = share
+            grid = record.pop("lon_lat_grid", None)
+            if include_grids:
+                record["lon_lat_grid"] = None if grid is None else np.asarray(grid)
+            else:
+                record.pop("grid_lon", None)
+                record.pop("grid_lat", None)
+            rows.append(record)
+    return pd.DataFrame(rows)
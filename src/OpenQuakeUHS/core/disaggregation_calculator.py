@@ -4,11 +4,18 @@ import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
 from matplotlib import cm
 import os
+import glob
 import geopandas as gpd
+from OpenQuakeUHS.core.artifact_cache import artifact_key, resolve_cache
+from OpenQuakeUHS.core.disaggregation_index import DisaggregationIndex
+
+# Atributos que `Disaggregation.csv_files` crea al leer los archivos
+_LOADED_ATTRIBUTES = ("data", "data_TRT", "data_lon_lat", "index", "index_TRT", "index_lon_lat")
+
 
 class Disaggregation:
 
-    def __init__(self, shp_path_ecuador , base_path , target_poe , target_imt , PRY ,save_path=None  ):
+    def __init__(self, shp_path_ecuador , base_path , target_poe , target_imt , PRY ,save_path=None , cache=False ):
   
         self.shp_path_ecuador=shp_path_ecuador
         self.base_path = base_path
@@ -16,12 +23,27 @@ class Disaggregation:
         self.target_imt = target_imt
         self.save_path=save_path
         self.PRY=PRY
+        self.cache=cache  # caché de figuras (False = desactivada, por defecto; True = caché por defecto o un ArtifactCache)
 
-        self.csv_files()
+        # Los CSV se leen al usarlos por primera vez: con un acierto de caché
+        # la figura se restaura sin leerlos
+        self.locate_csv_files()
         self.plot_disaggregation()
 
-    def csv_files(self):
-        
+    def __getattr__(self, name):
+        # Tablas e índices cargados bajo demanda por `csv_files`
+        if name in _LOADED_ATTRIBUTES:
+            self.csv_files()
+            return self.__dict__[name]
+        raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+
+    def locate_csv_files(self):
+        """
+        Finds the mean disaggregation files of `base_path` without reading them.
+
+        Returns:
+        - list of str: Paths of the Mag_Dist_Eps, TRT_Mag_Dist and TRT_Lon_Lat files
+        """
         # === Buscar archivos CSV ===
         csv_files = [f for f in os.listdir(self.base_path) if f.endswith('.csv')]
 
@@ -36,20 +58,46 @@ class Disaggregation:
         if file_lon_lat is None:
             raise FileNotFoundError("No se encontró el archivo 'TRT_Lon_Lat-mean*.csv' en la carpeta.")
 
+        self.input_files = [os.path.join(self.base_path, f) for f in (file_data, file_data_TRT, file_lon_lat)]
+        return self.input_files
+
+    def csv_files(self):
+        file_data, file_data_TRT, file_lon_lat = self.locate_csv_files()
+
         # === Cargar archivos ===
-        self.data = pd.read_csv(os.path.join(self.base_path, file_data), comment='#')
-        self.data_TRT = pd.read_csv(os.path.join(self.base_path, file_data_TRT), comment='#')
-        self.data_lon_lat = pd.read_csv(os.path.join(self.base_path, file_lon_lat), comment='#')
+        self.data = pd.read_csv(file_data, comment='#')
+        self.data_TRT = pd.read_csv(file_data_TRT, comment='#')
+        self.data_lon_lat = pd.read_csv(file_lon_lat, comment='#')
 
+        # === Indexar por (imt, poe) una sola vez ===
+        self.index = DisaggregationIndex(self.data)
+        self.index_TRT = DisaggregationIndex(self.data_TRT)
+        self.index_lon_lat = DisaggregationIndex(self.data_lon_lat)
 
-    
         return self.data , self.data_TRT, self.data_lon_lat 
     
 
-    def disaggregation_mod_mean(self):
-        data=self.data
+    def sweep(self, imts=None, poes=None):
+        """
+        Iterates over the (imt, poe) groups of the loaded files.
+
+        Parameters:
+        - imts (list of str): IMTs to visit (all when omitted)
+        - poes (list of float): PoEs to visit (all available when omitted)
+
+        Yields:
+        - (imt, poe, data, data_TRT, data_lon_lat): slices of the three tables
+        """
+        for imt, poe, data in self.index.sweep(imts, poes):
+            yield (imt, poe, data,
+                   self.index_TRT.get(imt, poe),
+                   self.index_lon_lat.get(imt, poe))
+
+    def disaggregation_mod_mean(self, target_poe=None, target_imt=None):
+        target_poe = self.target_poe if target_poe is None else target_poe
+        target_imt = self.target_imt if target_imt is None else target_imt
         # === Filtrar por poe ===
-        data01 = data[(data['poe'] == self.target_poe) & (data['imt'] == self.target_imt)].copy()
+        data01 = self.index.get(target_imt, target_poe).copy()
 
         # Buscar la columna que comience con 'mean' o 'rlz'
         hz_key = [col for col in data01.columns if col.startswith('mean') or col.startswith('rlz')][0]
@@ -93,9 +141,10 @@ class Disaggregation:
         return dat , mod_mag , mod_dist , mean_mag , mean_dist, clrs, eps_vals
 
 
-    def disaggregation_TRT(self):
-        data_TRT=self.data_TRT
-        data_TRT =  data_TRT[(data_TRT['poe'] == self.target_poe) & (data_TRT['imt'] == self.target_imt)].copy()
+    def disaggregation_TRT(self, target_poe=None, target_imt=None):
+        target_poe = self.target_poe if target_poe is None else target_poe
+        target_imt = self.target_imt if target_imt is None else target_imt
+        data_TRT = self.index_TRT.get(target_imt, target_poe).copy()
         # === Calcular contribución porcentual ===
         data_TRT['hz_cont_TRT'] = data_TRT['mean'] / data_TRT['mean'].sum()
         # === Codificar por 'trt' con colores 'tab:' ===
@@ -106,15 +155,11 @@ class Disaggregation:
 
         return data_TRT, trt_to_color_TRT , trt_unique_TRT
 
-    def disaggregation_lon_lat(self):  
-
-        # === Leer datos sísmicos por lon/lat ===
-        data_lon_lat =self.data_lon_lat
+    def disaggregation_lon_lat(self, target_poe=None, target_imt=None):
+        target_poe = self.target_poe if target_poe is None else target_poe
+        target_imt = self.target_imt if target_imt is None else target_imt
         # === Filtrar por IMT y PoE objetivo ===
-        data_lon_lat_filt = data_lon_lat[
-            (data_lon_lat['imt'] == self.target_imt) & 
-            (data_lon_lat['poe'] == self.target_poe)
-        ].copy()
+        data_lon_lat_filt = self.index_lon_lat.get(target_imt, target_poe).copy()
         # === Calcular contribución porcentual ===
         data_lon_lat_filt['hz_cont_lon_lat'] = (
             data_lon_lat_filt['mean'] / data_lon_lat_filt['mean'].sum()
@@ -141,6 +186,20 @@ class Disaggregation:
 
     
     def plot_disaggregation(self):
+        # === Caché de figuras: mismas entradas y parámetros -> restaurar archivos sin recalcular ===
+        outputs = [f"{self.save_path}_disaggregation.svg", f"{self.save_path}_disaggregation.pdf"]
+        cache = resolve_cache(self.cache) if self.save_path else None
+        if cache is not None:
+            shp_stem = os.path.splitext(self.shp_path_ecuador)[0]
+            key = artifact_key(
+                "Disaggregation.plot_disaggregation",
+                self.input_files + sorted(glob.glob(glob.escape(shp_stem) + ".*")),
+                {"target_poe": self.target_poe, "target_imt": self.target_imt, "PRY": self.PRY},
+            )
+            if cache.restore_files(key, outputs):
+                print(f"Figures restored from cache to {self.save_path}_disaggregation.(svg/pdf)")
+                return outputs
+
         data , mod_mag , mod_dist , mean_mag , mean_dist, clrs, eps_vals= self.disaggregation_mod_mean()
         data_TRT, trt_to_color_TRT, trt_unique_TRT = self.disaggregation_TRT()
         data_lon_lat_filt=self.disaggregation_lon_lat() 
@@ -275,6 +334,9 @@ class Disaggregation:
             fig.savefig(f"{self.save_path}_disaggregation.svg", format="svg", bbox_inches="tight")
             fig.savefig(f"{self.save_path}_disaggregation.pdf", format="pdf", bbox_inches="tight")
             print(f"Figures saved to {self.save_path}_disaggregation.(svg/pdf)")
+            if cache is not None:
+                cache.store_files(key, outputs)
+            return outputs
 
         else:
             plt.show()
@@ -0,0 +1,110 @@
+"""
+Pre-grouped (IMT, PoE) Index for Disaggregation Tables
+Author: Ing. Patricio Palacios Msc.
+Date: October 19, 2026
+
+Description:
+------------
+OpenQuake disaggregation tables stack the bins of every IMT and PoE in one
+file. Filtering them with boolean masks scans the whole table on each call,
+which is repeated for every (IMT, PoE) of a sweep.
+
+`DisaggregationIndex` sorts a loaded table once by (imt, poe) and records
+the offset range of each group, so every later lookup is a slice of the
+sorted table. PoEs are matched with a relative tolerance instead of `==`
+on parsed floats.
+"""
+
+import numpy as np
+
+
+class DisaggregationIndex:
+    """
+    Sorted view of a disaggregation DataFrame with offset ranges per (imt, poe).
+    """
+    def __init__(self, data, rtol=1e-4, atol=1e-12):
+        """
+        Parameters:
+        - data (pandas.DataFrame): Table with 'imt' and 'poe' columns
+        - rtol (float): Relative tolerance used to match PoEs
+        - atol (float): Absolute tolerance used to match PoEs
+        """
+        self.rtol = rtol
+        self.atol = atol
+
+        imt_values = data["imt"].to_numpy()
+        imts, imt_codes = np.unique(imt_values, return_inverse=True)
+        poes = data["poe"].to_numpy(dtype=float)
+
+        order = np.lexsort((poes, imt_codes))
+        self.data = data.iloc[order].reset_index(drop=True)
+
+        codes = imt_codes[order]
+        poes = poes[order]
+        change = np.flatnonzero((np.diff(codes) != 0) | (np.diff(poes) != 0)) + 1
+        starts = np.concatenate(([0], change))
+        stops = np.concatenate((change, [len(poes)]))
+
+        # {imt: (poes, starts, stops)} with the PoEs of each IMT sorted
+        self._groups = {}
+        for imt_code, imt in enumerate(imts):
+            sel = codes[starts] == imt_code
+            self._groups[str(imt)] = (poes[starts[sel]], starts[sel], stops[sel])
+
+    @property
+    def imts(self):
+        """Returns the IMTs present in the table."""
+        return list(self._groups)
+
+    def poes(self, imt):
+        """Returns the PoEs available for an IMT (ascending)."""
+        return self._groups[imt][0].copy() if imt in self._groups else np.array([])
+
+    def keys(self):
+        """Returns the list of (imt, poe) groups."""
+        return [(imt, float(p)) for imt, (poes, _, _) in self._groups.items() for p in poes]
+
+    def _locate(self, imt, poe):
+        if imt not in self._groups:
+            return None
+        poes, starts, stops = self._groups[imt]
+        match = np.flatnonzero(np.isclose(poes, poe, rtol=self.rtol, atol=self.atol))
+        if len(match) == 0:
+            return None
+        k = match[0]
+        return starts[k], stops[k]
+
+    def get(self, imt, poe):
+        """
+        Returns the rows of a single (imt, poe) group as a slice of the sorted table.
+
+        Parameters:
+        - imt (str): Intensity measure type, e.g. 'SA(3.53)'
+        - poe (float): Target PoE (matched with the index tolerance)
+
+        Returns:
+        - pandas.DataFrame: Rows of the group (empty when not found)
+        """
+        bounds = self._locate(imt, poe)
+        if bounds is None:
+            return self.data.iloc[0:0]
+        return self.data.iloc[bounds[0]:bounds[1]]
+
+    def sweep(self, imts=None, poes=None):
+        """
+        Iterates over (imt, poe) groups in O(slice) time each.
+
+        Parameters:
+        - imts (list of str): IMTs to visit (all when omitted)
+        - poes (list of float): PoEs to visit (all available when omitted)
+
+        Yields:
+        - (imt, poe, pandas.DataFrame)
+        """
+        for imt in (imts if imts is not None else self.imts):
+            targets = poes if poes is not None else self.poes(imt)
+            for poe in targets:
+                bounds = self._locate(imt, poe)
+                if bounds is None:
+                    continue
+                yield imt, float(poe), self.data.iloc[bounds[0]:bounds[1]]
@@ -0,0 +1,370 @@
+"""
+Schema-driven Loader for OpenQuake Disaggregation Outputs
+Author: Ing. Patricio Palacios Msc.
+Date: October 19, 2026
+
+Description:
+------------
+OpenQuake writes up to eleven disaggregation outputs per site
+('Mag', 'Dist', 'TRT', 'Mag_Dist', 'Mag_Dist_Eps', 'Lon_Lat', 'Mag_Lon_Lat',
+'TRT_Lon_Lat', 'TRT_Mag', 'TRT_Mag_Dist', 'TRT_Mag_Dist_Eps'). This module
+reads any of them into the same binned array form, `DisaggregationArray`,
+with values[imt, poe, *bins] and the bin edges/centers taken from the file
+metadata.
+
+`DisaggregationLoader` serves a requested kind from, in order:
+1. an array already loaded (directly or by reduction),
+2. the file of that kind,
+3. the smallest file whose bins contain the requested ones, reduced.
+
+Marginals are aggregated as OpenQuake does, 1 - prod(1 - p) over the
+dropped bins, so a 'Mag' array derived from 'TRT_Mag_Dist_Eps' matches the
+'Mag' export.
+"""
+
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from OpenQuakeUHS.core.oq_metadata import read_metadata
+
+# === Esquema: tipo de salida -> ejes de bins ===
+DISAGG_SCHEMA = {
+    "Mag": ("mag",),
+    "Dist": ("dist",),
+    "TRT": ("trt",),
+    "Mag_Dist": ("mag", "dist"),
+    "Mag_Dist_Eps": ("mag", "dist", "eps"),
+    "Lon_Lat": ("lon", "lat"),
+    "Mag_Lon_Lat": ("mag", "lon", "lat"),
+    "TRT_Lon_Lat": ("trt", "lon", "lat"),
+    "TRT_Mag": ("trt", "mag"),
+    "TRT_Mag_Dist": ("trt", "mag", "dist"),
+    "TRT_Mag_Dist_Eps": ("trt", "mag", "dist", "eps"),
+}
+
+_EDGE_KEYS = {
+    "mag": "mag_bin_edges",
+    "dist": "dist_bin_edges",
+    "eps": "eps_bin_edges",
+    "lon": "lon_bin_edges",
+    "lat": "lat_bin_edges",
+}
+
+# Mag_Dist_Eps-mean-0_17.csv -> kind, stat, site id, calc id
+_FILENAME_PATTERN = re.compile(
+    r"^(?P<kind>" + "|".join(sorted(DISAGG_SCHEMA, key=len, reverse=True)) + r")"
+    r"-(?P<stat>.+)-(?P<site>\d+)_(?P<calc_id>\d+)\.csv$"
+)
+
+
+def kind_from_axes(axes):
+    """
+    Returns the disaggregation kind whose bins are exactly `axes` (any order).
+    """
+    for kind, kind_axes in DISAGG_SCHEMA.items():
+        if set(kind_axes) == set(axes) and len(kind_axes) == len(axes):
+            return kind
+    raise ValueError(f"No disaggregation kind has the axes {tuple(axes)}.")
+
+
+def pprod(values, axis):
+    """
+    Probability of at least one exceedance, 1 - prod(1 - p), along `axis`.
+    """
+    return -np.expm1(np.sum(np.log1p(-np.asarray(values, dtype=float)), axis=axis))
+
+
+class DisaggregationArray:
+    """
+    Binned disaggregation result: values[imt, poe, *bins] for one kind.
+    """
+    def __init__(self, kind, imts, poes, imls, bins, edges, values, meta=None, column="mean"):
+        """
+        Parameters:
+        - kind (str): Disaggregation kind, e.g. 'Mag_Dist_Eps'
+        - imts (list of str): Intensity measure types (n_imt,)
+        - poes (ndarray): Target PoEs (n_poe,)
+        - imls (ndarray): Intensity levels per (imt, poe) (n_imt, n_poe)
+        - bins (dict): {axis: bin centers (ndarray) or TRT names (list)}
+        - edges (dict): {axis: bin edges (ndarray)} for the numeric axes
+        - values (ndarray): PoE contributions (n_imt, n_poe, *bin sizes)
+        - meta (dict): Metadata of the source file
+        - column (str): Statistic column read from the file (e.g. 'mean')
+        """
+        self.kind = kind
+        self.axes = DISAGG_SCHEMA[kind]
+        self.imts = list(imts)
+        self.poes = np.asarray(poes, dtype=float)
+        self.imls = np.asarray(imls, dtype=float)
+        self.bins = bins
+        self.edges = edges
+        self.values = values
+        self.meta = meta or {}
+        self.column = column
+
+    def get(self, imt, poe, rtol=1e-4):
+        """
+        Returns the binned values of one (imt, poe) group.
+
+        Returns:
+        - ndarray: Values with one dimension per axis of the kind
+        """
+        if imt not in self.imts:
+            raise ValueError(f"IMT {imt} not found in {self.kind}.")
+        match = np.flatnonzero(np.isclose(self.poes, poe, rtol=rtol))
+        if len(match) == 0:
+            raise ValueError(f"PoE {poe} not found in {self.kind}.")
+        return self.values[self.imts.index(imt), match[0]]
+
+    def total(self):
+        """
+        Returns the aggregated PoE over all bins (n_imt, n_poe).
+        """
+        axes = tuple(range(2, 2 + len(self.axes)))
+        return pprod(self.values, axis=axes)
+
+    def marginal(self, kind):
+        """
+        Reduces the array to a kind whose bins are a subset of this one.
+
+        Parameters:
+        - kind (str): Target kind, e.g. 'Mag_Dist'
+
+        Returns:
+        - DisaggregationArray
+        """
+        target = DISAGG_SCHEMA[kind]
+        if not set(target) <= set(self.axes):
+            raise ValueError(f"{kind} cannot be derived from {self.kind}.")
+
+        dropped = tuple(2 + i for i, a in enumerate(self.axes) if a not in target)
+        kept = [a for a in self.axes if a in target]
+        values = pprod(self.values, axis=dropped) if dropped else self.values
+
+        order = [0, 1] + [2 + kept.index(a) for a in target]
+        order += list(range(len(order), values.ndim))  # ejes extra (p.ej. realizaciones)
+        values = np.transpose(values, order)
+
+        return DisaggregationArray(
+            kind, self.imts, self.poes, self.imls,
+            {a: self.bins[a] for a in target},
+            {a: self.edges[a] for a in target if a in self.edges},
+            values, self.meta, self.column,
+        )
+
+    def to_frame(self):
+        """
+        Returns the array in OpenQuake's long table layout
+        (imt, iml, poe, <bins>, <column>).
+        """
+        grids = np.meshgrid(
+            np.arange(len(self.imts)), np.arange(len(self.poes)),
+            *[np.arange(len(self.bins[a])) for a in self.axes], indexing="ij",
+        )
+        flat = [g.ravel() for g in grids]
+        frame = {
+            "imt": np.asarray(self.imts, dtype=object)[flat[0]],
+            "iml": self.imls[flat[0], flat[1]],
+            "poe": self.poes[flat[1]],
+        }
+        for axis, idx in zip(self.axes, flat[2:]):
+            frame[axis] = np.asarray(self.bins[axis], dtype=object if axis == "trt" else float)[idx]
+        frame[self.column] = self.values.ravel()
+        return pd.DataFrame(frame)
+
+
+def list_disaggregation_files(base_path, stat="mean"):
+    """
+    Groups the disaggregation files of a folder by site id.
+
+    Parameters:
+    -----------
+    base_path : str
+        Folder with the disaggregation CSV files.
+    stat : str
+        Statistic part of the filenames, e.g. 'mean'.
+
+    Returns:
+    --------
+    dict
+        {site id: {kind: path}} ordered by site id.
+    """
+    sites = {}
+    for f in sorted(os.listdir(base_path)):
+        match = _FILENAME_PATTERN.match(f)
+        if not match or match.group("stat") != stat:
+            continue
+        site = int(match.group("site"))
+        sites.setdefault(site, {})[match.group("kind")] = os.path.join(base_path, f)
+    return dict(sorted(sites.items()))
+
+
+def bins_from_metadata(axis, meta):
+    """
+    Returns the bin centers (TRT names for 'trt') and edges (None for 'trt')
+    of an axis from the parsed file metadata.
+    """
+    if axis == "trt":
+        return list(meta.get("tectonic_region_types", [])), None
+    edges = np.asarray(meta[_EDGE_KEYS[axis]], dtype=float)
+    return 0.5 * (edges[:-1] + edges[1:]), edges
+
+
+def bin_index(df, axes, meta):
+    """
+    Locates the rows of a disaggregation table in the binned array layout.
+
+    Parameters:
+    -----------
+    df : pandas.DataFrame
+        Table read from a disaggregation CSV file.
+    axes : tuple of str
+        Bin axes of the kind (see `DISAGG_SCHEMA`).
+    meta : dict
+        File metadata with the bin edges.
+
+    Returns:
+    --------
+    imts : ndarray
+        Sorted IMTs (n_imt,).
+    poes : ndarray
+        Sorted target PoEs (n_poe,).
+    imls : ndarray
+        Intensity levels per (imt, poe) (n_imt, n_poe).
+    bins, edges : dict
+        Bin centers (TRT names) and edges of each axis.
+    index : tuple of ndarray
+        Position of every row, (imt, poe, *bins).
+    """
+    imts, imt_idx = np.unique(df["imt"].to_numpy().astype(str), return_inverse=True)
+    poes, poe_idx = np.unique(df["poe"].to_numpy(dtype=float), return_inverse=True)
+
+    imls = np.full((len(imts), len(poes)), np.nan)
+    imls[imt_idx, poe_idx] = df["iml"].to_numpy(dtype=float)
+
+    bins, edges, index = {}, {}, [imt_idx, poe_idx]
+    for axis in axes:
+        centers, axis_edges = bins_from_metadata(axis, meta)
+        if axis == "trt":
+            names = list(centers) or sorted(df["trt"].unique())
+            lookup = {name: i for i, name in enumerate(names)}
+            index.append(df["trt"].map(lookup).to_numpy(dtype=int))
+            bins[axis] = names
+        else:
+            idx = np.searchsorted(axis_edges, df[axis].to_numpy(dtype=float), side="right") - 1
+            index.append(np.clip(idx, 0, len(centers) - 1))
+            bins[axis] = centers
+            edges[axis] = axis_edges
+    return imts, poes, imls, bins, edges, tuple(index)
+
+
+def read_disaggregation_file(path, kind=None, column=None):
+    """
+    Reads a disaggregation CSV file into a `DisaggregationArray`.
+
+    Parameters:
+    -----------
+    path : str
+        Path to the CSV file.
+    kind : str, optional
+        Disaggregation kind (taken from the filename when omitted).
+    column : str, optional
+        Statistic column to read (the first 'mean'/'rlz'/'quantile' column
+        when omitted).
+
+    Returns:
+    --------
+    DisaggregationArray
+    """
+    if kind is None:
+        match = _FILENAME_PATTERN.match(os.path.basename(path))
+        if not match:
+            raise ValueError(f"Cannot infer the disaggregation kind of {os.path.basename(path)}.")
+        kind = match.group("kind")
+    axes = DISAGG_SCHEMA[kind]
+
+    meta = read_metadata(path)
+    df = pd.read_csv(path, comment="#")
+    if column is None:
+        column = [c for c in df.columns if c not in ("imt", "iml", "poe") + axes][0]
+
+    imts, poes, imls, bins, edges, index = bin_index(df, axes, meta)
+    values = np.zeros((len(imts), len(poes)) + tuple(len(bins[a]) for a in axes))
+    values[index] = df[column].to_numpy(dtype=float)
+
+    return DisaggregationArray(kind, imts.tolist(), poes, imls, bins, edges, values, meta, column)
+
+
+class DisaggregationLoader:
+    """
+    Loads disaggregation kinds of one site from a folder, reading heavy files
+    only when the requested kind cannot be obtained otherwise.
+    """
+    def __init__(self, base_path, stat="mean", site=None):
+        """
+        Parameters:
+        - base_path (str): Folder with the disaggregation CSV files
+        - stat (str): Statistic part of the filenames, e.g. 'mean'
+        - site (int): Site id of the filenames (the first one found when omitted)
+        """
+        self.base_path = base_path
+        self.stat = stat
+        self._cache = {}
+
+        sites = list_disaggregation_files(base_path, stat)
+        if site is None and sites:
+            site = next(iter(sites))
+        self.site = site
+        self.files = sites.get(site, {})
+
+    @property
+    def available(self):
+        """Kinds that can be served (from files or by reduction)."""
+        return [k for k in DISAGG_SCHEMA if self._source_for(k) is not None]
+
+    def _source_for(self, kind):
+        target = set(DISAGG_SCHEMA[kind])
+        loaded = [a for a in self._cache.values() if target <= set(a.axes)]
+        if loaded:
+            return ("array", min(loaded, key=lambda a: a.values.size))
+        if kind in self.files:
+            return ("file", kind)
+        supersets = [k for k in self.files if target <= set(DISAGG_SCHEMA[k])]
+        if supersets:
+            return ("file", min(supersets, key=lambda k: os.path.getsize(self.files[k])))
+        return None
+
+    def get(self, kind):
+        """
+        Returns a disaggregation kind as a `DisaggregationArray`.
+
+        Parameters:
+        - kind (str): One of `DISAGG_SCHEMA`
+
+        Returns:
+        - DisaggregationArray
+        """
+        if kind not in DISAGG_SCHEMA:
+            raise ValueError(f"Unknown disaggregation kind {kind}.")
+        if kind in self._cache:
+            return self._cache[kind]
+
+        source = self._source_for(kind)
+        if source is None:
+            raise FileNotFoundError(
+                f"No file in {self.base_path} provides the '{kind}' disaggregation.")
+
+        origin, ref = source
+        if origin == "file":
+            array = read_disaggregation_file(self.files[ref], ref)
+            self._cache[ref] = array
+        else:
+            array = ref
+
+        if array.kind != kind:
+            array = array.marginal(kind)
+            self._cache[kind] = array
+        return array
@@ -0,0 +1,435 @@
+"""
+Per-realization Disaggregation
+Author: Ing. Patricio Palacios Msc.
+Date: October 19, 2026
+
+Description:
+------------
+When OpenQuake exports the disaggregation of individual realizations, each
+file holds one 'rlz*' column per realization next to the bin columns.
+`Disaggregation.disaggregation_mod_mean` reads only the first of them.
+
+This module reads all the realization columns of a file at once into a
+`RealizationDisaggregation`, values[imt, poe, *bins, rlz], so every
+(imt, poe) group is a (bin x realization) array, and computes for all
+realizations in one pass:
+
+- mean and modal magnitude, distance and epsilon (`mre_by_realization`)
+- contribution share of each tectonic region type (`trt_shares_by_realization`)
+- the spread of those quantities over the logic tree (`realization_spread`),
+  weighted with the realization weights of 'realizations_<calc_id>.csv'
+
+Contributions are normalized per realization as in
+`Disaggregation.disaggregation_mod_mean`. `realization_file_weights` (or
+`realization_file_weight` one file at a time) maps per-realization hazard
+curve / UHS files to the same weights.
+"""
+
+import glob
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from OpenQuakeUHS.core.disaggregation_loader import (
+    DISAGG_SCHEMA,
+    DisaggregationArray,
+    bin_index,
+)
+from OpenQuakeUHS.core.hazard_stack import parse_output_filename
+from OpenQuakeUHS.core.oq_metadata import read_metadata
+from OpenQuakeUHS.core.weighted_statistics import weighted_percentiles
+
+# 'rlz-000', 'rlz0', 'rlz-12' -> id de la realización
+_RLZ_COLUMN = re.compile(r"^rlz-?(\d+)$")
+_CALC_ID = re.compile(r"_(\d+)\.csv$")
+
+
+def read_realizations(path):
+    """
+    Reads an OpenQuake 'realizations_<calc_id>.csv' file.
+
+    Parameters:
+    -----------
+    path : str
+        Path to the CSV file.
+
+    Returns:
+    --------
+    pandas.DataFrame
+        Columns 'rlz_id', 'branch_path', 'weight', indexed by 'rlz_id'.
+    """
+    df = pd.read_csv(path, comment="#")
+    missing = {"rlz_id", "branch_path", "weight"} - set(df.columns)
+    if missing:
+        raise ValueError(f"{os.path.basename(path)} lacks the columns {sorted(missing)}.")
+    df["rlz_id"] = df["rlz_id"].astype(int)
+    df["weight"] = df["weight"].astype(float)
+    return df.set_index("rlz_id", drop=False)
+
+
+def find_realizations_file(base_path, calc_id=None):
+    """
+    Returns the 'realizations_<calc_id>.csv' file of a folder (the first one
+    when `calc_id` is omitted), or None.
+    """
+    pattern = f"realizations_{calc_id}.csv" if calc_id is not None else "realizations_*.csv"
+    found = sorted(glob.glob(os.path.join(glob.escape(base_path), pattern)))
+    return found[0] if found else None
+
+
+def realization_weight_table(paths, realizations=None):
+    """
+    Realization weights for a set of realization files.
+
+    Parameters:
+    -----------
+    paths : list of str
+        Realization files ('<output>-rlz-<id>...').
+    realizations : str or pandas.DataFrame, optional
+        'realizations_<calc_id>.csv' (path or `read_realizations` output).
+        Searched next to the first file when omitted.
+
+    Returns:
+    --------
+    pandas.Series or None
+        Weight by 'rlz_id'; None when no realizations table is found (equal
+        weights).
+    """
+    if realizations is None:
+        if not len(paths):
+            return None
+        info = parse_output_filename(paths[0])
+        realizations = find_realizations_file(os.path.dirname(paths[0]), info and info["calc_id"])
+        if realizations is None:
+            return None
+    if isinstance(realizations, str):
+        realizations = read_realizations(realizations)
+    table = realizations.set_index("rlz_id", drop=False) if "rlz_id" in realizations else realizations
+    return table["weight"].astype(float)
+
+
+def realization_file_weight(path, table):
+    """
+    Logic-tree weight of one realization file, from `realization_weight_table`
+    (1.0 when `table` is None). Raises ValueError when the file is not a
+    realization export or its realization is not in the table.
+    """
+    if table is None:
+        return 1.0
+    info = parse_output_filename(path)
+    if info is None or not str(info["kind"]).startswith("rlz-"):
+        raise ValueError(f"{os.path.basename(path)} is not a realization file.")
+    rlz_id = int(info["kind"].split("-")[1])
+    if rlz_id not in table.index:
+        raise ValueError(f"Realization {rlz_id} is not in the realizations table.")
+    return float(table.loc[rlz_id])
+
+
+def realization_file_weights(paths, realizations=None):
+    """
+    Logic-tree weight of every realization file ('<output>-rlz-<id>...').
+
+    Parameters:
+    -----------
+    paths : list of str
+        Realization files.
+    realizations : str or pandas.DataFrame, optional
+        'realizations_<calc_id>.csv' (path or `read_realizations` output).
+        Searched next to the files when omitted.
+
+    Returns:
+    --------
+    ndarray (n_files,) or None
+        Weights in the order of `paths`; None when no realizations table is
+        found (equal weights).
+    """
+    if not len(paths):
+        return None
+    table = realization_weight_table(paths, realizations)
+    if table is None:
+        return None
+    return np.asarray([realization_file_weight(path, table) for path in paths])
+
+
+class RealizationDisaggregation(DisaggregationArray):
+    """
+    Binned disaggregation of several realizations: values[imt, poe, *bins, rlz].
+    """
+    def __init__(self, kind, imts, poes, imls, bins, edges, values, meta=None,
+                 columns=None, rlz_ids=None, weights=None):
+        """
+        Parameters:
+        - kind, imts, poes, imls, bins, edges, meta: As in `DisaggregationArray`
+        - values (ndarray): PoE contributions (n_imt, n_poe, *bin sizes, n_rlz)
+        - columns (list of str): Realization columns of the source file
+        - rlz_ids (ndarray): Realization ids (n_rlz,)
+        - weights (ndarray): Logic-tree weights (n_rlz,), normalized to sum 1
+        """
+        super().__init__(kind, imts, poes, imls, bins, edges, values, meta, column="rlz")
+        n_rlz = values.shape[-1]
+        self.columns = list(columns) if columns is not None else [f"rlz-{i:03d}" for i in range(n_rlz)]
+        self.rlz_ids = np.arange(n_rlz) if rlz_ids is None else np.asarray(rlz_ids, dtype=int)
+        if weights is None:
+            weights = np.ones(n_rlz)
+        weights = np.asarray(weights, dtype=float)
+        self.weights = weights / weights.sum()
+
+    @property
+    def n_rlz(self):
+        return self.values.shape[-1]
+
+    def matrix(self, imt, poe, rtol=1e-4):
+        """
+        Returns one (imt, poe) group as a 2D array (n_bins, n_rlz), bins
+        flattened in C order over the axes of the kind.
+        """
+        return self.get(imt, poe, rtol).reshape(-1, self.n_rlz)
+
+    def marginal(self, kind):
+        """
+        Reduces the array to a kind whose bins are a subset of this one,
+        for every realization.
+
+        Returns:
+        - RealizationDisaggregation
+        """
+        base = super().marginal(kind)
+        return RealizationDisaggregation(
+            kind, base.imts, base.poes, base.imls, base.bins, base.edges, base.values,
+            self.meta, self.columns, self.rlz_ids, self.weights,
+        )
+
+    def realization(self, rlz_id):
+        """
+        Returns a single realization as a `DisaggregationArray`.
+        """
+        match = np.flatnonzero(self.rlz_ids == rlz_id)
+        if len(match) == 0:
+            raise ValueError(f"Realization {rlz_id} not found in {self.kind}.")
+        i = match[0]
+        return DisaggregationArray(self.kind, self.imts, self.poes, self.imls, self.bins,
+                                   self.edges, self.values[..., i], self.meta, self.columns[i])
+
+    def to_frame(self):
+        """
+        Returns the array in OpenQuake's long table layout, one column per
+        realization (imt, iml, poe, <bins>, <rlz columns>).
+        """
+        frame = self.realization(self.rlz_ids[0]).to_frame().drop(columns=self.columns[0])
+        flat = self.values.reshape(-1, self.n_rlz)
+        for i, column in enumerate(self.columns):
+            frame[column] = flat[:, i]
+        return frame
+
+
+def read_disaggregation_realizations(path, kind=None, columns=None, realizations=None):
+    """
+    Reads all the realization columns of a disaggregation CSV file.
+
+    Parameters:
+    -----------
+    path : str
+        Path to the CSV file.
+    kind : str, optional
+        Disaggregation kind (taken from the filename when omitted).
+    columns : list of str, optional
+        Realization columns to read (every 'rlz*' column when omitted).
+    realizations : str or pandas.DataFrame, optional
+        'realizations_<calc_id>.csv' (path or `read_realizations` output)
+        with the logic-tree weights. Searched next to `path` when omitted;
+        equal weights are used when none is found.
+
+    Returns:
+    --------
+    RealizationDisaggregation
+    """
+    name = os.path.basename(path)
+    if kind is None:
+        kind = next((k for k in sorted(DISAGG_SCHEMA, key=len, reverse=True)
+                     if name.startswith(k + "-")), None)
+        if kind is None:
+            raise ValueError(f"Cannot infer the disaggregation kind of {name}.")
+    axes = DISAGG_SCHEMA[kind]
+
+    meta = read_metadata(path)
+    df = pd.read_csv(path, comment="#")
+    if columns is None:
+        columns = [c for c in df.columns if _RLZ_COLUMN.match(c)]
+    if not columns:
+        raise ValueError(f"{name} has no realization columns.")
+    rlz_ids = np.array([int(_RLZ_COLUMN.match(c).group(1)) if _RLZ_COLUMN.match(c) else i
+                        for i, c in enumerate(columns)])
+
+    imts, poes, imls, bins, edges, index = bin_index(df, axes, meta)
+    values = np.zeros((len(imts), len(poes)) + tuple(len(bins[a]) for a in axes) + (len(columns),))
+    values[index] = df[columns].to_numpy(dtype=float)
+
+    if realizations is None:
+        match = _CALC_ID.search(name)
+        realizations = find_realizations_file(os.path.dirname(path) or ".",
+                                              match.group(1) if match else None)
+    weights = None
+    if realizations is not None:
+        if isinstance(realizations, str):
+            realizations = read_realizations(realizations)
+        known = realizations["weight"].reindex(rlz_ids)
+        if known.isna().any():
+            raise ValueError(f"Realizations {rlz_ids[known.isna().to_numpy()].tolist()} "
+                             f"have no weight in the realizations table.")
+        weights = known.to_numpy()
+
+    return RealizationDisaggregation(kind, imts.tolist(), poes, imls, bins, edges, values,
+                                     meta, columns, rlz_ids, weights)
+
+
+def _normalize(values, axes):
+    """Normalizes the contributions of every realization to sum 1 (NaN when empty)."""
+    total = values.sum(axis=axes, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(total > 0, values / total, np.nan)
+
+
+def mre_by_realization(array, imt, poe, rtol=1e-4):
+    """
+    Mean and modal magnitude, distance and epsilon of every realization.
+
+    Parameters:
+    -----------
+    array : RealizationDisaggregation
+        Kind with 'mag', 'dist' and 'eps' bins (e.g. 'Mag_Dist_Eps').
+    imt : str
+        IMT of the group.
+    poe : float
+        Target PoE of the group.
+
+    Returns:
+    --------
+    pandas.DataFrame
+        One row per realization: 'rlz_id', 'weight', 'mean_mag',
+        'mean_dist', 'mean_eps', 'mode_mag', 'mode_dist', 'mode_eps'.
+    """
+    if array.kind != "Mag_Dist_Eps":
+        array = array.marginal("Mag_Dist_Eps")
+    w = _normalize(array.get(imt, poe, rtol), (0, 1, 2))  # (mag, dist, eps, rlz)
+    mag, dist, eps = (np.asarray(array.bins[a], dtype=float) for a in ("mag", "dist", "eps"))
+
+    # Moda en el plano M-R (suma sobre epsilon), como en disaggregation_mod_mean
+    w_md = np.nan_to_num(w).sum(axis=2).reshape(-1, array.n_rlz)
+    i_mag, i_dist = np.unravel_index(np.argmax(w_md, axis=0), (len(mag), len(dist)))
+    empty = ~np.isfinite(w).all(axis=(0, 1, 2))
+
+    out = pd.DataFrame({
+        "rlz_id": array.rlz_ids,
+        "weight": array.weights,
+        "mean_mag": mag @ w.sum(axis=(1, 2)),
+        "mean_dist": dist @ w.sum(axis=(0, 2)),
+        "mean_eps": eps @ w.sum(axis=(0, 1)),
+        "mode_mag": np.where(empty, np.nan, mag[i_mag]),
+        "mode_dist": np.where(empty, np.nan, dist[i_dist]),
+        "mode_eps": np.where(empty, np.nan, eps[np.argmax(np.nan_to_num(w).sum(axis=(0, 1)), axis=0)]),
+    })
+    return out
+
+
+def trt_shares_by_realization(array, imt, poe, rtol=1e-4):
+    """
+    Contribution share of each tectonic region type for every realization.
+
+    Parameters:
+    -----------
+    array : RealizationDisaggregation
+        Kind with a 'trt' axis (e.g. 'TRT', 'TRT_Mag_Dist').
+    imt : str
+        IMT of the group.
+    poe : float
+        Target PoE of the group.
+
+    Returns:
+    --------
+    pandas.DataFrame
+        One row per realization: 'rlz_id', 'weight' and one column per TRT.
+    """
+    if array.kind != "TRT":
+        array = array.marginal("TRT")
+    shares = _normalize(array.get(imt, poe, rtol), (0,))  # (trt, rlz)
+    out = pd.DataFrame(shares.T, columns=array.bins["trt"])
+    out.insert(0, "weight", array.weights)
+    out.insert(0, "rlz_id", array.rlz_ids)
+    return out
+
+
+def realization_spread(frame, weights=None, percentiles=(5, 50, 95)):
+    """
+    Weighted spread of per-realization quantities over the logic tree.
+
+    Parameters:
+    -----------
+    frame : pandas.DataFrame
+        Output of `mre_by_realization` or `trt_shares_by_realization`.
+    weights : array-like, optional
+        Realization weights (the 'weight' column of `frame` when omitted).
+    percentiles : sequence of float
+        Weighted percentiles to report.
+
+    Returns:
+    --------
+    pandas.DataFrame
+        Rows 'mean', 'std', 'cov', 'min', 'max', 'p<q>'; one column per
+        quantity.
+    """
+    quantities = frame.drop(columns=[c for c in ("rlz_id", "weight") if c in frame.columns])
+    values = quantities.to_numpy(dtype=float)  # (rlz, quantity)
+    if weights is None:
+        weights = frame["weight"].to_numpy(dtype=float) if "weight" in frame else np.ones(len(frame))
+    w = np.where(np.isfinite(values), np.asarray(weights, dtype=float)[:, None], 0.0)
+    total = w.sum(axis=0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.nansum(w * values, axis=0) / total
+        std = np.sqrt(np.nansum(w * (values - mean) ** 2, axis=0) / total)
+        cov = std / np.abs(mean)
+
+    rows = {"mean": mean, "std": std, "cov": cov,
+            "min": np.nanmin(values, axis=0), "max": np.nanmax(values, axis=0)}
+    for q, p in zip(percentiles, weighted_percentiles(values, percentiles, weights)):
+        rows[f"p{q:g}"] = p
+    return pd.DataFrame(rows, index=quantities.columns).T
+
+
+def summarize_realizations(mre_array, imt, poe, trt_array=None, percentiles=(5, 50, 95), rtol=1e-4):
+    """
+    Per-realization M-R-epsilon and TRT summary of one (imt, poe) group with
+    its spread over the logic tree.
+
+    Parameters:
+    -----------
+    mre_array : RealizationDisaggregation
+        Kind with 'mag', 'dist' and 'eps' bins.
+    imt : str
+        IMT of the group.
+    poe : float
+        Target PoE of the group.
+    trt_array : RealizationDisaggregation, optional
+        Kind with a 'trt' axis (`mre_array` is used when it has one).
+    percentiles : sequence of float
+        Weighted percentiles of the spread table.
+
+    Returns:
+    --------
+    per_rlz : pandas.DataFrame
+        One row per realization; TRT shares as 'trt:<name>' columns.
+    spread : pandas.DataFrame
+        Weighted statistics of every column of `per_rlz`.
+    """
+    per_rlz = mre_by_realization(mre_array, imt, poe, rtol)
+    if trt_array is None and "trt" in mre_array.axes:
+        trt_array = mre_array
+    if trt_array is not None:
+        shares = trt_shares_by_realization(trt_array, imt, poe, rtol)
+        if not np.array_equal(shares["rlz_id"].to_numpy(), per_rlz["rlz_id"].to_numpy()):
+            raise ValueError("The M-R-epsilon and TRT arrays hold different realizations.")
+        shares = shares.drop(columns=["rlz_id", "weight"]).add_prefix("trt:")
+        per_rlz = pd.concat([per_rlz, shares], axis=1)
+    return per_rlz, realization_spread(per_rlz, percentiles=percentiles)
@@ -11,9 +11,11 @@ of exceedance (PoE) values for different spectral acceleration (Sa) levels
 at a given site (longitude, latitude, depth).
 """
 
-import pandas as pd
 import matplotlib.pyplot as plt
 
+from OpenQuakeUHS.core.oq_csv import read_oq_csv
+from OpenQuakeUHS.core.rate_conversion import poe_to_rate
+
 class HazardCurve:
     """
     Represents a single hazard curve extracted from an OpenQuake CSV output file.
@@ -30,6 +32,7 @@ class HazardCurve:
         self.latitude = None
         self.longitude = None
         self.depth = None
+        self.investigation_time = None
         self.sa_values = []
         self.poe_values = []
 
@@ -41,18 +44,31 @@ class HazardCurve:
         - Geographic location (longitude, latitude, depth)
         - Sa levels (spectral accelerations)
         - PoE values (probability of exceedance)
+        - Investigation time of the PoEs (None if the file does not state it)
         """
-        df = pd.read_csv(self.filepath, header=None)
+        table = read_oq_csv(self.filepath)
+
+        investigation_time = table.meta.get("investigation_time")
+        if investigation_time is not None:
+            self.investigation_time = float(investigation_time)
 
-        header = df.iloc[1].tolist()  # 2nd row: PoEs
-        values = df.iloc[2].tolist()  # 3rd row: Sa values
+        self.longitude = float(table.column("lon")[0])
+        self.latitude = float(table.column("lat")[0])
+        self.depth = float(table.column("depth")[0]) if table.has("depth") else 0.0
 
-        self.longitude = float(values[0])
-        self.latitude = float(values[1])
-        self.depth = float(values[2])
+        self.sa_values = table.imls.tolist()
+        self.poe_values = table.poes[0].tolist()
 
-        self.poe_values = [float(x) for x in header[3:]]
-        self.sa_values = [float(x) for x in values[3:]]
+    def annual_rates(self):
+        """
+        Returns the annual exceedance rates of the PoE values.
+
+        Returns:
+        - ndarray: Annual rates, one per Sa level
+        """
+        if self.investigation_time is None:
+            raise ValueError(f"{self.filename} does not state its investigation_time.")
+        return poe_to_rate(self.poe_values, self.investigation_time)
 
     def plot(self, ax=None, label=None, color=None):
         """
@@ -0,0 +1,475 @@
+"""
+Hazard Map Rasters from Multi-site Curves and UHS
+Author: Ing. Patricio Palacios Msc.
+Date: October 19, 2026
+
+Description:
+------------
+This module produces hazard maps (Sa at a period for a return period) from
+multi-site outputs, for many maps in one batched run:
+
+1. Design values for every site, IMT/period and return period at once,
+   from a `HazardCurveStack` (inverse log-log interpolation of the curves)
+   or a `UHSStack` (log-log interpolation across PoEs and periods).
+2. Gridding onto a regular lon/lat raster, by cell averages with the empty
+   cells filled from their neighbours, or by nearest site (needs scipy).
+3. Optional clipping to a boundary shapefile (e.g. the one used by
+   `Disaggregation.read_shp_map`).
+4. Outputs: one compressed .npz with all the rasters (float32) and a PNG
+   with filled contours per map.
+
+Typical usage:
+
+    maps = hazard_maps_from_uhs(uhs_stack, periods=[0.01, 0.2, 1.0],
+                                return_periods=[475, 2475], resolution=0.05,
+                                shp_path="ecuador.shp", save_path="out/ecu")
+"""
+
+import os
+
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.path import Path
+
+from OpenQuakeUHS.core.interpolation import loglog_interp, loglog_inverse
+from OpenQuakeUHS.core.rate_conversion import resolve_investigation_time, return_period_to_poe
+
+
+# === Valores de diseño por sitio ===
+def design_values_from_curves(stack, imts, return_periods, kind="mean", chunk_size=20000,
+                              investigation_time=None):
+    """
+    Intensity levels at the given return periods for every site.
+
+    Parameters:
+    -----------
+    stack : HazardCurveStack
+        Multi-site hazard curves.
+    imts : list of str
+        IMTs of the maps, e.g. ['PGA', 'SA(1.0)'].
+    return_periods : array-like
+        Return periods [years] (n_tr,).
+    kind : str
+        Curve kind, e.g. 'mean' or 'quantile-0.84'.
+    chunk_size : int
+        Sites processed at a time.
+    investigation_time : float, optional
+        Investigation time of the PoEs [years]; defaults to the one of the
+        stack (a ValueError is raised when neither is known).
+
+    Returns:
+    --------
+    ndarray (n_sites, n_imt, n_tr)
+        Sa [g]; np.nan where a curve does not reach the return period.
+    """
+    time_window = resolve_investigation_time(investigation_time, stack.investigation_time, "the stack")
+    poes = return_period_to_poe(return_periods, time_window)
+    curves = stack.select(kind)  # (site, imt, level)
+
+    out = np.full((curves.shape[0], len(imts), len(poes)), np.nan)
+    for j, imt in enumerate(imts):
+        if imt not in stack.imts:
+            raise ValueError(f"IMT {imt} not found in the stack.")
+        k = stack.imts.index(imt)
+        levels = np.isfinite(stack.imls[k])
+        out[:, j, :] = loglog_inverse(poes, stack.imls[k][levels], curves[:, k, levels], chunk_size)
+    return out
+
+
+def design_values_from_uhs(stack, periods, return_periods, kind="mean", investigation_time=None):
+    """
+    Spectral accelerations at the given periods and return periods for
+    every site, interpolated in log-log space across the exported PoEs and
+    periods.
+
+    Parameters:
+    -----------
+    stack : UHSStack
+        Multi-site spectra.
+    periods : array-like
+        Periods of the maps [s] (n_period,), within the exported range.
+    return_periods : array-like
+        Return periods [years] (n_tr,), within the exported PoEs.
+    kind : str
+        Spectrum kind, e.g. 'mean'.
+    investigation_time : float, optional
+        Investigation time of the PoEs [years]; defaults to the one of the
+        stack (a ValueError is raised when neither is known).
+
+    Returns:
+    --------
+    ndarray (n_sites, n_period, n_tr)
+    """
+    time_window = resolve_investigation_time(investigation_time, stack.investigation_time, "the stack")
+    poes = return_period_to_poe(return_periods, time_window)
+    sa = stack.select(kind)  # (site, poe, period); PoEs descendentes
+
+    sa_t = loglog_interp(periods, stack.periods, sa, axis=2)  # (site, poe, n_period)
+    # loglog_interp necesita abscisas crecientes: se invierte el eje de PoE
+    out = loglog_interp(poes, stack.poes[::-1], sa_t[:, ::-1, :], axis=1)  # (site, n_tr, n_period)
+    return np.swapaxes(out, 1, 2)
+
+
+# === Malla regular ===
+class RasterGrid:
+    """
+    Regular lon/lat raster defined by its cell centers.
+    """
+    def __init__(self, lon_min, lon_max, lat_min, lat_max, resolution):
+        """
+        Parameters:
+        - lon_min, lon_max, lat_min, lat_max (float): Extent of the cell centers [deg]
+        - resolution (float): Cell size [deg]
+        """
+        self.resolution = float(resolution)
+        nx = int(round((lon_max - lon_min) / resolution)) + 1
+        ny = int(round((lat_max - lat_min) / resolution)) + 1
+        self.lons = lon_min + resolution * np.arange(nx)
+        self.lats = lat_min + resolution * np.arange(ny)
+
+    @classmethod
+    def from_sites(cls, lons, lats, resolution, pad=0.0):
+        """Builds the grid covering a set of sites (plus `pad` degrees)."""
+        return cls(np.min(lons) - pad, np.max(lons) + pad,
+                   np.min(lats) - pad, np.max(lats) + pad, resolution)
+
+    @property
+    def shape(self):
+        """(n_lat, n_lon)"""
+        return (len(self.lats), len(self.lons))
+
+    @property
+    def extent(self):
+        """(lon_min, lon_max, lat_min, lat_max) of the cell edges."""
+        h = 0.5 * self.resolution
+        return (self.lons[0] - h, self.lons[-1] + h, self.lats[0] - h, self.lats[-1] + h)
+
+    def cell_index(self, lons, lats):
+        """
+        Returns the flat cell index of each point (-1 outside the grid).
+        """
+        ix = np.floor((np.asarray(lons) - self.lons[0]) / self.resolution + 0.5).astype(np.int64)
+        iy = np.floor((np.asarray(lats) - self.lats[0]) / self.resolution + 0.5).astype(np.int64)
+        inside = (ix >= 0) & (ix < len(self.lons)) & (iy >= 0) & (iy < len(self.lats))
+        return np.where(inside, iy * len(self.lons) + ix, -1)
+
+    def centers(self):
+        """Returns the lon/lat of every cell center, each (n_lat, n_lon)."""
+        return np.meshgrid(self.lons, self.lats)
+
+
+def _fill_gaps(rasters, passes):
+    """
+    Fills empty cells with the mean of their filled 8-neighbours, `passes`
+    times (the gap grows inward one cell per pass).
+    """
+    for _ in range(passes):
+        empty = np.isnan(rasters)
+        if not empty.any():
+            break
+        padded = np.pad(rasters, ((0, 0), (1, 1), (1, 1)), constant_values=np.nan)
+        total = np.zeros_like(rasters)
+        count = np.zeros_like(rasters)
+        ny, nx = rasters.shape[1:]
+        for dy in (0, 1, 2):
+            for dx in (0, 1, 2):
+                if dy == 1 and dx == 1:
+                    continue
+                shifted = padded[:, dy:dy + ny, dx:dx + nx]
+                ok = ~np.isnan(shifted)
+                total += np.where(ok, shifted, 0.0)
+                count += ok
+        with np.errstate(invalid="ignore"):
+            rasters = np.where(empty & (count > 0), total / count, rasters)
+    return rasters
+
+
+def grid_values(lons, lats, values, grid, method="bin", fill_passes=2, max_distance=None):
+    """
+    Grids site values onto a raster, all maps at once.
+
+    Parameters:
+    -----------
+    lons, lats : array-like
+        Site coordinates (n_sites,).
+    values : ndarray
+        Site values (n_sites, n_maps) or (n_sites,).
+    grid : RasterGrid
+    method : str
+        'bin': mean of the sites in each cell, empty cells filled from
+        their neighbours `fill_passes` times (no extra dependency).
+        'nearest': value of the nearest site (requires scipy).
+    fill_passes : int
+        Gap-filling passes of the 'bin' method.
+    max_distance : float, optional
+        'nearest' only: cells farther than this from any site [deg] are
+        left empty (1.5 cells by default).
+
+    Returns:
+    --------
+    ndarray (n_maps, n_lat, n_lon)
+        np.nan where no value was assigned.
+    """
+    values = np.asarray(values, dtype=float)
+    if values.ndim == 1:
+        values = values[:, None]
+    n_maps = values.shape[1]
+    ny, nx = grid.shape
+
+    if method == "nearest":
+        try:
+            from scipy.spatial import cKDTree
+        except ImportError:
+            raise ImportError("method='nearest' requires scipy; use method='bin' instead.")
+        glon, glat = grid.centers()
+        distance, nearest = cKDTree(np.column_stack([lons, lats])).query(
+            np.column_stack([glon.ravel(), glat.ravel()]))
+        limit = 1.5 * grid.resolution if max_distance is None else max_distance
+        out = values[nearest].T.copy()
+        out[:, distance > limit] = np.nan
+        return out.reshape(n_maps, ny, nx)
+
+    if method != "bin":
+        raise ValueError(f"Unknown gridding method {method}; use 'bin' or 'nearest'.")
+
+    cells = grid.cell_index(lons, lats)
+    keep = cells >= 0
+    cells, values = cells[keep], values[keep]
+    sums = np.zeros((n_maps, ny * nx))
+    counts = np.zeros((n_maps, ny * nx))
+    finite = np.isfinite(values)
+    for m in range(n_maps):
+        sums[m] = np.bincount(cells, weights=np.where(finite[:, m], values[:, m], 0.0), minlength=ny * nx)
+        counts[m] = np.bincount(cells, weights=finite[:, m], minlength=ny * nx)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rasters = np.where(counts > 0, sums / counts, np.nan).reshape(n_maps, ny, nx)
+    return _fill_gaps(rasters, fill_passes)
+
+
+# === Recorte con shapefile ===
+def _polygon_rings(geom):
+    if geom is None or geom.is_empty:
+        return []
+    if geom.geom_type == "Polygon":
+        return [(np.asarray(geom.exterior.coords), [np.asarray(r.coords) for r in geom.interiors])]
+    if geom.geom_type in ("MultiPolygon", "GeometryCollection"):
+        return [ring for part in geom.geoms for ring in _polygon_rings(part)]
+    return []
+
+
+def boundary_mask(grid, boundary):
+    """
+    Returns the cells whose centers fall inside a boundary.
+
+    Parameters:
+    -----------
+    grid : RasterGrid
+    boundary : str or geopandas.GeoDataFrame
+        Shapefile path or GeoDataFrame (reprojected to EPSG:4326).
+
+    Returns:
+    --------
+    ndarray of bool (n_lat, n_lon)
+    """
+    if isinstance(boundary, str):
+        import geopandas as gpd
+        boundary = gpd.read_file(boundary)
+    if boundary.crs is not None:
+        boundary = boundary.to_crs(epsg=4326)
+
+    glon, glat = grid.centers()
+    points = np.column_stack([glon.ravel(), glat.ravel()])
+    inside = np.zeros(len(points), dtype=bool)
+
+    for geom in boundary.geometry:
+        for exterior, holes in _polygon_rings(geom):
+            # Filtro rápido por el rectángulo del polígono
+            lo, hi = exterior[:, :2].min(axis=0), exterior[:, :2].max(axis=0)
+            box = np.all((points >= lo) & (points <= hi), axis=1) & ~inside
+            if not box.any():
+                continue
+            hit = Path(exterior[:, :2]).contains_points(points[box])
+            for hole in holes:
+                hit &= ~Path(hole[:, :2]).contains_points(points[box])
+            inside[np.flatnonzero(box)[hit]] = True
+
+    return inside.reshape(grid.shape)
+
+
+# === Salidas ===
+def write_rasters(path, grid, rasters, labels, meta=None):
+    """
+    Writes the rasters into one compressed .npz file (float32 values).
+
+    Parameters:
+    -----------
+    path : str
+        Output file ('.npz' is appended by numpy when missing).
+    grid : RasterGrid
+    rasters : ndarray (n_maps, n_lat, n_lon)
+    labels : list of str
+        Name of each map, e.g. 'SA(1.0)_Tr475'.
+    meta : dict, optional
+        Extra scalar metadata stored as 0-d arrays.
+    """
+    extra = {f"meta_{k}": np.asarray(v) for k, v in (meta or {}).items()}
+    np.savez_compressed(path, values=np.asarray(rasters, dtype=np.float32),
+                        lons=grid.lons, lats=grid.lats, labels=np.asarray(labels), **extra)
+
+
+def read_rasters(path):
+    """
+    Reads a file written by `write_rasters`.
+
+    Returns:
+    --------
+    dict
+        {'values', 'lons', 'lats', 'labels', plus the 'meta_*' entries}
+    """
+    with np.load(path) as data:
+        return {k: data[k] for k in data.files}
+
+
+def plot_hazard_map(grid, raster, boundary=None, title=None, label="Sa [g]", levels=12,
+                    cmap="viridis", save_path=None, PRY_name="PRY", dpi=150):
+    """
+    Plots one raster with filled contours, contour lines and the boundary.
+
+    Parameters:
+    -----------
+    grid : RasterGrid
+    raster : ndarray (n_lat, n_lon)
+    boundary : geopandas.GeoDataFrame, optional
+        Outline drawn over the map.
+    levels : int or array-like
+        Contour levels.
+    save_path : str, optional
+        PNG file; the figure is closed after saving (shown otherwise).
+    """
+    fig, ax = plt.subplots(figsize=(6, 6))
+    if np.isfinite(raster).any():
+        filled = ax.contourf(grid.lons, grid.lats, raster, levels=levels, cmap=cmap)
+        lines = ax.contour(grid.lons, grid.lats, raster, levels=filled.levels,
+                           colors="black", linewidths=0.4)
+        ax.clabel(lines, lines.levels[::2], fontsize=7, fmt="%.2f")
+        fig.colorbar(filled, ax=ax, label=label, shrink=0.8)
+
+    if boundary is not None:
+        for geom in boundary.geometry:
+            for exterior, _ in _polygon_rings(geom):
+                ax.plot(exterior[:, 0], exterior[:, 1], color="black", linewidth=0.8)
+
+    lon_min, lon_max, lat_min, lat_max = grid.extent
+    ax.set_xlim(lon_min, lon_max)
+    ax.set_ylim(lat_min, lat_max)
+    ax.set_aspect("equal")
+    ax.set_xlabel("Longitude", fontweight="bold")
+    ax.set_ylabel("Latitude", fontweight="bold")
+    ax.set_title(title or "Hazard Map", fontweight="bold")
+    fig.text(
+        0.99, -0.01,
+        f"PRY: {PRY_name}\n© 2025 - Patricio Palacios B.",
+        ha='right', va='top', fontsize=9, color='gray', style='italic', multialignment='right'
+    )
+
+    if save_path:
+        fig.savefig(save_path, dpi=dpi, bbox_inches="tight")
+        plt.close(fig)
+    else:
+        plt.show()
+    return fig
+
+
+def _run_maps(lons, lats, values, labels, resolution, shp_path, method, fill_passes,
+              save_path, plot, PRY_name, meta):
+    grid = RasterGrid.from_sites(lons, lats, resolution)
+    rasters = grid_values(lons, lats, values.reshape(len(lons), -1), grid, method, fill_passes)
+
+    boundary = None
+    if shp_path is not None:
+        import geopandas as gpd
+        boundary = gpd.read_file(shp_path)
+        if boundary.crs is not None:
+            boundary = boundary.to_crs(epsg=4326)
+        rasters[:, ~boundary_mask(grid, boundary)] = np.nan
+
+    result = {"grid": grid, "rasters": rasters, "labels": labels, "files": []}
+    if save_path:
+        folder = os.path.dirname(os.path.abspath(save_path))
+        os.makedirs(folder, exist_ok=True)
+        write_rasters(f"{save_path}_maps.npz", grid, rasters, labels, meta)
+        result["files"].append(f"{save_path}_maps.npz")
+        if plot:
+            for raster, label in zip(rasters, labels):
+                png = f"{save_path}_{label}.png"
+                plot_hazard_map(grid, raster, boundary, title=label.replace("_", " "),
+                                save_path=png, PRY_name=PRY_name)
+                result["files"].append(png)
+    return result
+
+
+def hazard_maps_from_curves(stack, imts, return_periods, kind="mean", resolution=0.1,
+                            shp_path=None, method="bin", fill_passes=2, save_path=None,
+                            plot=True, PRY_name="PRY", investigation_time=None):
+    """
+    Builds Sa maps for every (IMT, return period) from multi-site hazard curves.
+
+    Parameters:
+    -----------
+    stack : HazardCurveStack
+    imts : list of str
+        IMTs of the maps.
+    return_periods : array-like
+        Return periods [years].
+    kind : str
+        Curve kind, e.g. 'mean'.
+    resolution : float
+        Raster cell size [deg].
+    shp_path : str, optional
+        Boundary shapefile; cells outside are set to np.nan.
+    method, fill_passes :
+        Gridding options (see `grid_values`).
+    save_path : str, optional
+        Prefix of the outputs: '<save_path>_maps.npz' and one
+        '<save_path>_<IMT>_Tr<Tr>.png' per map.
+    plot : bool
+        Whether to write the PNG maps.
+    investigation_time : float, optional
+        Investigation time of the PoEs [years]; defaults to the one of the
+        stack.
+
+    Returns:
+    --------
+    dict
+        {'grid': RasterGrid, 'rasters': (n_maps, n_lat, n_lon),
+        'labels': list of str, 'files': list of str, 'site_values':
+        (n_sites, n_imt, n_tr)}
+    """
+    time_window = resolve_investigation_time(investigation_time, stack.investigation_time, "the stack")
+    values = design_values_from_curves(stack, imts, return_periods, kind,
+                                       investigation_time=time_window)
+    labels = [f"{imt}_Tr{tr:g}" for imt in imts for tr in return_periods]
+    result = _run_maps(stack.lons, stack.lats, values, labels, resolution, shp_path, method,
+                       fill_passes, save_path, plot, PRY_name,
+                       {"kind": kind, "investigation_time": time_window})
+    result["site_values"] = values
+    return result
+
+
+def hazard_maps_from_uhs(stack, periods, return_periods, kind="mean", resolution=0.1,
+                         shp_path=None, method="bin", fill_passes=2, save_path=None,
+                         plot=True, PRY_name="PRY", investigation_time=None):
+    """
+    Builds Sa maps for every (period, return period) from multi-site UHS.
+    Same parameters and result as `hazard_maps_from_curves`, with `periods`
+    [s] instead of IMTs ('site_values' is (n_sites, n_period, n_tr)).
+    """
+    time_window = resolve_investigation_time(investigation_time, stack.investigation_time, "the stack")
+    values = design_values_from_uhs(stack, periods, return_periods, kind,
+                                    investigation_time=time_window)
+    labels = [f"SA({t:g})_Tr{tr:g}" for t in periods for tr in return_periods]
+    result = _run_maps(stack.lons, stack.lats, values, labels, resolution, shp_path, method,
+                       fill_passes, save_path, plot, PRY_name,
+                       {"kind": kind, "investigation_time": time_window})
+    result["site_values"] = values
+    return result
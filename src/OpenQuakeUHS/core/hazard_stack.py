@@ -0,0 +1,480 @@
+"""
+Stacked Hazard Arrays
+Author: Ing. Patricio Palacios Msc.
+Date: October 19, 2026
+
+Description:
+------------
+This module gathers many OpenQuake CSV outputs (mean, quantile and
+realization files, one or several sites per file) into dense numpy arrays:
+
+- `HazardCurveStack`: poes[kind, site, imt, level]
+- `UHSStack`: sa[kind, site, poe, period]
+
+The stacks are built incrementally through `HazardCurveStackBuilder` and
+`UHSStackBuilder`, so results can be added in any order (e.g. as files
+finish loading) and the dense arrays are only allocated once at the end.
+Missing combinations are filled with np.nan. Both stacks keep the
+investigation time of their files, so PoEs can be turned into annual rates
+or rescaled to another time window with a single array operation.
+"""
+
+import os
+import re
+
+import numpy as np
+
+from OpenQuakeUHS.core.oq_csv import read_oq_csv
+from OpenQuakeUHS.core.rate_conversion import poe_to_rate, poe_to_return_period, rescale_poe
+
+# hazard_curve-mean-PGA_18.csv, hazard_curve-rlz-003-SA(0.1)_18.csv,
+# quantile_curve-0.16-SA(1.0)_18.csv, hazard_uhs-mean_18.csv, quantile_uhs-0.84_18.csv
+_FILENAME_PATTERN = re.compile(
+    r"^(?P<output>hazard_curve|quantile_curve|hazard_uhs|quantile_uhs)"
+    r"-(?P<kind>mean|rlz-\d+|[\d.]+)"
+    r"(?:-(?P<imt>PGA|PGV|SA\([\d.]+\)))?"
+    r"_(?P<calc_id>\d+)\.csv$"
+)
+
+
+def parse_output_filename(path):
+    """
+    Extracts the output type, kind, IMT and calculation id from the name of
+    an OpenQuake hazard curve or UHS export.
+
+    Parameters:
+    -----------
+    path : str
+        Path or filename of the CSV file.
+
+    Returns:
+    --------
+    dict or None
+        {'output': 'hazard_curve' | 'hazard_uhs', 'kind': 'mean' | 'rlz-000' |
+        'quantile-0.16', 'imt': str or None, 'calc_id': int}, or None when the
+        name does not follow the OpenQuake convention.
+    """
+    match = _FILENAME_PATTERN.match(os.path.basename(path))
+    if not match:
+        return None
+
+    output = match.group("output")
+    kind = match.group("kind")
+    if output.startswith("quantile"):
+        kind = f"quantile-{kind}"
+        output = output.replace("quantile", "hazard")
+
+    return {
+        "output": output,
+        "kind": kind,
+        "imt": match.group("imt"),
+        "calc_id": int(match.group("calc_id")),
+    }
+
+
+def imt_period(imt):
+    """
+    Returns the spectral period of an IMT string (PGA -> 0.01 s by convention).
+    """
+    if imt == "PGA":
+        return 0.01
+    match = re.match(r"SA\(([\d.]+)\)", imt)
+    if not match:
+        raise ValueError(f"IMT {imt} has no spectral period.")
+    return float(match.group(1))
+
+
+def _imt_sort_key(imt):
+    """Spectral IMTs by period (PGA first), then the others (e.g. PGV) by name."""
+    try:
+        return (0, imt_period(imt), "")
+    except ValueError:
+        return (1, 0.0, imt)
+
+
+def group_by_calc(paths):
+    """
+    Groups OpenQuake export files by calculation id.
+
+    Returns:
+    --------
+    dict
+        {calc_id: [paths]} ordered by calc id; files whose name does not
+        follow the OpenQuake convention are left out.
+    """
+    groups = {}
+    for path in paths:
+        info = parse_output_filename(path)
+        if info is not None:
+            groups.setdefault(info["calc_id"], []).append(path)
+    return dict(sorted(groups.items()))
+
+
+def _kind_sort_key(kind):
+    if kind == "mean":
+        return (0, 0.0)
+    if kind.startswith("quantile-"):
+        return (1, float(kind.split("-", 1)[1]))
+    if kind.startswith("rlz-"):
+        return (2, float(kind.split("-", 1)[1]))
+    return (3, 0.0)
+
+
+def read_hazard_curve_file(path):
+    """
+    Reads a hazard curve CSV file (one row per site) into arrays.
+
+    Parameters:
+    -----------
+    path : str
+        Path to a 'hazard_curve-*' CSV file.
+
+    Returns:
+    --------
+    dict
+        {'lons': (n_sites,), 'lats': (n_sites,), 'depths': (n_sites,),
+        'imls': (n_levels,), 'poes': (n_sites, n_levels),
+        'investigation_time': float or None}
+    """
+    table = read_oq_csv(path)
+
+    return {
+        "lons": table.column("lon"),
+        "lats": table.column("lat"),
+        "depths": table.column("depth") if table.has("depth") else np.zeros(len(table)),
+        "imls": table.imls,
+        "poes": table.poes,
+        "investigation_time": table.meta.get("investigation_time"),
+    }
+
+
+def read_uhs_file(path):
+    """
+    Reads a UHS CSV file (one row per site) into arrays.
+
+    Parameters:
+    -----------
+    path : str
+        Path to a 'hazard_uhs-*' or 'quantile_uhs-*' CSV file.
+
+    Returns:
+    --------
+    dict
+        {'lons': (n_sites,), 'lats': (n_sites,), 'poes': (n_poe,),
+        'periods': (n_period,), 'sa': (n_sites, n_poe, n_period),
+        'investigation_time': float or None}
+        Periods missing for a PoE are left as np.nan.
+    """
+    table = read_oq_csv(path)
+
+    poes, i = np.unique(-table.uhs_poes, return_inverse=True)  # PoEs descendentes
+    periods, j = np.unique(table.uhs_periods, return_inverse=True)
+
+    sa = np.full((len(table), len(poes), len(periods)), np.nan)
+    sa[:, i, j] = table.uhs_values
+
+    return {
+        "lons": table.column("lon"),
+        "lats": table.column("lat"),
+        "poes": -poes,
+        "periods": periods,
+        "sa": sa,
+        "investigation_time": table.meta.get("investigation_time"),
+    }
+
+
+class _SiteIndex:
+    """
+    Assigns a stable index to each (lon, lat) pair, matching coordinates
+    rounded to `decimals`.
+    """
+    def __init__(self, decimals=5):
+        self.decimals = decimals
+        self._index = {}
+        self.lons = []
+        self.lats = []
+
+    def indices(self, lons, lats):
+        out = np.empty(len(lons), dtype=int)
+        for n, (lon, lat) in enumerate(zip(lons, lats)):
+            key = (round(float(lon), self.decimals), round(float(lat), self.decimals))
+            if key not in self._index:
+                self._index[key] = len(self.lons)
+                self.lons.append(float(lon))
+                self.lats.append(float(lat))
+            out[n] = self._index[key]
+        return out
+
+
+class HazardCurveStack:
+    """
+    Hazard curves for several kinds (mean, quantiles, realizations), sites
+    and IMTs stored as a single array poes[kind, site, imt, level].
+    """
+    def __init__(self, kinds, lons, lats, imts, imls, poes, investigation_time=None, calc_id=None):
+        """
+        Parameters:
+        - kinds (list of str): Curve kinds, e.g. ['mean', 'quantile-0.16', 'rlz-000']
+        - lons, lats (array-like): Site coordinates (n_sites,)
+        - imts (list of str): Intensity measure types, e.g. ['PGA', 'SA(0.1)']
+        - imls (ndarray): Intensity levels per IMT (n_imt, n_levels)
+        - poes (ndarray): PoE values (n_kind, n_sites, n_imt, n_levels)
+        - investigation_time (float): Investigation time of the PoEs [years]
+        - calc_id (int): OpenQuake calculation id of the files
+        """
+        self.kinds = list(kinds)
+        self.lons = np.asarray(lons, dtype=float)
+        self.lats = np.asarray(lats, dtype=float)
+        self.imts = list(imts)
+        self.imls = np.asarray(imls, dtype=float)
+        self.poes = np.asarray(poes, dtype=float)
+        self.investigation_time = None if investigation_time is None else float(investigation_time)
+        self.calc_id = calc_id
+
+    def _require_time(self):
+        if self.investigation_time is None:
+            raise ValueError("The investigation time of the stack is unknown.")
+        return self.investigation_time
+
+    @property
+    def periods(self):
+        """Spectral periods of the IMTs [s] (PGA = 0.01 s, np.nan for e.g. PGV)."""
+        return np.array([_imt_sort_key(imt)[1] if _imt_sort_key(imt)[0] == 0 else np.nan
+                         for imt in self.imts])
+
+    def select(self, kind):
+        """
+        Returns poes[site, imt, level] for a single kind.
+        """
+        if kind not in self.kinds:
+            raise ValueError(f"Kind {kind} not found in the stack.")
+        return self.poes[self.kinds.index(kind)]
+
+    def realizations(self):
+        """
+        Returns the realization ids and the realization tensor.
+
+        Returns:
+        --------
+        rlz_ids : ndarray of int
+        poes : ndarray (n_rlz, n_sites, n_imt, n_levels)
+        """
+        idx = [i for i, k in enumerate(self.kinds) if k.startswith("rlz-")]
+        rlz_ids = np.array([int(self.kinds[i].split("-")[1]) for i in idx], dtype=int)
+        return rlz_ids, self.poes[idx]
+
+    def annual_rates(self):
+        """
+        Returns the annual exceedance rates (n_kind, n_sites, n_imt, n_levels).
+        """
+        return poe_to_rate(self.poes, self._require_time())
+
+    def rescale(self, investigation_time):
+        """
+        Returns a new stack with the PoEs expressed in another investigation time.
+
+        Parameters:
+        - investigation_time (float): Target investigation time [years]
+        """
+        poes = rescale_poe(self.poes, self._require_time(), investigation_time)
+        return HazardCurveStack(self.kinds, self.lons, self.lats, self.imts, self.imls,
+                                poes, investigation_time, self.calc_id)
+
+
+class UHSStack:
+    """
+    Uniform hazard spectra for several kinds, sites and PoEs stored as a
+    single array sa[kind, site, poe, period].
+    """
+    def __init__(self, kinds, lons, lats, poes, periods, sa, investigation_time=None, calc_id=None):
+        """
+        Parameters:
+        - kinds (list of str): Spectrum kinds, e.g. ['mean', 'quantile-0.16', 'rlz-000']
+        - lons, lats (array-like): Site coordinates (n_sites,)
+        - poes (array-like): Probabilities of exceedance (n_poe,)
+        - periods (array-like): Spectral periods [s] (n_period,)
+        - sa (ndarray): Spectral accelerations [g] (n_kind, n_sites, n_poe, n_period)
+        - investigation_time (float): Investigation time of the PoEs [years]
+        - calc_id (int): OpenQuake calculation id of the files
+        """
+        self.kinds = list(kinds)
+        self.lons = np.asarray(lons, dtype=float)
+        self.lats = np.asarray(lats, dtype=float)
+        self.poes = np.asarray(poes, dtype=float)
+        self.periods = np.asarray(periods, dtype=float)
+        self.sa = np.asarray(sa, dtype=float)
+        self.investigation_time = None if investigation_time is None else float(investigation_time)
+        self.calc_id = calc_id
+
+    @property
+    def return_periods(self):
+        """Return periods [years] of the PoEs (n_poe,)."""
+        if self.investigation_time is None:
+            raise ValueError("The investigation time of the stack is unknown.")
+        return poe_to_return_period(self.poes, self.investigation_time)
+
+    def rescale(self, investigation_time):
+        """
+        Returns the same spectra with the PoEs expressed in another
+        investigation time (the spectral values do not change).
+
+        Parameters:
+        - investigation_time (float): Target investigation time [years]
+        """
+        if self.investigation_time is None:
+            raise ValueError("The investigation time of the stack is unknown.")
+        poes = rescale_poe(self.poes, self.investigation_time, investigation_time)
+        return UHSStack(self.kinds, self.lons, self.lats, poes, self.periods, self.sa,
+                        investigation_time, self.calc_id)
+
+    def select(self, kind):
+        """
+        Returns sa[site, poe, period] for a single kind.
+        """
+        if kind not in self.kinds:
+            raise ValueError(f"Kind {kind} not found in the stack.")
+        return self.sa[self.kinds.index(kind)]
+
+    def realizations(self):
+        """
+        Returns the realization ids and the realization tensor.
+
+        Returns:
+        --------
+        rlz_ids : ndarray of int
+        sa : ndarray (n_rlz, n_sites, n_poe, n_period)
+        """
+        idx = [i for i, k in enumerate(self.kinds) if k.startswith("rlz-")]
+        rlz_ids = np.array([int(self.kinds[i].split("-")[1]) for i in idx], dtype=int)
+        return rlz_ids, self.sa[idx]
+
+
+def _merge_investigation_time(current, parsed, path):
+    value = parsed.get("investigation_time")
+    if value is None:
+        return current
+    value = float(value)
+    if current is not None and not np.isclose(current, value):
+        raise ValueError(
+            f"{os.path.basename(path)} has investigation_time={value}, "
+            f"the stack uses {current}.")
+    return value
+
+
+def _merge_calc_id(current, info, path):
+    if current is not None and info["calc_id"] != current:
+        raise ValueError(
+            f"{os.path.basename(path)} belongs to calculation {info['calc_id']}, the stack "
+            f"holds calculation {current}; load each calculation separately (see `group_by_calc`).")
+    return info["calc_id"]
+
+
+class HazardCurveStackBuilder:
+    """
+    Collects parsed hazard curve files one at a time and builds a
+    `HazardCurveStack` at the end.
+    """
+    def __init__(self, site_decimals=5):
+        self._sites = _SiteIndex(site_decimals)
+        self._parts = []
+        self._imls = {}
+        self.investigation_time = None
+        self.calc_id = None
+
+    def add(self, path, parsed):
+        """
+        Adds the output of `read_hazard_curve_file` for the file at `path`.
+        """
+        info = parse_output_filename(path)
+        if info is None or info["output"] != "hazard_curve" or info["imt"] is None:
+            raise ValueError(f"{os.path.basename(path)} is not a hazard curve export.")
+
+        calc_id = _merge_calc_id(self.calc_id, info, path)
+        imls = self._imls.get(info["imt"])
+        if imls is not None and (len(imls) != len(parsed["imls"])
+                                 or not np.allclose(imls, parsed["imls"], rtol=1e-6)):
+            raise ValueError(
+                f"{os.path.basename(path)} has other intensity levels for {info['imt']} "
+                f"than the files already in the stack.")
+        self.investigation_time = _merge_investigation_time(self.investigation_time, parsed, path)
+        self.calc_id = calc_id
+        sites = self._sites.indices(parsed["lons"], parsed["lats"])
+        self._imls.setdefault(info["imt"], parsed["imls"])
+        self._parts.append((info["kind"], info["imt"], sites, parsed["poes"]))
+
+    def __len__(self):
+        return len(self._parts)
+
+    def build(self):
+        """
+        Returns:
+        --------
+        HazardCurveStack
+        """
+        kinds = sorted({p[0] for p in self._parts}, key=_kind_sort_key)
+        imts = sorted(self._imls, key=_imt_sort_key)
+        n_levels = max((len(v) for v in self._imls.values()), default=0)
+
+        imls = np.full((len(imts), n_levels), np.nan)
+        for j, imt in enumerate(imts):
+            imls[j, :len(self._imls[imt])] = self._imls[imt]
+
+        kind_index = {k: i for i, k in enumerate(kinds)}
+        imt_index = {m: j for j, m in enumerate(imts)}
+        poes = np.full((len(kinds), len(self._sites.lons), len(imts), n_levels), np.nan)
+        for kind, imt, sites, values in self._parts:
+            poes[kind_index[kind], sites, imt_index[imt], :values.shape[1]] = values
+
+        return HazardCurveStack(kinds, self._sites.lons, self._sites.lats, imts, imls, poes,
+                                self.investigation_time, self.calc_id)
+
+
+class UHSStackBuilder:
+    """
+    Collects parsed UHS files one at a time and builds a `UHSStack` at the end.
+    """
+    def __init__(self, site_decimals=5):
+        self._sites = _SiteIndex(site_decimals)
+        self._parts = []
+        self.investigation_time = None
+        self.calc_id = None
+
+    def add(self, path, parsed):
+        """
+        Adds the output of `read_uhs_file` for the file at `path`.
+        """
+        info = parse_output_filename(path)
+        if info is None or info["output"] != "hazard_uhs":
+            raise ValueError(f"{os.path.basename(path)} is not a UHS export.")
+
+        calc_id = _merge_calc_id(self.calc_id, info, path)
+        self.investigation_time = _merge_investigation_time(self.investigation_time, parsed, path)
+        self.calc_id = calc_id
+        sites = self._sites.indices(parsed["lons"], parsed["lats"])
+        self._parts.append((info["kind"], sites, parsed))
+
+    def __len__(self):
+        return len(self._parts)
+
+    def build(self):
+        """
+        Returns:
+        --------
+        UHSStack
+        """
+        kinds = sorted({p[0] for p in self._parts}, key=_kind_sort_key)
+        poes = sorted({float(p) for part in self._parts for p in part[2]["poes"]}, reverse=True)
+        periods = sorted({float(t) for part in self._parts for t in part[2]["periods"]})
+
+        kind_index = {k: i for i, k in enumerate(kinds)}
+        poe_index = {p: i for i, p in enumerate(poes)}
+        period_index = {t: j for j, t in enumerate(periods)}
+
+        sa = np.full((len(kinds), len(self._sites.lons), len(poes), len(periods)), np.nan)
+        for kind, sites, parsed in self._parts:
+            i = np.array([poe_index[float(p)] for p in parsed["poes"]], dtype=int)
+            j = np.array([period_index[float(t)] for t in parsed["periods"]], dtype=int)
+            sa[kind_index[kind], sites[:, None, None], i[None, :, None], j[None, None, :]] = parsed["sa"]
+
+        return UHSStack(kinds, self._sites.lons, self._sites.lats, poes, periods, sa,
+                        self.investigation_time, self.calc_id)
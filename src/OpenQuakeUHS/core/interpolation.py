@@ -0,0 +1,329 @@
+"""
+Log-Log Interpolators for Hazard Curves and UHS
+Author: Ing. Patricio Palacios Msc.
+Date: October 19, 2026
+
+Description:
+------------
+This module defines precomputed interpolators for the design-value queries
+that are answered repeatedly from the same curves:
+
+- `HazardCurveInterpolator`: Sa <-> PoE <-> annual rate / return period
+- `UHSInterpolator`: Sa at any period between the exported UHS periods
+
+Hazard curves and spectra are close to straight lines in log-log space, so
+the slopes of every segment are computed once in log space and each query is
+a binary search plus one multiply-add. Scalar lookups go through an
+LRU-bounded memo, so repeated queries from a design service are served from
+the cache.
+
+`loglog_interp` and `loglog_inverse` apply the same interpolation to many
+curves at once (e.g. every site of a stack) for batched map computations.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+from OpenQuakeUHS.core.rate_conversion import (
+    poe_to_rate,
+    poe_to_return_period,
+    rate_to_poe,
+    resolve_investigation_time,
+    return_period_to_poe,
+)
+
+
+class LogLogTable:
+    """
+    Piecewise-linear interpolation of y(x) in log-log space with the
+    segment slopes precomputed at construction.
+    """
+    def __init__(self, x, y):
+        """
+        Parameters:
+        - x (array-like): Abscissas (strictly positive values are kept)
+        - y (array-like): Ordinates (strictly positive values are kept)
+        """
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        keep = (x > 0) & (y > 0) & np.isfinite(x) & np.isfinite(y)
+        x, y = x[keep], y[keep]
+
+        order = np.argsort(x, kind="mergesort")
+        lx = np.log(x[order])
+        ly = np.log(y[order])
+
+        # Repeated abscissas (e.g. PoE saturated at 1.0) keep the first point
+        lx, first = np.unique(lx, return_index=True)
+        ly = ly[first]
+
+        if len(lx) < 2:
+            raise ValueError("At least two positive points are needed to interpolate.")
+
+        self._lx = lx
+        self._ly = ly
+        self._slopes = np.diff(ly) / np.diff(lx)
+
+    @property
+    def x_range(self):
+        """Returns the (min, max) abscissas covered by the table."""
+        return float(np.exp(self._lx[0])), float(np.exp(self._lx[-1]))
+
+    def __call__(self, x):
+        """
+        Interpolates y at the given abscissas.
+
+        Parameters:
+        - x (float or array-like): Query abscissas
+
+        Returns:
+        - ndarray: Interpolated values (np.nan outside the table range)
+        """
+        x = np.asarray(x, dtype=float)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            lq = np.log(x)
+        i = np.clip(np.searchsorted(self._lx, lq, side="right") - 1, 0, len(self._slopes) - 1)
+        out = np.exp(self._ly[i] + self._slopes[i] * (lq - self._lx[i]))
+        outside = ~((lq >= self._lx[0]) & (lq <= self._lx[-1]))
+        return np.where(outside, np.nan, out)
+
+
+class HazardCurveInterpolator:
+    """
+    Precomputed log-log interpolator for a single hazard curve, answering
+    Sa <-> PoE <-> annual rate <-> return period queries.
+    """
+    def __init__(self, sa_values, poe_values, investigation_time=50.0, cache_size=4096):
+        """
+        Parameters:
+        - sa_values (array-like): Intensity measure levels [g]
+        - poe_values (array-like): PoE in `investigation_time` years for each level
+        - investigation_time (float): Investigation time of the PoEs [years]
+        - cache_size (int): Maximum number of memoized scalar lookups per query type
+        """
+        self.sa_values = np.asarray(sa_values, dtype=float)
+        self.poe_values = np.asarray(poe_values, dtype=float)
+        self.investigation_time = float(investigation_time)
+
+        self._poe_of_sa = LogLogTable(self.sa_values, self.poe_values)
+        self._sa_of_poe = LogLogTable(self.poe_values, self.sa_values)
+
+        self.sa_at_poe = lru_cache(maxsize=cache_size)(self._sa_at_poe)
+        self.poe_at_sa = lru_cache(maxsize=cache_size)(self._poe_at_sa)
+        self.sa_at_return_period = lru_cache(maxsize=cache_size)(self._sa_at_return_period)
+
+    @classmethod
+    def from_hazard_curve(cls, curve, investigation_time=None, cache_size=4096):
+        """
+        Builds the interpolator from a `HazardCurve` object, using the
+        investigation time of its file unless `investigation_time` is given
+        (a ValueError is raised when neither is known).
+        """
+        investigation_time = resolve_investigation_time(
+            investigation_time, curve.investigation_time, curve.filename)
+        return cls(curve.sa_values, curve.poe_values,
+                   investigation_time=investigation_time, cache_size=cache_size)
+
+    # --- Conversions between PoE and annual rate (Poisson) ---
+    def rate_from_poe(self, poe):
+        """Annual exceedance rate for a PoE in the investigation time."""
+        return poe_to_rate(poe, self.investigation_time)
+
+    def poe_from_rate(self, rate):
+        """PoE in the investigation time for an annual exceedance rate."""
+        return rate_to_poe(rate, self.investigation_time)
+
+    # --- Vectorized queries ---
+    def sa(self, poe):
+        """
+        Returns Sa [g] for one or several PoEs (np.nan outside the curve).
+        """
+        return self._sa_of_poe(poe)
+
+    def poe(self, sa):
+        """
+        Returns the PoE for one or several Sa levels [g] (np.nan outside the curve).
+        """
+        return self._poe_of_sa(sa)
+
+    def annual_rate(self, sa):
+        """
+        Returns the annual exceedance rate for one or several Sa levels [g].
+        """
+        return self.rate_from_poe(self.poe(sa))
+
+    def sa_for_return_period(self, return_period):
+        """
+        Returns Sa [g] for one or several return periods [years].
+        """
+        return self.sa(return_period_to_poe(return_period, self.investigation_time))
+
+    # --- Memoized scalar queries ---
+    def _sa_at_poe(self, poe):
+        return float(self.sa(poe))
+
+    def _poe_at_sa(self, sa):
+        return float(self.poe(sa))
+
+    def _sa_at_return_period(self, return_period):
+        return float(self.sa_for_return_period(return_period))
+
+    def cache_info(self):
+        """
+        Returns the LRU statistics of the memoized lookups.
+
+        Returns:
+        - dict: {query name: functools CacheInfo}
+        """
+        return {
+            "sa_at_poe": self.sa_at_poe.cache_info(),
+            "poe_at_sa": self.poe_at_sa.cache_info(),
+            "sa_at_return_period": self.sa_at_return_period.cache_info(),
+        }
+
+    def cache_clear(self):
+        """Empties the memoized lookups."""
+        self.sa_at_poe.cache_clear()
+        self.poe_at_sa.cache_clear()
+        self.sa_at_return_period.cache_clear()
+
+
+class UHSInterpolator:
+    """
+    Precomputed log-log interpolator of Sa vs period for every PoE of a UHS.
+    """
+    def __init__(self, curves, investigation_time=50.0, cache_size=4096):
+        """
+        Parameters:
+        - curves (UHSCurves): Spectral data grouped by PoE (e.g. `UHSSpectrum.mean`)
+        - investigation_time (float): Investigation time of the PoEs [years]
+        - cache_size (int): Maximum number of memoized (poe, period) lookups
+        """
+        self.investigation_time = float(investigation_time)
+        self.periods = np.asarray(curves.T(), dtype=float)
+        self._tables = {
+            poe: LogLogTable(self.periods, curves.Sa(poe)) for poe in curves.data
+        }
+        self.sa_at = lru_cache(maxsize=cache_size)(self._sa_at)
+
+    @classmethod
+    def from_uhs(cls, spectrum, investigation_time=None, cache_size=4096):
+        """
+        Builds the interpolator from a `UHSSpectrum` object, using the
+        investigation time of its file unless `investigation_time` is given
+        (a ValueError is raised when neither is known).
+        """
+        investigation_time = resolve_investigation_time(
+            investigation_time, spectrum.investigation_time, "the UHS")
+        return cls(spectrum.mean, investigation_time, cache_size=cache_size)
+
+    @property
+    def poes(self):
+        """Returns the list of available PoEs."""
+        return sorted(self._tables)
+
+    @property
+    def return_periods(self):
+        """Returns the return periods [years] of the available PoEs."""
+        return poe_to_return_period(self.poes, self.investigation_time)
+
+    def Sa(self, poe, periods):
+        """
+        Returns Sa [g] for a PoE at one or several periods [s].
+
+        Parameters:
+        - poe (float): Probability of exceedance (must be one of the exported PoEs)
+        - periods (float or array-like): Periods [s], np.nan outside the exported range
+        """
+        if poe not in self._tables:
+            raise ValueError(f"PoE {poe} not found in the data.")
+        return self._tables[poe](periods)
+
+    def _sa_at(self, poe, period):
+        return float(self.Sa(poe, period))
+
+    def cache_info(self):
+        """Returns the LRU statistics of the memoized lookups."""
+        return self.sa_at.cache_info()
+
+    def cache_clear(self):
+        """Empties the memoized lookups."""
+        self.sa_at.cache_clear()
+
+
+def loglog_interp(xq, x, y, axis=-1):
+    """
+    Log-log interpolation of many curves sharing the same abscissas.
+
+    Parameters:
+    -----------
+    xq : array-like
+        Query abscissas (n_q,).
+    x : array-like
+        Common abscissas, strictly positive and increasing (n_x,).
+    y : ndarray
+        Ordinates with the n_x values along `axis` (any other dimensions).
+    axis : int
+        Axis of `y` holding the abscissas.
+
+    Returns:
+    --------
+    ndarray
+        `y` with `axis` replaced by the n_q queries; np.nan outside the
+        range of `x` or where the bracketing values are not positive.
+    """
+    lx = np.log(np.asarray(x, dtype=float))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        lq = np.log(np.asarray(xq, dtype=float))
+        ly = np.log(np.moveaxis(np.asarray(y, dtype=float), axis, -1))
+
+    # Índices y pesos comunes a todas las curvas
+    i = np.clip(np.searchsorted(lx, lq, side="right") - 1, 0, len(lx) - 2)
+    w = (lq - lx[i]) / (lx[i + 1] - lx[i])
+    out = np.exp(ly[..., i] + w * (ly[..., i + 1] - ly[..., i]))
+    out = np.where((lq >= lx[0]) & (lq <= lx[-1]), out, np.nan)
+    return np.moveaxis(out, -1, axis)
+
+
+def loglog_inverse(targets, x, y, chunk_size=20000):
+    """
+    Batched inverse of decreasing curves y(x) in log-log space: for every
+    row of `y`, the abscissa where the curve crosses each target.
+
+    Parameters:
+    -----------
+    targets : array-like
+        Target ordinates (n_t,), e.g. PoEs.
+    x : array-like
+        Common abscissas, increasing (n_x,), e.g. intensity levels.
+    y : ndarray
+        Non-increasing curves (n_rows, n_x), e.g. PoEs per site.
+    chunk_size : int
+        Rows processed at a time (bounds the temporary arrays).
+
+    Returns:
+    --------
+    ndarray (n_rows, n_t)
+        Abscissas at the targets; np.nan when a curve does not span a target.
+    """
+    lx = np.log(np.asarray(x, dtype=float))
+    lt = np.log(np.asarray(targets, dtype=float))
+    y = np.asarray(y, dtype=float)
+    out = np.full((len(y), len(lt)), np.nan)
+
+    for start in range(0, len(y), chunk_size):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ly = np.log(y[start:start + chunk_size])
+        ly = np.where(np.isfinite(ly), ly, -np.inf)
+        # Número de niveles con PoE >= objetivo -> segmento que cruza el objetivo
+        n_above = (ly[:, None, :] >= lt[None, :, None]).sum(axis=-1)
+        i = np.clip(n_above - 1, 0, len(lx) - 2)
+        y0 = np.take_along_axis(ly, i, axis=1)
+        y1 = np.take_along_axis(ly, i + 1, axis=1)
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            w = (lt[None, :] - y0) / (y1 - y0)
+            value = np.exp(lx[i] + w * (lx[i + 1] - lx[i]))
+        ok = (n_above >= 1) & (n_above < len(lx)) & np.isfinite(value)
+        out[start:start + chunk_size] = np.where(ok, value, np.nan)
+    return out
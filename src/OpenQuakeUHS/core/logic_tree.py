@@ -0,0 +1,330 @@
+"""
+Logic-tree Branch Sensitivity
+Author: Ing. Patricio Palacios Msc.
+Date: October 19, 2026
+
+Description:
+------------
+Which logic-tree branches drive the mean hazard at a design return period?
+Every OpenQuake realization is one path through the logic tree, written in
+'realizations_<calc_id>.csv' as a branch path such as 'AA~AAB': one letter
+per branch set, source model branch sets before the '~' and GMPE branch
+sets after it.
+
+This module encodes the branch paths as a one-hot design matrix
+(realization x branch) and, for every site, IMT and return period at once:
+
+1. averages the realization hazard curves with the logic-tree weights, over
+   all realizations and conditional on each branch (one matrix product with
+   the design matrix), as OpenQuake builds the mean curve,
+2. inverts those mean curves at the return periods (batched log-log
+   interpolation), so the reference is the Sa of the mean hazard, not the
+   mean of the realization Sa values,
+3. reports each branch's effect (conditional Sa - mean Sa) and, per branch
+   set, the swing between its branches and its share of the between-branch
+   variance of the conditional Sa, ranked per site, IMT and return period.
+
+No step loops over realizations in Python.
+
+Typical usage:
+
+    stack = load_hazard_curves("results/")
+    rlz = read_realizations("results/realizations_18.csv")
+    result = branch_sensitivity(stack, rlz, return_periods=[475, 2475])
+    result.ranking().head()
+"""
+
+import numpy as np
+import pandas as pd
+
+from OpenQuakeUHS.core.disaggregation_realizations import read_realizations
+from OpenQuakeUHS.core.interpolation import loglog_interp, loglog_inverse
+from OpenQuakeUHS.core.rate_conversion import resolve_investigation_time, return_period_to_poe
+
+
+def parse_branch_paths(branch_paths):
+    """
+    Splits branch paths into one letter per branch set.
+
+    Parameters:
+    -----------
+    branch_paths : list of str
+        e.g. ['AA~AAA', 'AA~AAB', ...]
+
+    Returns:
+    --------
+    codes : ndarray of str (n_rlz, n_branch_sets)
+        Branch letter of every realization in every branch set.
+    branch_sets : list of str
+        Branch set names: 'smlt_<i>' (source model) and 'gmlt_<i>' (GMPE).
+    """
+    parts = [str(p).split("~") for p in branch_paths]
+    n_parts = {len(p) for p in parts}
+    lengths = {tuple(len(s) for s in p) for p in parts}
+    if len(n_parts) != 1 or len(lengths) != 1:
+        raise ValueError("All branch paths must have the same layout.")
+
+    names = ["smlt", "gmlt"] if n_parts == {2} else [f"lt{j + 1}" for j in range(n_parts.pop())]
+    branch_sets = [f"{names[j]}_{i + 1}" for j, n in enumerate(lengths.pop()) for i in range(n)]
+    codes = np.array([list("".join(p)) for p in parts], dtype="<U1")
+    return codes, branch_sets
+
+
+def branch_design_matrix(branch_paths):
+    """
+    One-hot encoding of the branch paths.
+
+    Returns:
+    --------
+    design : ndarray (n_rlz, n_branches)
+        1 where the realization goes through the branch.
+    branches : list of (branch set, letter)
+        Label of every column, grouped by branch set.
+    """
+    codes, branch_sets = parse_branch_paths(branch_paths)
+    columns, branches = [], []
+    for j, name in enumerate(branch_sets):
+        letters = np.unique(codes[:, j])
+        columns.append(codes[:, j][:, None] == letters[None, :])
+        branches += [(name, str(letter)) for letter in letters]
+    return np.concatenate(columns, axis=1).astype(float), branches
+
+
+def _curves_to_sa(stack, curves, poes):
+    """
+    Sa at the target PoEs of curves[n, site, imt, level] on the IML grid of
+    a `HazardCurveStack` (n, site, imt, n_poe).
+    """
+    n, n_sites, n_imt, _ = curves.shape
+    sa = np.full((n, n_sites, n_imt, len(poes)), np.nan)
+    for k in range(n_imt):
+        levels = np.isfinite(stack.imls[k])
+        rows = curves[:, :, k][..., levels].reshape(n * n_sites, -1)
+        sa[:, :, k] = loglog_inverse(poes, stack.imls[k][levels], rows).reshape(n, n_sites, -1)
+    return sa
+
+
+def realization_design_values(stack, return_periods, investigation_time=None):
+    """
+    Sa of every realization at the return periods.
+
+    Parameters:
+    -----------
+    stack : HazardCurveStack or UHSStack
+        Stack with 'rlz-*' kinds.
+    return_periods : array-like
+        Return periods [years] (n_tr,).
+    investigation_time : float, optional
+        Investigation time of the PoEs [years]; defaults to the one of the
+        stack (a ValueError is raised when neither is known).
+
+    Returns:
+    --------
+    rlz_ids : ndarray (n_rlz,)
+    sa : ndarray (n_rlz, n_sites, n_imt, n_tr)
+        np.nan where a curve does not reach a return period. For a UHSStack
+        the IMT axis holds the periods of the stack.
+    """
+    time_window = resolve_investigation_time(investigation_time, stack.investigation_time, "the stack")
+    poes = return_period_to_poe(return_periods, time_window)
+    rlz_ids, values = stack.realizations()
+    if not len(rlz_ids):
+        raise ValueError("The stack has no realizations ('rlz-*' kinds).")
+
+    if hasattr(stack, "imls"):  # HazardCurveStack: poes[rlz, site, imt, level]
+        return rlz_ids, _curves_to_sa(stack, values, poes)
+
+    # UHSStack: sa[rlz, site, poe, period] con PoEs descendentes
+    sa = loglog_interp(poes, stack.poes[::-1], values[:, :, ::-1, :], axis=2)
+    return rlz_ids, np.moveaxis(sa, 2, 3)
+
+
+class BranchSensitivity:
+    """
+    Sa of the weighted mean hazard curve and of the mean curve conditional
+    on every logic-tree branch, per site, IMT and return period.
+    """
+    def __init__(self, branches, branch_weights, mean, conditional, variance, explained,
+                 imts, return_periods, lons, lats):
+        """
+        Parameters:
+        - branches (list of (branch set, letter)): Branch labels (n_branches,)
+        - branch_weights (ndarray): Total weight of the realizations through each branch
+        - mean (ndarray): Sa of the weighted mean curve (n_sites, n_imt, n_tr)
+        - conditional (ndarray): Sa of the mean curve given each branch
+          (n_branches, n_sites, n_imt, n_tr)
+        - variance (ndarray): Between-branch variance of the conditional Sa,
+          summed over the branch sets (n_sites, n_imt, n_tr)
+        - explained (ndarray): Between-branch variance of each branch set
+          (n_sets, n_sites, n_imt, n_tr)
+        - imts (list): IMTs (or periods) of the IMT axis
+        - return_periods (ndarray): Return periods [years]
+        - lons, lats (ndarray): Site coordinates
+        """
+        self.branches = branches
+        self.branch_sets = list(dict.fromkeys(name for name, _ in branches))
+        self.branch_weights = branch_weights
+        self.mean = mean
+        self.conditional = conditional
+        self.variance = variance
+        self.explained = explained
+        self.imts = list(imts)
+        self.return_periods = np.asarray(return_periods, dtype=float)
+        self.lons = lons
+        self.lats = lats
+
+    @property
+    def effects(self):
+        """Conditional Sa - mean Sa for every branch (n_branches, n_sites, n_imt, n_tr)."""
+        return self.conditional - self.mean[None]
+
+    @property
+    def swing(self):
+        """Max - min conditional Sa within each branch set (n_sets, n_sites, n_imt, n_tr)."""
+        set_of = np.array([self.branch_sets.index(name) for name, _ in self.branches])
+        out = np.empty((len(self.branch_sets),) + self.mean.shape)
+        for j in range(len(self.branch_sets)):
+            c = self.conditional[set_of == j]
+            out[j] = np.nanmax(c, axis=0) - np.nanmin(c, axis=0)
+        return out
+
+    def _grid(self, n_lead):
+        """Site, IMT and return period labels of the flattened arrays."""
+        n_sites, n_imt, n_tr = self.mean.shape
+        s, i, t = np.meshgrid(np.arange(n_sites), np.arange(n_imt), np.arange(n_tr), indexing="ij")
+        s, i, t = (np.tile(a.ravel(), n_lead) for a in (s, i, t))
+        return {
+            "site": s,
+            "lon": self.lons[s],
+            "lat": self.lats[s],
+            "imt": np.asarray(self.imts, dtype=object)[i],
+            "return_period": self.return_periods[t],
+        }
+
+    def effects_frame(self):
+        """
+        Returns one row per (branch, site, IMT, return period) with the Sa
+        of the conditional mean curve and the effect on the mean Sa.
+        """
+        n_cells = self.mean.size
+        n_branches = len(self.branches)
+        frame = {
+            "branch_set": np.repeat([name for name, _ in self.branches], n_cells),
+            "branch": np.repeat([letter for _, letter in self.branches], n_cells),
+            "branch_weight": np.repeat(self.branch_weights, n_cells),
+        }
+        frame.update(self._grid(n_branches))
+        mean = np.tile(self.mean.ravel(), n_branches)
+        frame["mean_sa"] = mean
+        frame["conditional_sa"] = self.conditional.ravel()
+        frame["effect"] = self.effects.ravel()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            frame["relative_effect"] = frame["effect"] / mean
+        return pd.DataFrame(frame)
+
+    def ranking(self):
+        """
+        Returns one row per (branch set, site, IMT, return period) with the
+        swing of the conditional Sa and the branch set's share of the
+        between-branch variance, ranked by that share (1 = main driver)
+        within each site, IMT and return period.
+        """
+        n_sets = len(self.branch_sets)
+        frame = {"branch_set": np.repeat(self.branch_sets, self.mean.size)}
+        frame.update(self._grid(n_sets))
+        frame["mean_sa"] = np.tile(self.mean.ravel(), n_sets)
+        frame["swing"] = self.swing.ravel()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            share = self.explained / self.variance[None]
+        frame["variance_share"] = share.ravel()
+
+        df = pd.DataFrame(frame)
+        keys = ["site", "imt", "return_period"]
+        df["rank"] = df.groupby(keys, sort=False)["variance_share"].rank(
+            ascending=False, method="first").astype("Int64")
+        return df.sort_values(keys + ["rank"], kind="mergesort").reset_index(drop=True)
+
+
+def branch_sensitivity(stack, realizations, return_periods, branch_paths=None, weights=None,
+                       investigation_time=None):
+    """
+    Effect of every logic-tree branch on the Sa of the weighted mean hazard
+    curve at the given return periods, for all sites and IMTs of a stack.
+
+    The realization curves are averaged in PoE (overall and per branch) and
+    the mean curves are then inverted, so `mean` matches the Sa of the
+    exported mean hazard curve and realizations that do not reach a return
+    period still count in the average.
+
+    Parameters:
+    -----------
+    stack : HazardCurveStack
+        Stack with the 'rlz-*' kinds.
+    realizations : str or pandas.DataFrame
+        'realizations_<calc_id>.csv' (path or `read_realizations` output).
+        Ignored when `branch_paths` and `weights` are given.
+    return_periods : array-like
+        Return periods [years].
+    branch_paths, weights : array-like, optional
+        Branch path and weight of every realization of the stack, in the
+        order of `stack.realizations()`.
+    investigation_time : float, optional
+        Investigation time of the PoEs [years]; defaults to the one of the
+        stack.
+
+    Returns:
+    --------
+    BranchSensitivity
+    """
+    if not hasattr(stack, "imls"):
+        raise ValueError("branch_sensitivity needs a HazardCurveStack: the mean of UHS "
+                         "realizations is not the UHS of the mean hazard.")
+    time_window = resolve_investigation_time(investigation_time, stack.investigation_time, "the stack")
+    poes = return_period_to_poe(return_periods, time_window)
+    rlz_ids, curves = stack.realizations()  # (rlz, site, imt, level)
+    if not len(rlz_ids):
+        raise ValueError("The stack has no realizations ('rlz-*' kinds).")
+
+    if branch_paths is None or weights is None:
+        if isinstance(realizations, str):
+            realizations = read_realizations(realizations)
+        table = realizations.set_index("rlz_id", drop=False) if "rlz_id" in realizations else realizations
+        missing = np.setdiff1d(rlz_ids, table.index.to_numpy())
+        if len(missing):
+            raise ValueError(f"Realizations {missing.tolist()} are not in the realizations table.")
+        table = table.loc[rlz_ids]
+        branch_paths = table["branch_path"].tolist() if branch_paths is None else branch_paths
+        weights = table["weight"].to_numpy(dtype=float) if weights is None else weights
+    weights = np.asarray(weights, dtype=float)
+    if len(weights) != len(rlz_ids) or len(branch_paths) != len(rlz_ids):
+        raise ValueError("One branch path and weight is needed per realization.")
+
+    design, branches = branch_design_matrix(branch_paths)  # (rlz, branch)
+    n_rlz = len(rlz_ids)
+    cells = curves.shape[1:]
+    values = curves.reshape(n_rlz, -1)  # (rlz, site*imt*level)
+    present = np.isfinite(values)
+    filled = np.where(present, values, 0.0)
+
+    # Curvas medias ponderadas: total y condicionadas a cada rama (productos matriciales)
+    branch_design = design * weights[:, None]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_poes = (weights @ filled) / (weights @ present)
+        conditional_poes = (branch_design.T @ filled) / (branch_design.T @ present)
+
+    mean = _curves_to_sa(stack, mean_poes.reshape((1,) + cells), poes)[0]
+    conditional = _curves_to_sa(stack, conditional_poes.reshape((-1,) + cells), poes)
+
+    # Varianza entre ramas de cada conjunto: sum_b W_b (Sa_b - Sa)^2 / W
+    branch_weights = design.T @ weights / weights.sum()
+    between = branch_weights[:, None, None, None] * np.nan_to_num(conditional - mean[None]) ** 2
+    set_names = list(dict.fromkeys(name for name, _ in branches))
+    set_of = np.array([set_names.index(name) for name, _ in branches])
+    explained = np.zeros((len(set_names),) + mean.shape)
+    np.add.at(explained, set_of, between)
+    explained = np.where(np.isfinite(mean)[None], explained, np.nan)
+
+    return BranchSensitivity(
+        branches, branch_weights, mean, conditional, explained.sum(axis=0), explained,
+        stack.imts, return_periods, stack.lons, stack.lats,
+    )
@@ -0,0 +1,174 @@
+"""
+Fast OpenQuake CSV Reader
+Author: Ing. Patricio Palacios Msc.
+Date: October 19, 2026
+
+Description:
+------------
+Shared low-level reader for the numeric OpenQuake CSV exports (hazard
+curves and UHS). A file is read in three parts:
+
+1. The metadata comment ('#,,,"generated_by=..., investigation_time=..."')
+   parsed into a typed dict (see `oq_metadata.parse_metadata`).
+2. The column header parsed into typed arrays: intensity levels of the
+   'poe-<iml>' columns and the (poe, IMT, period) of the '<poe>~<IMT>'
+   columns.
+3. The numeric body parsed straight into a float64 array by numpy's C
+   tokenizer (or pyarrow when installed and selected), without building a
+   DataFrame or object columns.
+
+Typical usage:
+
+    table = read_oq_csv("hazard_uhs-mean_18.csv")
+    table.meta["investigation_time"]          # 50.0
+    table.data[:, table.uhs_columns]          # Sa (n_sites, n_poe * n_period)
+"""
+
+import re
+
+import numpy as np
+
+from OpenQuakeUHS.core.oq_metadata import parse_metadata
+
+try:
+    from pyarrow import csv as pa_csv
+except ImportError:  # pyarrow es opcional
+    pa_csv = None
+
+_CURVE_COLUMN = re.compile(r"^poe-([0-9.eE+-]+)$")
+_UHS_COLUMN = re.compile(r"^([0-9.eE+-]+)~(SA|PGA)(?:\(([0-9.]+)\))?$")
+
+
+class OQTable:
+    """
+    Numeric content of one OpenQuake CSV export with its parsed header.
+    """
+    def __init__(self, meta, columns, data):
+        """
+        Parameters:
+        - meta (dict): Parsed metadata line
+        - columns (list of str): Column names
+        - data (ndarray): Numeric body, float64 (n_rows, n_columns)
+        """
+        self.meta = meta
+        self.columns = list(columns)
+        self.data = data
+        self._index = {c: i for i, c in enumerate(self.columns)}
+
+        # Columnas de curvas de amenaza: 'poe-<iml>'
+        curve = [(i, float(m.group(1))) for i, c in enumerate(self.columns)
+                 for m in [_CURVE_COLUMN.match(c)] if m]
+        self.level_columns = np.array([i for i, _ in curve], dtype=int)
+        self.imls = np.array([v for _, v in curve], dtype=float)
+
+        # Columnas UHS: '<poe>~SA(T)' o '<poe>~PGA' (PGA -> T = 0.01 s)
+        uhs = [(i, float(m.group(1)), m.group(2) if m.group(3) is None else f"SA({m.group(3)})",
+                0.01 if m.group(2) == "PGA" else float(m.group(3)))
+               for i, c in enumerate(self.columns) for m in [_UHS_COLUMN.match(c)] if m]
+        self.uhs_columns = np.array([u[0] for u in uhs], dtype=int)
+        self.uhs_poes = np.array([u[1] for u in uhs], dtype=float)
+        self.uhs_imts = [u[2] for u in uhs]
+        self.uhs_periods = np.array([u[3] for u in uhs], dtype=float)
+
+    def __len__(self):
+        return len(self.data)
+
+    def has(self, name):
+        """Whether the table has a column called `name`."""
+        return name in self._index
+
+    def column(self, name):
+        """Returns a column by name as a float64 array (n_rows,)."""
+        if name not in self._index:
+            raise ValueError(f"Column {name} not found.")
+        return self.data[:, self._index[name]]
+
+    @property
+    def poes(self):
+        """PoEs of the 'poe-<iml>' columns (n_rows, n_levels)."""
+        return self.data[:, self.level_columns]
+
+    @property
+    def uhs_values(self):
+        """Values of the '<poe>~<IMT>' columns (n_rows, n_uhs_columns)."""
+        return self.data[:, self.uhs_columns]
+
+
+def _parse_body_numpy(text, n_columns):
+    """
+    Parses the comma-separated numeric body. The C tokenizer of
+    `np.fromstring` handles the common case; rows with empty or non-numeric
+    cells fall back to a per-cell parse with np.nan.
+    """
+    text = text.strip()
+    if not text:
+        return np.empty((0, n_columns))
+
+    n_rows = text.count("\n") + 1
+    try:
+        flat = np.fromstring(text.replace("\n", ","), dtype=np.float64, sep=",")
+    except ValueError:  # numpy >= 2: celda vacía o no numérica en medio de una fila
+        flat = None
+    if flat is not None and flat.size == n_rows * n_columns:
+        return flat.reshape(n_rows, n_columns)
+
+    def to_float(cell):
+        try:
+            return float(cell)
+        except ValueError:
+            return np.nan
+
+    rows = [[to_float(c) for c in line.split(",")] for line in text.splitlines()]
+    out = np.full((len(rows), n_columns), np.nan)
+    for i, row in enumerate(rows):
+        out[i, :min(len(row), n_columns)] = row[:n_columns]
+    return out
+
+
+def _parse_body_pyarrow(path, columns, skip_rows):
+    options = pa_csv.ReadOptions(skip_rows=skip_rows, column_names=columns)
+    convert = pa_csv.ConvertOptions(column_types={c: "float64" for c in columns})
+    table = pa_csv.read_csv(path, read_options=options, convert_options=convert)
+    return np.column_stack([table.column(c).to_numpy(zero_copy_only=False) for c in columns]) \
+        if columns else np.empty((table.num_rows, 0))
+
+
+def read_oq_csv(path, engine="numpy"):
+    """
+    Reads a numeric OpenQuake CSV export (hazard curves or UHS).
+
+    Parameters:
+    -----------
+    path : str
+        Path to the CSV file.
+    engine : str
+        'numpy' (default) or 'pyarrow' (requires pyarrow; faster on very
+        large multi-site files).
+
+    Returns:
+    --------
+    OQTable
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        first = f.readline()
+        if first.startswith("#"):
+            meta = parse_metadata(first)
+            header = f.readline()
+        else:
+            meta = {}
+            header = first
+        columns = [c.strip() for c in header.strip().split(",")]
+
+        if engine == "numpy":
+            data = _parse_body_numpy(f.read(), len(columns))
+        elif engine == "pyarrow":
+            if pa_csv is None:
+                raise ImportError("engine='pyarrow' requires the pyarrow package.")
+            data = None
+        else:
+            raise ValueError(f"Unknown engine {engine}; use 'numpy' or 'pyarrow'.")
+
+    if data is None:
+        data = _parse_body_pyarrow(path, columns, 2 if first.startswith("#") else 1)
+
+    return OQTable(meta, columns, data)
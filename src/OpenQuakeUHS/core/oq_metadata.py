@@ -0,0 +1,97 @@
+"""
+OpenQuake CSV Metadata Parser
+Author: Ing. Patricio Palacios Msc.
+Date: October 19, 2026
+
+Description:
+------------
+Every CSV exported by the OpenQuake engine starts with a comment line such as:
+
+    #,,,"generated_by='OpenQuake engine 3.21.0', kind='mean', investigation_time=50.0, imt='PGA'"
+
+This module parses that line into a dictionary with typed values
+(numbers, strings and lists such as the disaggregation bin edges).
+"""
+
+import ast
+
+
+def _split_top_level(text):
+    """
+    Splits 'k=v, k=[a, b], k='x, y'' on the commas that are not inside
+    brackets or quotes.
+    """
+    parts = []
+    depth = 0
+    quote = None
+    start = 0
+    for i, ch in enumerate(text):
+        if quote:
+            if ch == quote:
+                quote = None
+        elif ch in "'\"":
+            quote = ch
+        elif ch in "[(":
+            depth += 1
+        elif ch in "])":
+            depth -= 1
+        elif ch == "," and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return [p.strip() for p in parts if p.strip()]
+
+
+def parse_metadata(line):
+    """
+    Parses an OpenQuake metadata comment line.
+
+    Parameters:
+    -----------
+    line : str
+        First line of an OpenQuake CSV export (starting with '#').
+
+    Returns:
+    --------
+    dict
+        Metadata with values converted by `ast.literal_eval` when possible
+        (e.g. {'kind': 'mean', 'investigation_time': 50.0, 'imt': 'PGA'}).
+        An empty dict is returned when the line is not a metadata comment.
+    """
+    line = line.strip()
+    if not line.startswith("#"):
+        return {}
+
+    body = line.lstrip("#").lstrip(",").strip()
+    if len(body) >= 2 and body[0] == '"' and body[-1] == '"':
+        body = body[1:-1]
+
+    meta = {}
+    for item in _split_top_level(body):
+        key, sep, value = item.partition("=")
+        if not sep:
+            continue
+        value = value.strip()
+        try:
+            meta[key.strip()] = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            meta[key.strip()] = value
+    return meta
+
+
+def read_metadata(path):
+    """
+    Reads and parses the metadata line of an OpenQuake CSV file.
+
+    Parameters:
+    -----------
+    path : str
+        Path to the CSV file.
+
+    Returns:
+    --------
+    dict
+        Parsed metadata (empty when the file has no metadata line).
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        return parse_metadata(f.readline())
@@ -0,0 +1,673 @@
+"""
+Local Hazard Query Service
+Author: Ing. Patricio Palacios Msc.
+Date: October 19, 2026
+
+Description:
+------------
+A small HTTP/JSON service (standard library only) answering "UHS / hazard
+curve / disaggregation summary at lon, lat, PoE" queries from a warm
+in-memory index, instead of re-reading the CSV files on every request.
+
+- `HazardIndex` holds the `HazardCurveStack`, `UHSStack` and the
+  disaggregation site summaries (see `disaggregation_batch`), loaded once
+  at startup, with an exact site lookup and a vectorized nearest-site
+  search.
+- `HazardQueryService` serves the index over HTTP, bound to localhost by
+  default. Encoded responses are kept in a bounded LRU cache and the
+  latency of every route is recorded.
+
+Routes (GET parameters; POST /batch takes {"queries": [{"type": ..., ...}]}):
+
+    /uhs           lon, lat, poe | return_period, kind, nearest
+    /hazard_curve  lon, lat, imt, kind, nearest, return_period (optional)
+    /disagg        lon, lat, imt, poe, nearest
+    /nearest       lon, lat, k
+    /batch         several of the queries above in one request
+    /metrics       request counts, cache hits and latency percentiles
+    /health
+
+Typical usage:
+
+    index = HazardIndex.from_folder("results/", disagg_checkpoint="disagg.jsonl", calc_id=18)
+    with HazardQueryService(index, port=8765) as service:
+        ...  # GET http://127.0.0.1:8765/uhs?lon=-78.49&lat=-0.18&return_period=475
+"""
+
+import json
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+
+from OpenQuakeUHS.core.async_loader import load_hazard_curves, load_uhs
+from OpenQuakeUHS.core.disaggregation_batch import load_site_summaries
+from OpenQuakeUHS.core.interpolation import loglog_interp, loglog_inverse
+from OpenQuakeUHS.core.rate_conversion import resolve_investigation_time, return_period_to_poe
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def _jsonable(value):
+    """Converts numpy values to JSON types (NaN -> None)."""
+    if isinstance(value, dict):
+        return {str(k): _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [_jsonable(v) for v in (value.tolist() if isinstance(value, np.ndarray) else value)]
+    if isinstance(value, (np.floating, float)):
+        return None if not math.isfinite(value) else float(value)
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, np.bool_):
+        return bool(value)
+    return value
+
+
+def haversine_km(lon1, lat1, lon2, lat2):
+    """Great-circle distance [km] between points given in degrees (broadcasts)."""
+    lon1, lat1, lon2, lat2 = (np.radians(np.asarray(v, dtype=float)) for v in (lon1, lat1, lon2, lat2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class SiteIndex:
+    """
+    Exact and nearest lookup of query points among the sites of the index.
+    """
+    def __init__(self, lons, lats, decimals=5):
+        """
+        Parameters:
+        - lons, lats (array-like): Site coordinates (n_sites,)
+        - decimals (int): Decimals used to match coordinates exactly
+        """
+        self.lons = np.asarray(lons, dtype=float)
+        self.lats = np.asarray(lats, dtype=float)
+        self.decimals = decimals
+        self._exact = {
+            (round(float(lon), decimals), round(float(lat), decimals)): i
+            for i, (lon, lat) in enumerate(zip(self.lons, self.lats))
+        }
+
+    def __len__(self):
+        return len(self.lons)
+
+    def nearest(self, lons, lats, k=1, chunk_size=2048):
+        """
+        Nearest sites of many query points.
+
+        Returns:
+        --------
+        index : ndarray (n_points, k)
+        distance : ndarray (n_points, k)
+            Great-circle distances [km].
+        """
+        lons = np.atleast_1d(np.asarray(lons, dtype=float))
+        lats = np.atleast_1d(np.asarray(lats, dtype=float))
+        k = max(1, min(int(k), len(self)))
+        index = np.empty((len(lons), k), dtype=int)
+        distance = np.empty((len(lons), k))
+        for start in range(0, len(lons), chunk_size):
+            part = slice(start, start + chunk_size)
+            d = haversine_km(lons[part, None], lats[part, None], self.lons[None], self.lats[None])
+            idx = np.argpartition(d, k - 1, axis=1)[:, :k] if k < len(self) else np.tile(np.arange(k), (len(d), 1))
+            dk = np.take_along_axis(d, idx, axis=1)
+            order = np.argsort(dk, axis=1)
+            index[part] = np.take_along_axis(idx, order, axis=1)
+            distance[part] = np.take_along_axis(dk, order, axis=1)
+        return index, distance
+
+    def locate(self, lons, lats, nearest=False, max_distance_km=None):
+        """
+        Site of every query point: the exact site, or the nearest one when
+        `nearest` is True.
+
+        Returns:
+        --------
+        index : ndarray (n_points,)
+            Site index, -1 where no site is found.
+        distance : ndarray (n_points,)
+            Distance to the site [km] (np.nan where not found).
+        """
+        lons = np.atleast_1d(np.asarray(lons, dtype=float))
+        lats = np.atleast_1d(np.asarray(lats, dtype=float))
+        index = np.array([self._exact.get((round(float(lon), self.decimals), round(float(lat), self.decimals)), -1)
+                          for lon, lat in zip(lons, lats)], dtype=int)
+        distance = np.where(index >= 0, 0.0, np.nan)
+
+        missing = np.flatnonzero(index < 0)
+        if nearest and len(missing) and len(self):
+            idx, d = self.nearest(lons[missing], lats[missing], k=1)
+            ok = np.ones(len(missing), dtype=bool) if max_distance_km is None else d[:, 0] <= max_distance_km
+            index[missing[ok]] = idx[ok, 0]
+            distance[missing[ok]] = d[ok, 0]
+        return index, distance
+
+
+class HazardIndex:
+    """
+    Warm in-memory store of the hazard results answered by the service.
+    """
+    def __init__(self, curve_stack=None, uhs_stack=None, disagg_summaries=None, site_decimals=5,
+                 investigation_time=None, poe_rtol=1e-2):
+        """
+        Parameters:
+        - curve_stack (HazardCurveStack): Multi-site hazard curves
+        - uhs_stack (UHSStack): Multi-site uniform hazard spectra
+        - disagg_summaries (pandas.DataFrame): Output of `load_site_summaries`
+        - site_decimals (int): Decimals used to match site coordinates exactly
+        - investigation_time (float): Investigation time used to convert return
+          periods [years]; defaults to the one stated by each stack
+        - poe_rtol (float): Relative distance within which a requested PoE is
+          snapped to an exported one (e.g. 475 years -> PoE 0.1 in 50 years)
+        """
+        self.investigation_time = investigation_time
+        self.poe_rtol = poe_rtol
+        self.curve_stack = curve_stack
+        self.uhs_stack = uhs_stack
+        self.disagg_summaries = disagg_summaries
+        self.curve_sites = None if curve_stack is None else SiteIndex(curve_stack.lons, curve_stack.lats, site_decimals)
+        self.uhs_sites = None if uhs_stack is None else SiteIndex(uhs_stack.lons, uhs_stack.lats, site_decimals)
+        self.disagg_sites = None
+        if disagg_summaries is not None and len(disagg_summaries):
+            coords = disagg_summaries[["lon", "lat"]].drop_duplicates()
+            self.disagg_sites = SiteIndex(coords["lon"], coords["lat"], site_decimals)
+            self._disagg_coords = coords.to_numpy(dtype=float)
+
+    @classmethod
+    def from_folder(cls, folder_path, include_rlz=False, disagg_checkpoint=None, site_decimals=5,
+                    investigation_time=None, calc_id=None):
+        """
+        Loads the hazard curves and UHS of one calculation of a folder (and
+        optionally the disaggregation summaries of a
+        `summarize_disaggregation_sites` checkpoint) into an index.
+        `calc_id` is required when the folder holds several calculations.
+        """
+        curves = load_hazard_curves(folder_path, include_rlz, calc_id=calc_id)
+        uhs = load_uhs(folder_path, include_rlz, calc_id=calc_id)
+        summaries = None if disagg_checkpoint is None else load_site_summaries(disagg_checkpoint)
+        return cls(curves, uhs, summaries, site_decimals, investigation_time)
+
+    @classmethod
+    def from_store(cls, store, disagg_summaries=None, investigation_time=None, calc_id=None):
+        """
+        Builds an index from the stacks of one calculation of a
+        `watch_service.HazardStore` (`calc_id` is required when it holds
+        several).
+        """
+        return cls(store.curve_stack(calc_id), store.uhs_stack(calc_id), disagg_summaries,
+                   store.site_decimals, investigation_time)
+
+    def summary(self):
+        """Sizes of the loaded results."""
+        out = {}
+        if self.curve_stack is not None:
+            out["hazard_curve"] = {"sites": len(self.curve_sites), "kinds": self.curve_stack.kinds,
+                                   "imts": self.curve_stack.imts,
+                                   "investigation_time": self.curve_stack.investigation_time}
+        if self.uhs_stack is not None:
+            out["uhs"] = {"sites": len(self.uhs_sites), "kinds": self.uhs_stack.kinds,
+                          "poes": self.uhs_stack.poes, "periods": self.uhs_stack.periods,
+                          "investigation_time": self.uhs_stack.investigation_time}
+        if self.disagg_sites is not None:
+            out["disagg"] = {"sites": len(self.disagg_sites), "rows": len(self.disagg_summaries)}
+        return out
+
+    @staticmethod
+    def _require(obj, name):
+        if obj is None:
+            raise LookupError(f"No {name} results are loaded.")
+        return obj
+
+    @staticmethod
+    def _located(sites, index, distance, i):
+        return {"site": int(index[i]), "site_lon": float(sites.lons[index[i]]),
+                "site_lat": float(sites.lats[index[i]]), "distance_km": float(distance[i])}
+
+    def _time(self, stack, name):
+        return resolve_investigation_time(self.investigation_time, stack.investigation_time,
+                                          f"the {name} results")
+
+    def _poes(self, stack, poe, return_period):
+        """
+        Target PoE of a UHS query, snapped to the exported PoE within
+        `poe_rtol`. A PoE outside the exported range is a ValueError.
+        """
+        if (poe is None) == (return_period is None):
+            raise ValueError("Give either 'poe' or 'return_period'.")
+        if poe is not None:
+            target = float(poe)
+        else:
+            target = float(return_period_to_poe(float(return_period), self._time(stack, "UHS")))
+
+        match = np.flatnonzero(np.isclose(stack.poes, target, rtol=self.poe_rtol, atol=0.0))
+        if len(match):
+            return float(stack.poes[match[np.argmin(np.abs(stack.poes[match] - target))]])
+        lo, hi = float(stack.poes.min()), float(stack.poes.max())
+        if not lo <= target <= hi:
+            requested = f"PoE {target:.6g}"
+            if return_period is not None:
+                requested = f"Return period {float(return_period):g} years ({requested})"
+            raise ValueError(f"{requested} is outside the exported PoE range [{lo:g}, {hi:g}].")
+        return target
+
+    def uhs(self, lons, lats, poe=None, return_period=None, kind="mean", nearest=False,
+            max_distance_km=None):
+        """
+        Uniform hazard spectra at several points for one PoE (or return
+        period), interpolated in log-log space between the exported PoEs.
+
+        Returns:
+        - list of dict: One response per point
+        """
+        stack = self._require(self.uhs_stack, "UHS")
+        target = self._poes(stack, poe, return_period)
+        index, distance = self.uhs_sites.locate(lons, lats, nearest, max_distance_km)
+
+        sa = stack.select(kind)  # (site, poe, period); PoEs descendentes
+        found = index[index >= 0]
+        match = np.flatnonzero(stack.poes == target)
+        if len(match):
+            values = sa[found, match[0], :]
+        else:
+            values = loglog_interp([target], stack.poes[::-1], sa[found][:, ::-1, :], axis=1)[:, 0, :]
+
+        out, n = [], 0
+        for i, (lon, lat) in enumerate(zip(np.atleast_1d(lons), np.atleast_1d(lats))):
+            row = {"lon": float(lon), "lat": float(lat), "kind": kind, "poe": target}
+            if index[i] < 0:
+                row["error"] = "site not found"
+            else:
+                row.update(self._located(self.uhs_sites, index, distance, i))
+                row["periods"] = stack.periods
+                row["sa"] = values[n]
+                n += 1
+            out.append(row)
+        return out
+
+    def hazard_curve(self, lons, lats, imt, kind="mean", return_period=None, nearest=False,
+                     max_distance_km=None):
+        """
+        Hazard curves of one IMT at several points, with the intensity at a
+        return period when given.
+
+        Returns:
+        - list of dict: One response per point
+        """
+        stack = self._require(self.curve_stack, "hazard curve")
+        if imt not in stack.imts:
+            raise ValueError(f"IMT {imt} not found; available: {stack.imts}.")
+        k = stack.imts.index(imt)
+        levels = np.isfinite(stack.imls[k])
+        index, distance = self.curve_sites.locate(lons, lats, nearest, max_distance_km)
+        curves = stack.select(kind)[index[index >= 0], k][:, levels]
+
+        design = None
+        if return_period is not None:
+            target = return_period_to_poe(float(return_period), self._time(stack, "hazard curve"))
+            design = loglog_inverse([target], stack.imls[k][levels], curves)[:, 0]
+
+        out, n = [], 0
+        for i, (lon, lat) in enumerate(zip(np.atleast_1d(lons), np.atleast_1d(lats))):
+            row = {"lon": float(lon), "lat": float(lat), "kind": kind, "imt": imt}
+            if index[i] < 0:
+                row["error"] = "site not found"
+            else:
+                row.update(self._located(self.curve_sites, index, distance, i))
+                row["imls"] = stack.imls[k][levels]
+                row["poes"] = curves[n]
+                if design is not None:
+                    row["return_period"] = float(return_period)
+                    row["sa"] = design[n]
+                n += 1
+            out.append(row)
+        return out
+
+    def disagg(self, lons, lats, imt=None, poe=None, nearest=False, max_distance_km=None):
+        """
+        Disaggregation summaries (mean/modal M-R-epsilon, TRT shares) at
+        several points, optionally filtered by IMT and PoE.
+
+        Returns:
+        - list of dict: One response per point
+        """
+        summaries = self._require(self.disagg_summaries, "disaggregation")
+        index, distance = self.disagg_sites.locate(lons, lats, nearest, max_distance_km)
+        out = []
+        for i, (lon, lat) in enumerate(zip(np.atleast_1d(lons), np.atleast_1d(lats))):
+            row = {"lon": float(lon), "lat": float(lat)}
+            if index[i] < 0:
+                row["error"] = "site not found"
+                out.append(row)
+                continue
+            site_lon, site_lat = self._disagg_coords[index[i]]
+            sel = (summaries["lon"] == site_lon) & (summaries["lat"] == site_lat)
+            if imt is not None:
+                sel &= summaries["imt"] == imt
+            if poe is not None:
+                sel &= np.isclose(summaries["poe"].to_numpy(dtype=float), float(poe),
+                                  rtol=self.poe_rtol, atol=0.0)
+            row.update(self._located(self.disagg_sites, index, distance, i))
+            row["summaries"] = summaries[sel].to_dict(orient="records")
+            out.append(row)
+        return out
+
+    def nearest(self, lons, lats, k=1, output="uhs"):
+        """
+        The `k` sites of an output closest to several points.
+
+        Returns:
+        - list of dict: One response per point
+        """
+        sites = {"uhs": self.uhs_sites, "hazard_curve": self.curve_sites, "disagg": self.disagg_sites}
+        if output not in sites:
+            raise ValueError(f"Unknown output {output}; use 'uhs', 'hazard_curve' or 'disagg'.")
+        sites = self._require(sites[output], output)
+        index, distance = sites.nearest(lons, lats, k)
+        return [{"lon": float(lon), "lat": float(lat),
+                 "sites": [{"site": int(j), "site_lon": float(sites.lons[j]),
+                            "site_lat": float(sites.lats[j]), "distance_km": float(d)}
+                           for j, d in zip(index[i], distance[i])]}
+                for i, (lon, lat) in enumerate(zip(np.atleast_1d(lons), np.atleast_1d(lats)))]
+
+
+class ResponseCache:
+    """
+    Bounded, thread-safe LRU cache of encoded responses.
+    """
+    def __init__(self, maxsize=1024):
+        """
+        Parameters:
+        - maxsize (int): Maximum number of cached responses (0 disables the cache)
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def info(self):
+        with self._lock:
+            return {"size": len(self._data), "maxsize": self.maxsize,
+                    "hits": self.hits, "misses": self.misses}
+
+
+class LatencyMetrics:
+    """
+    Request counts and latency percentiles per route over the last
+    `window` requests.
+    """
+    def __init__(self, window=2048):
+        self.window = window
+        self._routes = {}
+        self._lock = threading.Lock()
+
+    def record(self, route, seconds, status, cached):
+        with self._lock:
+            entry = self._routes.setdefault(route, {
+                "count": 0, "errors": 0, "cache_hits": 0, "latencies": deque(maxlen=self.window)})
+            entry["count"] += 1
+            entry["errors"] += int(status >= 400)
+            entry["cache_hits"] += int(cached)
+            entry["latencies"].append(seconds * 1000.0)
+
+    def snapshot(self):
+        """
+        Returns:
+        - dict: {route: count, errors, cache_hits, mean_ms, p50_ms, p95_ms, p99_ms, max_ms}
+        """
+        with self._lock:
+            routes = {r: (dict(e), np.array(e["latencies"])) for r, e in self._routes.items()}
+        out = {}
+        for route, (entry, ms) in routes.items():
+            p50, p95, p99 = np.percentile(ms, [50, 95, 99]) if len(ms) else (np.nan,) * 3
+            out[route] = {"count": entry["count"], "errors": entry["errors"],
+                          "cache_hits": entry["cache_hits"],
+                          "mean_ms": ms.mean() if len(ms) else np.nan,
+                          "p50_ms": p50, "p95_ms": p95, "p99_ms": p99,
+                          "max_ms": ms.max() if len(ms) else np.nan}
+        return out
+
+
+def _flag(value):
+    return str(value).lower() in ("1", "true", "yes")
+
+
+def _float(params, name, default=None):
+    value = params.get(name, default)
+    return None if value is None else float(value)
+
+
+def _coords(params):
+    """Query points from 'lon'/'lat' (numbers or lists) or 'points' ([[lon, lat], ...])."""
+    if "points" in params:
+        points = np.asarray(params["points"], dtype=float).reshape(-1, 2)
+        return points[:, 0], points[:, 1]
+    if "lon" not in params or "lat" not in params:
+        raise ValueError("'lon' and 'lat' are required.")
+    return np.atleast_1d(np.asarray(params["lon"], dtype=float)), np.atleast_1d(np.asarray(params["lat"], dtype=float))
+
+
+def _single(rows, params):
+    """Unwraps the response of a single-point query (a missing site is a LookupError)."""
+    if "points" in params or np.ndim(params.get("lon")) != 0:
+        return rows
+    if "error" in rows[0]:
+        raise LookupError(f"{rows[0]['error']} at ({rows[0]['lon']}, {rows[0]['lat']}).")
+    return rows[0]
+
+
+class HazardQueryService:
+    """
+    Threaded HTTP/JSON server answering hazard queries from a `HazardIndex`.
+    """
+    def __init__(self, index, host="127.0.0.1", port=8765, cache_size=1024, max_batch=10000):
+        """
+        Parameters:
+        - index (HazardIndex): Loaded results
+        - host (str): Interface to bind (localhost by default)
+        - port (int): Port to bind (0 picks a free one)
+        - cache_size (int): Maximum number of cached responses
+        - max_batch (int): Maximum number of queries of a /batch request
+        """
+        self.index = index
+        self.host = host
+        self.port = port
+        self.max_batch = max_batch
+        self.cache = ResponseCache(cache_size)
+        self.metrics = LatencyMetrics()
+        self.started = time.time()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def reload(self, index):
+        """Replaces the index (e.g. after new results) and empties the cache."""
+        self.index = index
+        self.cache.clear()
+
+    # --- Consultas ---
+    def query(self, kind, params):
+        """
+        Answers one query.
+
+        Parameters:
+        - kind (str): 'uhs', 'hazard_curve', 'disagg' or 'nearest'
+        - params (dict): Query parameters
+
+        Returns:
+        - dict or list of dict
+        """
+        lons, lats = _coords(params)
+        nearest = _flag(params.get("nearest", False))
+        max_distance = _float(params, "max_distance_km")
+        if kind == "uhs":
+            rows = self.index.uhs(lons, lats, _float(params, "poe"), _float(params, "return_period"),
+                                  params.get("kind", "mean"), nearest, max_distance)
+        elif kind == "hazard_curve":
+            if "imt" not in params:
+                raise ValueError("'imt' is required.")
+            rows = self.index.hazard_curve(lons, lats, params["imt"], params.get("kind", "mean"),
+                                           _float(params, "return_period"), nearest, max_distance)
+        elif kind == "disagg":
+            rows = self.index.disagg(lons, lats, params.get("imt"), _float(params, "poe"),
+                                     nearest, max_distance)
+        elif kind == "nearest":
+            rows = self.index.nearest(lons, lats, int(params.get("k", 1)), params.get("output", "uhs"))
+        else:
+            raise ValueError(f"Unknown query type {kind}.")
+        return _single(rows, params)
+
+    def batch(self, payload):
+        """
+        Answers a list of queries: {"queries": [{"type": "uhs", "lon": ..., ...}, ...]}.
+        Failed queries return {"error": ...} without failing the batch.
+        """
+        queries = payload.get("queries") if isinstance(payload, dict) else None
+        if not isinstance(queries, list):
+            raise ValueError("The body must be {\"queries\": [...]}.")
+        if len(queries) > self.max_batch:
+            raise ValueError(f"At most {self.max_batch} queries per batch.")
+        results = []
+        for q in queries:
+            try:
+                params = dict(q)
+                results.append(self.query(params.pop("type", "uhs"), params))
+            except (ValueError, LookupError, TypeError) as e:
+                results.append({"error": str(e)})
+        return {"results": results}
+
+    def handle(self, method, path, params=None, body=None):
+        """
+        Routes a request without going through HTTP.
+
+        Returns:
+        - (int, bytes, bool): Status, JSON body and whether it came from the cache
+        """
+        route = path.rstrip("/") or "/"
+        if route == "/health":
+            return 200, json.dumps({"status": "ok", "uptime_s": time.time() - self.started}).encode(), False
+        if route == "/metrics":
+            data = {"routes": self.metrics.snapshot(), "cache": self.cache.info(),
+                    "index": self.index.summary()}
+            return 200, json.dumps(_jsonable(data)).encode(), False
+
+        key = (method, route, body if method == "POST" else tuple(sorted((params or {}).items())))
+        cached = self.cache.get(key)
+        if cached is not None:
+            return 200, cached, True
+
+        try:
+            if method == "POST" and route == "/batch":
+                data = self.batch(json.loads(body or b"{}"))
+            elif method == "GET" and route in ("/uhs", "/hazard_curve", "/disagg", "/nearest"):
+                data = self.query(route[1:], dict(params or {}))
+            else:
+                return 404, json.dumps({"error": f"Unknown route {method} {route}."}).encode(), False
+        except LookupError as e:
+            return 404, json.dumps({"error": str(e)}).encode(), False
+        except (ValueError, TypeError) as e:
+            return 400, json.dumps({"error": str(e)}).encode(), False
+
+        encoded = json.dumps(_jsonable(data)).encode()
+        self.cache.put(key, encoded)
+        return 200, encoded, False
+
+    # --- Servidor ---
+    def _handler_class(self):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _respond(self, method):
+                start = time.perf_counter()
+                split = urlsplit(self.path)
+                body = None
+                if method == "POST":
+                    body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                status, payload, cached = service.handle(method, split.path, dict(parse_qsl(split.query)), body)
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+                service.metrics.record(split.path.rstrip("/") or "/", time.perf_counter() - start,
+                                       status, cached)
+
+            def do_GET(self):
+                self._respond("GET")
+
+            def do_POST(self):
+                self._respond("POST")
+
+            def log_message(self, format, *args):
+                pass  # las métricas reemplazan el log por solicitud
+
+        return Handler
+
+    def start(self):
+        """Starts serving in a background thread."""
+        if self._server is not None:
+            return self
+        self._server = ThreadingHTTPServer((self.host, self.port), self._handler_class())
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="HazardQueryService",
+                                        daemon=True)
+        self._thread.start()
+        print(f"Hazard query service listening on {self.url}")
+        return self
+
+    def serve_forever(self):
+        """Serves in the calling thread until interrupted."""
+        self.start()
+        try:
+            self._thread.join()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self):
+        """Stops the server."""
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        self._server = None
+        self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
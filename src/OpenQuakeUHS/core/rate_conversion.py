@@ -0,0 +1,118 @@
+"""
+Rate / PoE / Return Period Conversions
+Author: Ing. Patricio Palacios Msc.
+Date: October 19, 2026
+
+Description:
+------------
+OpenQuake reports probabilities of exceedance in the investigation time T
+stated in every file header ('investigation_time=50.0'). This module
+converts whole arrays (any shape) between:
+
+- PoE in T years
+- annual exceedance rate (lambda)
+- return period (1 / lambda)
+
+using the exact Poisson relation PoE = 1 - exp(-lambda * T). `log1p` and
+`expm1` keep the conversions accurate for PoEs close to 0 and 1.
+"""
+
+import numpy as np
+
+from OpenQuakeUHS.core.oq_metadata import read_metadata
+
+
+def read_investigation_time(path, default=None):
+    """
+    Reads the investigation time [years] from the metadata line of a file.
+
+    Parameters:
+    -----------
+    path : str
+        OpenQuake CSV export.
+    default : float, optional
+        Value returned when the file does not state it. A ValueError is
+        raised when omitted.
+
+    Returns:
+    --------
+    float
+    """
+    value = read_metadata(path).get("investigation_time")
+    if value is None:
+        if default is None:
+            raise ValueError(f"No investigation_time found in {path}.")
+        return float(default)
+    return float(value)
+
+
+def resolve_investigation_time(investigation_time, stated, source="the data"):
+    """
+    Investigation time [years] to convert PoEs with: the explicit value when
+    given, otherwise the one stated by the data.
+
+    Parameters:
+    -----------
+    investigation_time : float or None
+        Value given by the caller.
+    stated : float or None
+        Value read from the files (e.g. `stack.investigation_time`).
+    source : str
+        Description of the data used in the error message.
+
+    Returns:
+    --------
+    float
+    """
+    if investigation_time is None:
+        investigation_time = stated
+    if investigation_time is None:
+        raise ValueError(f"The investigation time of {source} is unknown; "
+                         f"pass investigation_time explicitly.")
+    return float(investigation_time)
+
+
+def poe_to_rate(poe, investigation_time):
+    """
+    Annual exceedance rate for PoEs in `investigation_time` years.
+    PoE = 1 gives inf; PoEs outside [0, 1] give np.nan.
+    """
+    poe = np.asarray(poe, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rate = -np.log1p(-poe) / investigation_time
+    return np.where((poe >= 0) & (poe <= 1), rate, np.nan)
+
+
+def rate_to_poe(rate, investigation_time):
+    """
+    PoE in `investigation_time` years for annual exceedance rates.
+    """
+    rate = np.asarray(rate, dtype=float)
+    return -np.expm1(-rate * investigation_time)
+
+
+def poe_to_return_period(poe, investigation_time):
+    """
+    Return period [years] for PoEs in `investigation_time` years.
+    """
+    with np.errstate(divide="ignore"):
+        return 1.0 / poe_to_rate(poe, investigation_time)
+
+
+def return_period_to_poe(return_period, investigation_time):
+    """
+    PoE in `investigation_time` years for return periods [years].
+    """
+    return_period = np.asarray(return_period, dtype=float)
+    with np.errstate(divide="ignore"):
+        return -np.expm1(-investigation_time / return_period)
+
+
+def rescale_poe(poe, from_time, to_time):
+    """
+    Converts PoEs in `from_time` years into PoEs in `to_time` years.
+    """
+    poe = np.asarray(poe, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = -np.expm1(np.log1p(-poe) * (to_time / from_time))
+    return np.where((poe >= 0) & (poe <= 1), out, np.nan)
@@ -0,0 +1,199 @@
+"""
+Shared-memory Hazard Arrays
+Author: Ing. Patricio Palacios Msc.
+Date: October 19, 2026
+
+Description:
+------------
+This module publishes the stacked hazard arrays (`HazardCurveStack`,
+`UHSStack`, `DisaggregationArray`) into `multiprocessing.shared_memory`
+blocks and rebuilds them in worker processes as zero-copy, read-only views.
+Only a small picklable descriptor travels to the workers, so a pool of N
+workers holds a single copy of the data instead of N.
+
+Typical usage:
+
+    with share_stack(stack) as shared:
+        with Pool(16) as pool:
+            pool.map(worker, [(shared.descriptor, site) for site in sites])
+
+    def worker(args):
+        descriptor, site = args
+        stack = attach_stack(descriptor)
+        ...
+"""
+
+import ctypes
+import sys
+import threading
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from OpenQuakeUHS.core.disaggregation_loader import DisaggregationArray
+from OpenQuakeUHS.core.hazard_stack import HazardCurveStack, UHSStack
+
+_ATTACH_LOCK = threading.Lock()
+
+
+def _open_block(name):
+    """
+    Attaches to an existing block without registering it with the resource
+    tracker (which would unlink it when a worker exits).
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+
+    # Before 3.13 attaching always registers the block. Registration is
+    # suppressed for this call only, so workers sharing the parent's tracker
+    # never send register/unregister messages for blocks they do not own.
+    with _ATTACH_LOCK:
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+class _BlockView:
+    """
+    Array-interface proxy over a shared-memory block. Every view created from
+    it references the proxy, so the block stays open as long as any view does.
+    """
+    def __init__(self, block, shape, dtype):
+        self.block = block
+        pointer = ctypes.c_char.from_buffer(block.buf)
+        address = ctypes.addressof(pointer)
+        del pointer
+        self.__array_interface__ = {"shape": tuple(shape), "typestr": dtype.str,
+                                    "data": (address, True), "version": 3}
+
+
+class SharedArrays:
+    """
+    Owner of a set of numpy arrays copied into shared-memory blocks.
+    """
+    def __init__(self, arrays, meta=None):
+        """
+        Parameters:
+        - arrays (dict): {name: ndarray} to publish
+        - meta (dict): Small picklable metadata sent along with the descriptor
+        """
+        self._blocks = []
+        specs = {}
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            view = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+            view[...] = array
+            self._blocks.append(block)
+            specs[name] = {"shm": block.name, "shape": array.shape, "dtype": array.dtype.str}
+
+        self.descriptor = {"arrays": specs, "meta": dict(meta or {})}
+
+    def close(self):
+        """Releases and unlinks every block (call once the workers are done)."""
+        for block in self._blocks:
+            block.close()
+            try:
+                block.unlink()
+            except FileNotFoundError:
+                pass
+        self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def attach_arrays(descriptor):
+    """
+    Attaches to the blocks of a descriptor.
+
+    Parameters:
+    -----------
+    descriptor : dict
+        `SharedArrays.descriptor`.
+
+    Returns:
+    --------
+    arrays : dict
+        {name: read-only ndarray view}
+    blocks : list of SharedMemory
+        Handles that must stay referenced while the views are used.
+    """
+    arrays = {}
+    blocks = []
+    for name, spec in descriptor["arrays"].items():
+        block = _open_block(spec["shm"])
+        view = np.asarray(_BlockView(block, spec["shape"], np.dtype(spec["dtype"])))
+        arrays[name] = view
+        blocks.append(block)
+    return arrays, blocks
+
+
+def share_stack(obj):
+    """
+    Publishes a `HazardCurveStack`, `UHSStack` or `DisaggregationArray`.
+
+    Returns:
+    --------
+    SharedArrays
+        Owner of the blocks; pass its `descriptor` to the workers.
+    """
+    if isinstance(obj, HazardCurveStack):
+        arrays = {"lons": obj.lons, "lats": obj.lats, "imls": obj.imls, "poes": obj.poes}
+        meta = {"type": "HazardCurveStack", "kinds": obj.kinds, "imts": obj.imts,
+                "investigation_time": obj.investigation_time, "calc_id": obj.calc_id}
+    elif isinstance(obj, UHSStack):
+        arrays = {"lons": obj.lons, "lats": obj.lats, "poes": obj.poes,
+                  "periods": obj.periods, "sa": obj.sa}
+        meta = {"type": "UHSStack", "kinds": obj.kinds,
+                "investigation_time": obj.investigation_time, "calc_id": obj.calc_id}
+    elif isinstance(obj, DisaggregationArray):
+        arrays = {"poes": obj.poes, "imls": obj.imls, "values": obj.values}
+        meta = {"type": "DisaggregationArray", "kind": obj.kind, "imts": obj.imts,
+                "bins": obj.bins, "edges": obj.edges, "meta": obj.meta, "column": obj.column}
+    else:
+        raise TypeError(f"Cannot share objects of type {type(obj).__name__}.")
+    return SharedArrays(arrays, meta)
+
+
+def attach_stack(descriptor):
+    """
+    Rebuilds a shared stack in a worker process as read-only views.
+
+    Parameters:
+    -----------
+    descriptor : dict
+        Descriptor from `share_stack(...).descriptor`.
+
+    Returns:
+    --------
+    HazardCurveStack, UHSStack or DisaggregationArray
+        The block handles are kept on the object (`_shm_blocks`).
+    """
+    arrays, blocks = attach_arrays(descriptor)
+    meta = descriptor["meta"]
+    kind = meta.get("type")
+
+    if kind == "HazardCurveStack":
+        obj = HazardCurveStack(meta["kinds"], arrays["lons"], arrays["lats"],
+                               meta["imts"], arrays["imls"], arrays["poes"],
+                               meta.get("investigation_time"), meta.get("calc_id"))
+    elif kind == "UHSStack":
+        obj = UHSStack(meta["kinds"], arrays["lons"], arrays["lats"],
+                       arrays["poes"], arrays["periods"], arrays["sa"],
+                       meta.get("investigation_time"), meta.get("calc_id"))
+    elif kind == "DisaggregationArray":
+        obj = DisaggregationArray(meta["kind"], meta["imts"], arrays["poes"], arrays["imls"],
+                                  meta["bins"], meta["edges"], arrays["values"],
+                                  meta["meta"], meta["column"])
+    else:
+        raise ValueError(f"Unknown shared object type {kind}.")
+
+    obj._shm_blocks = blocks
+    return obj
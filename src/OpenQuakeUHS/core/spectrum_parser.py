@@ -16,12 +16,13 @@ The module parses this information and allows plotting the spectral curves for
 any probability of exceedance (PoE).
 """
 
-import pandas as pd
+import numpy as np
 import matplotlib.pyplot as plt
-import re
 from collections import defaultdict
 import os
 
+from OpenQuakeUHS.core.oq_csv import read_oq_csv
+
 class UHSCurves:
     """
     Stores spectral acceleration curves for multiple probabilities of exceedance (PoEs).
@@ -83,6 +84,7 @@ class UHSSpectrum:
         self.filename = os.path.basename(filepath)
         self.latitude = None
         self.longitude = None
+        self.investigation_time = None  # Years of the PoEs, from the file metadata
         self.mean = UHSCurves()  # Spectral data grouped by PoE
         self._read_csv()
 
@@ -91,32 +93,21 @@ class UHSSpectrum:
         Reads the CSV file and extracts:
         - Geographic location (longitude, latitude)
         - Spectral accelerations for each PoE and period
+        - Investigation time of the PoEs (None if the file does not state it)
         """
-        df = pd.read_csv(self.filepath, header=None)
-
-        header = df.iloc[1].tolist()  # 2nd row: headers
-        values = df.iloc[2].tolist()  # 3rd row: numerical data
-
-        self.longitude = float(values[0])
-        self.latitude = float(values[1])
-
-        for h, v in zip(header[2:], values[2:]):
-            text = str(h)
-            try:
-                value = float(v)
-            except ValueError:
-                continue  # skip non-numeric fields (e.g., metadata at the end)
-
-            # Match strings like '0.687~SA(0.1)' or '0.687~PGA'
-            match = re.match(r"([\d.]+)~(SA|PGA)(?:\(([\d.]+)\))?", text)
-            if match:
-                poe = float(match.group(1))
-                kind = match.group(2)
-                if kind == "PGA":
-                    period = 0.01  # Convention: PGA = SA(T=0.01s)
-                else:
-                    period = float(match.group(3))
-                self.mean.add_point(poe, period, value)
+        table = read_oq_csv(self.filepath)
+
+        investigation_time = table.meta.get("investigation_time")
+        if investigation_time is not None:
+            self.investigation_time = float(investigation_time)
+
+        self.longitude = float(table.column("lon")[0])
+        self.latitude = float(table.column("lat")[0])
+
+        # Columns like '0.687~SA(0.1)' or '0.687~PGA' (PGA = SA(T=0.01s) by convention)
+        for poe, period, value in zip(table.uhs_poes, table.uhs_periods, table.uhs_values[0]):
+            if not np.isnan(value):  # skip empty cells
+                self.mean.add_point(float(poe), float(period), float(value))
 
     def plot(self, poe, ax=None, label=None, color=None):
         
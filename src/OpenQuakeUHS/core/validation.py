@@ -0,0 +1,347 @@
+"""
+Data-quality Validation of Hazard Outputs
+Author: Ing. Patricio Palacios Msc.
+Date: October 19, 2026
+
+Description:
+------------
+Problems in the engine exports usually surface only as a wrong plot or as a
+'Skipping ...' message of the plotting functions. This module checks whole
+directories at once with array operations over the stacked outputs and
+returns one table of issues:
+
+Hazard curves (`HazardCurveStack`):
+- 'iml_grid': files of one IMT with a different intensity level grid
+- 'poe_range': PoEs outside [0, 1]
+- 'non_monotonic': PoE increasing with the intensity level
+- 'missing_levels': some levels of a curve missing
+- 'missing_curve': kind/IMT without values for a site
+
+UHS (`UHSStack`):
+- 'poe_range': PoE labels outside (0, 1)
+- 'negative_sa': negative spectral accelerations
+- 'missing_periods': periods missing for a PoE (dropped by `UHSCurves.T()`)
+- 'poe_order': Sa decreasing towards smaller PoEs
+
+Disaggregation (`DisaggregationArray`):
+- 'poe_range': contributions outside [0, 1]
+- 'disagg_total': 1 - prod(1 - p) over the bins far from the target PoE
+
+Every calculation (the calc_id of the filenames) is stacked and checked on
+its own. Files that cannot be read are reported as 'read_error'. Every row
+holds the check, its severity ('error' or 'warning'), where it happens
+(calc_id, output, kind, site, imt, poe), the number of affected values and a
+short detail.
+"""
+
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from OpenQuakeUHS.core.async_loader import read_files
+from OpenQuakeUHS.core.disaggregation_loader import (
+    list_disaggregation_files,
+    read_disaggregation_file,
+)
+from OpenQuakeUHS.core.hazard_stack import (
+    HazardCurveStackBuilder,
+    UHSStackBuilder,
+    group_by_calc,
+    parse_output_filename,
+    read_hazard_curve_file,
+    read_uhs_file,
+)
+
+ISSUE_COLUMNS = ["check", "severity", "calc_id", "output", "kind", "site", "lon", "lat",
+                 "imt", "poe", "n_values", "detail"]
+
+_CALC_ID = re.compile(r"_(\d+)\.csv$")
+
+
+def _issue_rows(mask, check, severity, output, labels, detail, counts=None):
+    """
+    Turns a boolean mask into issue rows.
+
+    Parameters:
+    - mask (ndarray): Flagged groups, one dimension per entry of `labels`
+    - labels (list of (column, values)): Column name and labels of each axis
+    - detail (callable): detail(index tuple) -> str
+    - counts (ndarray): Number of affected values per group (1 when omitted)
+    """
+    rows = []
+    for idx in zip(*np.nonzero(mask)):
+        row = {"check": check, "severity": severity, "output": output,
+               "n_values": 1 if counts is None else int(counts[idx])}
+        for (column, values), i in zip(labels, idx):
+            if column == "site":
+                row["site"], row["lon"], row["lat"] = int(i), values[0][i], values[1][i]
+            else:
+                row[column] = values[i]
+        row["detail"] = detail(idx)
+        rows.append(row)
+    return rows
+
+
+def issues_frame(rows):
+    """Returns the issue rows as a DataFrame with the `ISSUE_COLUMNS` layout."""
+    return pd.DataFrame(rows, columns=ISSUE_COLUMNS)
+
+
+def check_hazard_curve_stack(stack, monotonic_atol=1e-10):
+    """
+    Validates a `HazardCurveStack`.
+
+    Parameters:
+    -----------
+    stack : HazardCurveStack
+    monotonic_atol : float
+        PoE increase tolerated between consecutive levels.
+
+    Returns:
+    --------
+    list of dict
+        Issue rows (see `ISSUE_COLUMNS`).
+    """
+    poes = stack.poes  # (kind, site, imt, level)
+    sites = (stack.lons, stack.lats)
+    labels = [("kind", stack.kinds), ("site", sites), ("imt", stack.imts)]
+    levels = np.isfinite(stack.imls)[None, None]  # niveles definidos por IMT
+    present = np.isfinite(poes)
+    rows = []
+
+    bad = present & ((poes < 0) | (poes > 1))
+    count = bad.sum(axis=-1)
+    lo = np.where(present, poes, np.inf).min(axis=-1)
+    hi = np.where(present, poes, -np.inf).max(axis=-1)
+    rows += _issue_rows(count > 0, "poe_range", "error", "hazard_curve", labels,
+                        lambda i: f"PoE range [{lo[i]:.4g}, {hi[i]:.4g}]", count)
+
+    rise = np.diff(poes, axis=-1)
+    rising = np.isfinite(rise) & (rise > monotonic_atol)
+    count = rising.sum(axis=-1)
+    worst = np.where(rising, rise, 0.0).max(axis=-1)
+    rows += _issue_rows(count > 0, "non_monotonic", "error", "hazard_curve", labels,
+                        lambda i: f"PoE increases by up to {worst[i]:.4g}", count)
+
+    n_present = present.sum(axis=-1)
+    n_missing = (levels & ~present).sum(axis=-1)
+    rows += _issue_rows((n_present > 0) & (n_missing > 0), "missing_levels", "error",
+                        "hazard_curve", labels,
+                        lambda i: f"{n_missing[i]} of {n_missing[i] + n_present[i]} levels missing",
+                        n_missing)
+
+    # Curvas ausentes: kind/IMT presente en otros sitios pero no en este
+    loaded = (n_present > 0).any(axis=1, keepdims=True)
+    rows += _issue_rows(loaded & (n_present == 0), "missing_curve", "warning", "hazard_curve",
+                        labels, lambda i: "no values for this site")
+    return rows
+
+
+def check_uhs_stack(stack, order_rtol=1e-6):
+    """
+    Validates a `UHSStack`.
+
+    Parameters:
+    -----------
+    stack : UHSStack
+    order_rtol : float
+        Relative Sa decrease tolerated towards smaller PoEs.
+
+    Returns:
+    --------
+    list of dict
+        Issue rows (see `ISSUE_COLUMNS`).
+    """
+    sa = stack.sa  # (kind, site, poe, period); PoEs en orden descendente
+    sites = (stack.lons, stack.lats)
+    labels = [("kind", stack.kinds), ("site", sites), ("poe", stack.poes.tolist())]
+    present = np.isfinite(sa)
+    rows = []
+
+    bad_poe = (stack.poes <= 0) | (stack.poes >= 1)
+    rows += _issue_rows(bad_poe, "poe_range", "error", "hazard_uhs", [("poe", stack.poes.tolist())],
+                        lambda i: "PoE label outside (0, 1)")
+
+    negative = present & (sa < 0)
+    count = negative.sum(axis=-1)
+    rows += _issue_rows(count > 0, "negative_sa", "error", "hazard_uhs", labels,
+                        lambda i: f"{count[i]} negative Sa values", count)
+
+    n_present = present.sum(axis=-1)
+    n_missing = (~present).sum(axis=-1)
+    partial = (n_present > 0) & (n_missing > 0)
+    periods = stack.periods
+
+    def missing_detail(i):
+        gone = periods[~present[i]]
+        return "missing T = " + ", ".join(f"{t:g}" for t in gone[:10]) + (" ..." if len(gone) > 10 else "")
+
+    rows += _issue_rows(partial, "missing_periods", "warning", "hazard_uhs", labels,
+                        missing_detail, n_missing)
+
+    # Sa(PoE menor) >= Sa(PoE mayor) en cada periodo
+    drop = sa[:, :, :-1, :] - sa[:, :, 1:, :]
+    tol = order_rtol * np.abs(sa[:, :, :-1, :])
+    decreasing = np.isfinite(drop) & (drop > tol)
+    count = decreasing.sum(axis=-1)
+    order_labels = [("kind", stack.kinds), ("site", sites), ("poe", stack.poes[1:].tolist())]
+    rows += _issue_rows(count > 0, "poe_order", "error", "hazard_uhs", order_labels,
+                        lambda i: f"Sa lower than at PoE={stack.poes[i[2]]:g} at {count[i]} periods",
+                        count)
+    return rows
+
+
+def check_disaggregation(array, site=None, rtol=0.1):
+    """
+    Validates a `DisaggregationArray`.
+
+    Parameters:
+    -----------
+    array : DisaggregationArray
+    site : int, optional
+        Site id reported in the issue rows.
+    rtol : float
+        Relative tolerance between 1 - prod(1 - p) over the bins and the
+        target PoE. Mean disaggregations do not reproduce the target exactly
+        (a few percent is normal), so the default is loose.
+
+    Returns:
+    --------
+    list of dict
+        Issue rows (see `ISSUE_COLUMNS`).
+    """
+    values = array.values  # (imt, poe, *bins)
+    bins_axes = tuple(range(2, values.ndim))
+    labels = [("imt", array.imts), ("poe", array.poes.tolist())]
+    kind = f"{array.kind}:{array.column}"
+    rows = []
+
+    bad = np.isfinite(values) & ((values < 0) | (values > 1))
+    count = bad.sum(axis=bins_axes)
+    rows += _issue_rows(count > 0, "poe_range", "error", "disaggregation", labels,
+                        lambda i: f"{count[i]} contributions outside [0, 1]", count)
+
+    total = array.total()
+    off = ~np.isclose(total, array.poes[None, :], rtol=rtol, atol=0.0)
+    rows += _issue_rows(off, "disagg_total", "warning", "disaggregation", labels,
+                        lambda i: f"total {total[i]:.4g} vs target PoE {array.poes[i[1]]:g}")
+
+    for row in rows:
+        row["kind"] = kind
+        row["site"] = site
+        row["lon"] = array.meta.get("lon")
+        row["lat"] = array.meta.get("lat")
+    return rows
+
+
+def _read_error(path, output, error):
+    return {"check": "read_error", "severity": "error", "output": output, "n_values": 0,
+            "detail": f"{os.path.basename(path)}: {error}"}
+
+
+def _check_calc(files, output, reader, builder_class, max_in_flight, options):
+    """
+    Stacks and checks the files of one calculation. Hazard curve files
+    whose IML grid differs from the first file of their IMT are reported
+    as 'iml_grid' and left out of the stack.
+    """
+    rows = []
+    builder = builder_class()
+    grids = {}  # imt -> (archivo de referencia, niveles)
+    for path, parsed, error in read_files(files, reader, max_in_flight):
+        if error is not None:
+            rows.append(_read_error(path, output, error))
+            continue
+        if output == "hazard_curve":
+            imt = parse_output_filename(path)["imt"]
+            ref = grids.setdefault(imt, (path, parsed["imls"]))
+            if (len(ref[1]) != len(parsed["imls"])
+                    or not np.allclose(ref[1], parsed["imls"], rtol=1e-6)):
+                rows.append({"check": "iml_grid", "severity": "error", "output": output,
+                             "imt": imt, "n_values": len(parsed["imls"]),
+                             "detail": f"{os.path.basename(path)}: IML grid differs from "
+                                       f"{os.path.basename(ref[0])}"})
+                continue
+        try:
+            builder.add(path, parsed)
+        except ValueError as e:
+            rows.append(_read_error(path, output, e))
+
+    if not len(builder):
+        return rows
+    try:
+        stack = builder.build()
+    except ValueError as e:
+        rows.append(_read_error(os.path.dirname(files[0]), output, e))
+        return rows
+    if output == "hazard_curve":
+        rows += check_hazard_curve_stack(stack, options.get("monotonic_atol", 1e-10))
+    else:
+        rows += check_uhs_stack(stack, options.get("order_rtol", 1e-6))
+    return rows
+
+
+def validate_directory(folder_path, disagg_stat="mean", max_in_flight=32, **options):
+    """
+    Reads every hazard curve, UHS and disaggregation CSV under a folder and
+    runs all the checks, one calculation (calc_id) at a time.
+
+    Parameters:
+    -----------
+    folder_path : str
+        Folder searched recursively.
+    disagg_stat : str
+        Statistic of the disaggregation files to check (None to skip them).
+    max_in_flight : int
+        Number of files read concurrently.
+    **options :
+        Forwarded to the checks: monotonic_atol, order_rtol, rtol.
+
+    Returns:
+    --------
+    pandas.DataFrame
+        One row per issue (see `ISSUE_COLUMNS`), errors first.
+    """
+    curve_files, uhs_files, disagg_folders = [], [], set()
+    for root, _, files in os.walk(folder_path):
+        for name in sorted(files):
+            if not name.endswith(".csv"):
+                continue
+            info = parse_output_filename(name)
+            if info is None:
+                disagg_folders.add(root)
+            elif info["output"] == "hazard_curve":
+                curve_files.append(os.path.join(root, name))
+            else:
+                uhs_files.append(os.path.join(root, name))
+
+    rows = []
+    jobs = [("hazard_curve", curve_files, read_hazard_curve_file, HazardCurveStackBuilder),
+            ("hazard_uhs", uhs_files, read_uhs_file, UHSStackBuilder)]
+    for output, files, reader, builder_class in jobs:
+        for calc_id, calc_files in group_by_calc(files).items():
+            calc_rows = _check_calc(calc_files, output, reader, builder_class, max_in_flight, options)
+            for row in calc_rows:
+                row["calc_id"] = calc_id
+            rows += calc_rows
+
+    if disagg_stat is not None:
+        for folder in sorted(disagg_folders):
+            for site, files in list_disaggregation_files(folder, disagg_stat).items():
+                for kind, path in files.items():
+                    match = _CALC_ID.search(os.path.basename(path))
+                    try:
+                        array = read_disaggregation_file(path, kind)
+                    except Exception as e:
+                        file_rows = [_read_error(path, "disaggregation", e)]
+                    else:
+                        file_rows = check_disaggregation(array, site, options.get("rtol", 0.1))
+                    for row in file_rows:
+                        row["calc_id"] = int(match.group(1)) if match else None
+                    rows += file_rows
+
+    df = issues_frame(rows)
+    order = df["severity"].map({"error": 0, "warning": 1})
+    return df.assign(_order=order).sort_values("_order", kind="mergesort").drop(columns="_order").reset_index(drop=True)
@@ -0,0 +1,481 @@
+"""
+Watch Service for Incremental Ingestion of OpenQuake Exports
+Author: Ing. Patricio Palacios Msc.
+Date: October 19, 2026
+
+Description:
+------------
+This module watches a directory tree where new OpenQuake export folders are
+dropped and keeps an in-memory store of the parsed hazard curve and UHS
+files up to date:
+
+- New or changed CSV files are detected by (mtime, size) fingerprints,
+  through filesystem events when the optional `watchdog` package is
+  installed and by periodic polling otherwise (and as a safety net).
+- A file is ingested only after its fingerprint has been stable for
+  `debounce` seconds, so files still being written are not parsed.
+- Only the detected files are parsed, at most `max_queue` per cycle; the
+  rest wait for the next cycle (bounded work queue).
+- Files are grouped by calculation id: each calculation gets its own
+  stacks, and a change only rebuilds the stacks of the calculation (and
+  output type) it touched.
+- Subscribed callbacks run once per cycle, and only when the change touches
+  the outputs (output type, kind, IMT) they subscribed to.
+
+Typical usage:
+
+    service = WatchService("/shared/oq_exports")
+    service.subscribe(update_site_report, output="hazard_uhs", kinds=["mean"])
+    service.start()
+    ...
+    service.stop()
+"""
+
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from OpenQuakeUHS.core.hazard_stack import (
+    HazardCurveStackBuilder,
+    UHSStackBuilder,
+    parse_output_filename,
+    read_hazard_curve_file,
+    read_uhs_file,
+)
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # sin watchdog se usa solo el sondeo periódico
+    FileSystemEventHandler = object
+    Observer = None
+
+_READERS = {
+    "hazard_curve": read_hazard_curve_file,
+    "hazard_uhs": read_uhs_file,
+}
+
+
+def _fingerprint(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def scan_exports(root):
+    """
+    Returns the fingerprints of every hazard curve / UHS CSV under `root`.
+
+    Returns:
+    --------
+    dict
+        {path: (mtime_ns, size)}
+    """
+    found = {}
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            if not name.endswith(".csv"):
+                continue
+            info = parse_output_filename(name)
+            if info is None or info["output"] not in _READERS:
+                continue
+            path = os.path.join(dirpath, name)
+            fp = _fingerprint(path)
+            if fp is not None:
+                found[path] = fp
+    return found
+
+
+class HazardStore:
+    """
+    Parsed hazard curve and UHS files kept by path. Stacks are kept per
+    (calc_id, output) and rebuilt from the parsed arrays (never from disk),
+    only for the calculation and output type that changed.
+    """
+    def __init__(self, site_decimals=5):
+        """
+        Parameters:
+        - site_decimals (int): Decimals used to match site coordinates in the stacks
+        """
+        self.site_decimals = site_decimals
+        self._files = {}  # path -> (info, parsed)
+        self._stacks = {}  # (calc_id, output) -> stack
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._files)
+
+    @property
+    def paths(self):
+        """Paths currently held by the store."""
+        with self._lock:
+            return sorted(self._files)
+
+    @property
+    def calc_ids(self):
+        """Calculation ids of the stored files."""
+        with self._lock:
+            return sorted({info["calc_id"] for info, _ in self._files.values()})
+
+    def ingest(self, path):
+        """
+        Parses a file and stores (or replaces) its content.
+
+        Returns:
+        - dict: Output info of the file (see `parse_output_filename`)
+        """
+        info = parse_output_filename(path)
+        if info is None or info["output"] not in _READERS:
+            raise ValueError(f"{os.path.basename(path)} is not a hazard curve or UHS export.")
+        parsed = _READERS[info["output"]](path)
+        with self._lock:
+            previous = self._files.get(path)
+            self._files[path] = (info, parsed)
+            self._stacks.pop((info["calc_id"], info["output"]), None)
+            if previous is not None:
+                self._stacks.pop((previous[0]["calc_id"], previous[0]["output"]), None)
+        return info
+
+    def discard(self, path):
+        """
+        Removes a file from the store.
+
+        Returns:
+        - dict or None: Output info of the removed file
+        """
+        with self._lock:
+            entry = self._files.pop(path, None)
+            if entry is None:
+                return None
+            self._stacks.pop((entry[0]["calc_id"], entry[0]["output"]), None)
+            return entry[0]
+
+    def get(self, path):
+        """Returns the parsed content of a stored file (None if absent)."""
+        with self._lock:
+            entry = self._files.get(path)
+        return None if entry is None else entry[1]
+
+    def _stack(self, output, builder_class, calc_id):
+        with self._lock:
+            if calc_id is None:
+                calc_ids = sorted({info["calc_id"] for info, _ in self._files.values()
+                                   if info["output"] == output})
+                if len(calc_ids) > 1:
+                    raise ValueError(f"The store holds the calculations {calc_ids}; "
+                                     f"choose one with `calc_id`.")
+                if not calc_ids:
+                    return None
+                calc_id = calc_ids[0]
+
+            key = (calc_id, output)
+            if key not in self._stacks:
+                builder = builder_class(self.site_decimals)
+                for path, (info, parsed) in sorted(self._files.items()):
+                    if info["output"] == output and info["calc_id"] == calc_id:
+                        builder.add(path, parsed)
+                self._stacks[key] = builder.build() if len(builder) else None
+            return self._stacks[key]
+
+    def curve_stack(self, calc_id=None):
+        """
+        Returns the `HazardCurveStack` of the stored curves of one calculation
+        (None if empty). `calc_id` is required when several are stored.
+        """
+        return self._stack("hazard_curve", HazardCurveStackBuilder, calc_id)
+
+    def uhs_stack(self, calc_id=None):
+        """
+        Returns the `UHSStack` of the stored spectra of one calculation (None
+        if empty). `calc_id` is required when several are stored.
+        """
+        return self._stack("hazard_uhs", UHSStackBuilder, calc_id)
+
+
+class ChangeEvent:
+    """
+    Files ingested or removed in one cycle and the outputs and sites they touch.
+    """
+    def __init__(self):
+        self.added = []
+        self.modified = []
+        self.removed = []
+        self.errors = {}
+        self.outputs = set()  # {(output, kind, imt)}
+        self.calc_ids = set()
+        self._sites = {}
+
+    def _touch(self, info, parsed=None):
+        self.outputs.add((info["output"], info["kind"], info["imt"]))
+        self.calc_ids.add(info["calc_id"])
+        if parsed is not None:
+            for lon, lat in zip(parsed["lons"], parsed["lats"]):
+                self._sites[(round(float(lon), 5), round(float(lat), 5))] = None
+
+    @property
+    def sites(self):
+        """(lon, lat) pairs present in the ingested files."""
+        return list(self._sites)
+
+    @property
+    def paths(self):
+        """Every path that changed in the cycle."""
+        return self.added + self.modified + self.removed
+
+    def __bool__(self):
+        return bool(self.added or self.modified or self.removed or self.errors)
+
+    def __repr__(self):
+        return (f"ChangeEvent(added={len(self.added)}, modified={len(self.modified)}, "
+                f"removed={len(self.removed)}, errors={len(self.errors)})")
+
+
+class _Subscription:
+    def __init__(self, callback, output, kinds, imts):
+        self.callback = callback
+        self.output = output
+        self.kinds = None if kinds is None else set(kinds)
+        self.imts = None if imts is None else set(imts)
+
+    def matches(self, event):
+        for output, kind, imt in event.outputs:
+            if self.output is not None and output != self.output:
+                continue
+            if self.kinds is not None and kind not in self.kinds:
+                continue
+            if self.imts is not None and imt not in self.imts:
+                continue
+            return True
+        return False
+
+
+class _EventHandler(FileSystemEventHandler):
+    def __init__(self, service):
+        self.service = service
+
+    def on_any_event(self, event):
+        for attr in ("src_path", "dest_path"):
+            path = getattr(event, attr, None)
+            if path and str(path).endswith(".csv"):
+                self.service._hint(os.fsdecode(path))
+
+
+class WatchService:
+    """
+    Long-running watcher that ingests new or changed OpenQuake exports into
+    a `HazardStore` and notifies the subscribers of the affected outputs.
+    """
+    def __init__(self, root, store=None, poll_interval=5.0, debounce=2.0, max_queue=256,
+                 max_workers=8, use_watchdog=True, rescan_interval=60.0):
+        """
+        Parameters:
+        - root (str): Directory tree receiving the export folders
+        - store (HazardStore): Store to update (a new one when omitted)
+        - poll_interval (float): Seconds between cycles
+        - debounce (float): Seconds a file must stay unchanged before it is parsed
+        - max_queue (int): Maximum number of files parsed per cycle
+        - max_workers (int): Threads parsing files
+        - use_watchdog (bool): Use filesystem events when `watchdog` is installed
+        - rescan_interval (float): Seconds between full rescans when events are used
+        """
+        if max_queue < 1:
+            raise ValueError("max_queue must be at least 1.")
+        self.root = root
+        self.store = store if store is not None else HazardStore()
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.max_queue = max_queue
+        self.max_workers = max_workers
+        self.use_watchdog = use_watchdog and Observer is not None
+        self.rescan_interval = rescan_interval
+
+        self._known = {}    # path -> fingerprint ingerido
+        self._pending = {}  # path -> (fingerprint, desde cuándo es estable)
+        self._hints = set()
+        self._hint_lock = threading.Lock()
+        self._last_scan = None
+        self._subscriptions = []
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._observer = None
+
+    # --- Suscripciones ---
+    def subscribe(self, callback, output=None, kinds=None, imts=None):
+        """
+        Registers `callback(event, store)`, called after a cycle that touched
+        a matching output.
+
+        Parameters:
+        - callback (callable): Function receiving (ChangeEvent, HazardStore)
+        - output (str): 'hazard_curve' or 'hazard_uhs' (any when omitted)
+        - kinds (iterable of str): Kinds of interest, e.g. ['mean', 'quantile-0.84']
+        - imts (iterable of str): IMTs of interest (hazard curves only)
+        """
+        self._subscriptions.append(_Subscription(callback, output, kinds, imts))
+        return callback
+
+    def _hint(self, path):
+        with self._hint_lock:
+            self._hints.add(path)
+        self._wake.set()
+
+    # --- Detección de cambios ---
+    def _observed(self, now):
+        """Returns {path: fingerprint or None} of the files to look at."""
+        full = (not self.use_watchdog or self._last_scan is None
+                or now - self._last_scan >= self.rescan_interval)
+        with self._hint_lock:
+            hints, self._hints = self._hints, set()
+
+        if full:
+            self._last_scan = now
+            observed = scan_exports(self.root)
+            for path in set(self._known) | set(self._pending):
+                observed.setdefault(path, None)
+            return observed
+
+        observed = {}
+        for path in hints | set(self._pending):
+            info = parse_output_filename(path)
+            if info is not None and info["output"] in _READERS:
+                observed[path] = _fingerprint(path)
+        return observed
+
+    def _ready_files(self, now):
+        """
+        Updates the debounce state and returns (ready paths, removed paths).
+        """
+        ready, removed = [], []
+        for path, fp in self._observed(now).items():
+            if fp is None:
+                self._pending.pop(path, None)
+                if path in self._known:
+                    removed.append(path)
+                continue
+            if self._known.get(path) == fp:
+                self._pending.pop(path, None)
+                continue
+
+            previous = self._pending.get(path)
+            if previous is None or previous[0] != fp:
+                self._pending[path] = (fp, now)  # nuevo o aún escribiéndose
+            elif now - previous[1] >= self.debounce:
+                ready.append(path)
+
+        ready.sort(key=lambda p: self._pending[p][1])
+        return ready[:self.max_queue], removed
+
+    # --- Ciclo ---
+    def poll_once(self, now=None, executor=None):
+        """
+        Runs one detection / ingestion / notification cycle.
+
+        Parameters:
+        - now (float): Current time (time.monotonic() when omitted)
+        - executor (Executor): Executor parsing the files (a temporary thread pool when omitted)
+
+        Returns:
+        - ChangeEvent
+        """
+        now = time.monotonic() if now is None else now
+        ready, removed = self._ready_files(now)
+        event = ChangeEvent()
+
+        for path in removed:
+            info = self.store.discard(path)
+            self._known.pop(path, None)
+            event.removed.append(path)
+            if info is not None:
+                event._touch(info)
+
+        if ready:
+            fingerprints = {p: self._pending.pop(p)[0] for p in ready}
+            own_executor = executor is None
+            if own_executor:
+                executor = ThreadPoolExecutor(max_workers=min(self.max_workers, len(ready)))
+            try:
+                futures = {p: executor.submit(self.store.ingest, p) for p in ready}
+                for path, future in futures.items():
+                    try:
+                        info = future.result()
+                    except Exception as e:
+                        print(f"[watch] Skipping {path}: {e}")
+                        event.errors[path] = e
+                        self._known[path] = fingerprints[path]  # no reintentar hasta que cambie
+                        continue
+                    (event.modified if path in self._known else event.added).append(path)
+                    self._known[path] = fingerprints[path]
+                    event._touch(info, self.store.get(path))
+            finally:
+                if own_executor:
+                    executor.shutdown()
+
+        if event:
+            self._notify(event)
+        return event
+
+    def _notify(self, event):
+        for sub in self._subscriptions:
+            if not sub.matches(event):
+                continue
+            try:
+                sub.callback(event, self.store)
+            except Exception as e:
+                print(f"[watch] Callback {getattr(sub.callback, '__name__', sub.callback)} failed: {e}")
+
+    @property
+    def backlog(self):
+        """Number of detected files waiting for their debounce or a queue slot."""
+        return len(self._pending)
+
+    # --- Servicio en segundo plano ---
+    def _run(self):
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while not self._stop.is_set():
+                try:
+                    self.poll_once(executor=executor)
+                except Exception:
+                    # Un ciclo fallido no debe detener el hilo del servicio
+                    print(f"[watch] Cycle failed:\n{traceback.format_exc()}")
+                # Con archivos pendientes se revisa de nuevo tras el debounce
+                timeout = self.poll_interval
+                if self._pending:
+                    timeout = min(timeout, max(self.debounce, 0.05))
+                self._wake.wait(timeout)
+                self._wake.clear()
+
+    def start(self):
+        """Starts watching in a background thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        if self.use_watchdog:
+            self._observer = Observer()
+            self._observer.schedule(_EventHandler(self), self.root, recursive=True)
+            self._observer.start()
+        self._thread = threading.Thread(target=self._run, name="oq-watch", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stops the background thread (and the filesystem observer)."""
+        self._stop.set()
+        self._wake.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join(timeout)
+            self._observer = None
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
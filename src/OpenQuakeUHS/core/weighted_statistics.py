@@ -0,0 +1,61 @@
+"""
+Weighted Statistics over Realizations
+Author: Ing. Patricio Palacios Msc.
+Date: October 19, 2026
+
+Description:
+------------
+Statistics across logic-tree realizations weighted with the realization
+weights, shared by the core analyses (e.g. `realization_spread`) and the
+plotting tools (e.g. the percentile bands of `plot_realizations`).
+"""
+
+import numpy as np
+
+
+def weighted_percentiles(curves, percentiles, weights=None):
+    """
+    Percentiles across realizations at every abscissa, with OpenQuake's
+    quantile rule: the sorted values are interpolated linearly on the
+    cumulative weights. The same rule applies with equal weights.
+
+    Parameters:
+    -----------
+    curves : ndarray (n_rlz, n_x)
+        Realization values; np.nan entries are ignored.
+    percentiles : sequence of float
+        Percentiles in [0, 100].
+    weights : array-like (n_rlz,), optional
+        Logic-tree weights of the realizations (equal when omitted).
+
+    Returns:
+    --------
+    ndarray (n_percentiles, n_x)
+    """
+    curves = np.asarray(curves, dtype=float)
+    q = np.asarray(percentiles, dtype=float)[:, None] / 100.0
+    if weights is None:
+        weights = np.ones(curves.shape[0])
+
+    w = np.broadcast_to(np.asarray(weights, dtype=float)[:, None], curves.shape)
+    w = np.where(np.isnan(curves), 0.0, w)
+
+    order = np.argsort(curves, axis=0)  # los NaN quedan al final con peso 0
+    values = np.take_along_axis(curves, order, axis=0)
+    cum = np.cumsum(np.take_along_axis(w, order, axis=0), axis=0)
+    total = cum[-1]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cum = cum / total
+
+    # Primer valor cuyo peso acumulado alcanza el cuantil y su anterior
+    last = np.maximum(np.isfinite(curves).sum(axis=0) - 1, 0)
+    hi = np.minimum((cum[None] < q[:, :, None]).sum(axis=1), last)
+    lo = np.maximum(hi - 1, 0)
+    c_lo = np.take_along_axis(cum, lo, axis=0)
+    c_hi = np.take_along_axis(cum, hi, axis=0)
+    v_lo = np.take_along_axis(values, lo, axis=0)
+    v_hi = np.take_along_axis(values, hi, axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        frac = np.clip((q - c_lo) / (c_hi - c_lo), 0.0, 1.0)
+    out = np.where(hi > lo, v_lo + frac * (v_hi - v_lo), v_hi)
+    return np.where(total > 0, out, np.nan)
@@ -1,19 +1,22 @@
 import matplotlib.pyplot as plt
-import pandas as pd
 import os
 import re
 import numpy as np
 
+from OpenQuakeUHS.core.artifact_cache import artifact_key, resolve_cache
+from OpenQuakeUHS.core.oq_csv import read_oq_csv
+from OpenQuakeUHS.core.rate_conversion import poe_to_rate, read_investigation_time
+from OpenQuakeUHS.core.disaggregation_realizations import realization_file_weight, realization_weight_table
+from OpenQuakeUHS.tools.realization_lod import plot_realizations
+
 
 def calculate_inv_Tr_from_poes(poes, N=50):
+    """
+    Tasa anual de excedencia (1/Tr) para PoEs en N años, con la relación de
+    Poisson exacta 1/Tr = -ln(1 - PoE) / N. PoEs fuera de (0, 1) -> np.nan.
+    """
     poes = np.asarray(poes, dtype=float)
-    inv_Tr = np.zeros_like(poes)
-    for i, pi in enumerate(poes):
-        if pi <= 0 or pi >= 1:
-            inv_Tr[i] = np.nan
-        else:
-            inv_Tr[i] = 1 - (1 - pi) ** (1 / N)
-    return inv_Tr
+    return np.where((poes > 0) & (poes < 1), poe_to_rate(poes, N), np.nan)
 
 
 def interpolate_sa_at_reference(y_values, sa_values, ref):
@@ -50,8 +53,49 @@ def interpolate_sa_at_reference(y_values, sa_values, ref):
 
 
 
-def plot_mean_and_rlz_hazard_curves(mean_files, rlz_files=None, periods=None, title=None, reference_value=None, save_path=None , PRY_name='PRY'):
-    investigation_time = 50
+def plot_mean_and_rlz_hazard_curves(mean_files, rlz_files=None, periods=None, title=None, reference_value=None, save_path=None , PRY_name='PRY',
+                                    investigation_time=None, rlz_mode='auto', rlz_threshold=200, cache=False,
+                                    realizations=None):
+    """
+    Grafica las curvas de amenaza medias (PoE y tasa anual vs Sa) junto con
+    las realizaciones. Las realizaciones de cada IMT se dibujan con
+    `plot_realizations`: líneas individuales hasta `rlz_threshold` curvas y
+    bandas de percentiles por encima (rlz_mode='auto'), o el modo indicado
+    ('lines', 'bands', 'density', 'representative'). Las bandas se ponderan
+    con los pesos de `realizations` (ruta o tabla de 'realizations_<calc_id>.csv',
+    buscada junto a los archivos rlz si se omite; pesos iguales si no existe).
+
+    Con `save_path` y `cache` (True para la caché por defecto o un
+    `ArtifactCache`) una llamada con los mismos archivos y parámetros
+    restaura los archivos guardados y retorna sin leer los CSV ni dibujar
+    (tampoco imprime los valores de diseño). Retorna las rutas guardadas.
+    """
+    rlz_files = list(rlz_files or [])
+    rlz_table = realization_weight_table(rlz_files, realizations)
+
+    # --- Caché de figuras ---
+    outputs = [f"{save_path}_hazardcurves_PoE.svg", f"{save_path}_hazardCurves_PoE.pdf",
+               f"{save_path}_hazardcurves_AnualExcedence.svg", f"{save_path}_hazardcurves_AnualExcedence.pdf"]
+    cache = resolve_cache(cache) if save_path else None
+    if cache is not None:
+        key = artifact_key(
+            "plot_mean_and_rlz_hazard_curves",
+            list(mean_files) + list(rlz_files or []),
+            {"periods": None if periods is None else list(periods), "title": title,
+             "reference_value": None if reference_value is None else list(reference_value),
+             "PRY_name": PRY_name, "investigation_time": investigation_time,
+             "rlz_mode": rlz_mode, "rlz_threshold": rlz_threshold,
+             "rlz_weights": None if rlz_table is None else rlz_table.to_dict()},
+        )
+        if cache.restore_files(key, outputs):
+            print(f"Figures restored from cache to {save_path}_hazardcurves_*.(svg/pdf)")
+            return outputs
+
+    # Tiempo de investigación tomado de los metadatos del primer archivo medio
+    if investigation_time is None:
+        if not mean_files:
+            raise ValueError("investigation_time is required when no mean files are given.")
+        investigation_time = read_investigation_time(mean_files[0])
     lat, lon = None, None
     rlz_labeled = False
 
@@ -62,6 +106,7 @@ def plot_mean_and_rlz_hazard_curves(mean_files, rlz_files=None, periods=None, ti
         f"PRY: {PRY_name}\n© 2025 - Patricio Palacios B.",
         ha='right', va='top', fontsize=9, color='gray', style='italic', multialignment='right'
     )
+    rlz_groups = {}  # (IMT, niveles de Sa) -> (PoEs, peso) de cada realización
     if rlz_files:
         for f in rlz_files:
             try:
@@ -79,17 +124,25 @@ def plot_mean_and_rlz_hazard_curves(mean_files, rlz_files=None, periods=None, ti
                     elif not is_pga and T not in periods:
                         continue
 
-                df = pd.read_csv(f, header=None)
-                sa = df.iloc[1, 3:].astype(str).str.replace("poe-", "", regex=False).astype(float)
-                poes = df.iloc[2, 3:].astype(float)
+                table = read_oq_csv(f)
+                sa, poes = table.imls, table.poes[0]
 
-                label = "All rlz" if not rlz_labeled else None
-                ax1.plot(sa, poes, color="lightgray", linewidth=0.8, label=label)
-                rlz_labeled = True
+                weight = realization_file_weight(f, rlz_table)
+                imt = "PGA" if is_pga else f"SA({T})"
+                rlz_groups.setdefault((imt, tuple(sa)), []).append((poes, weight))
 
             except Exception as e:
                 print(f"[rlz - PoE] Skipping {f}: {e}")
 
+    # El umbral de líneas/bandas se aplica a las realizaciones de cada IMT
+    for (imt, sa), group in rlz_groups.items():
+        curves = np.array([c for c, _ in group])
+        weights = np.array([w for _, w in group])
+        plot_realizations(ax1, np.array(sa), curves, mode=rlz_mode, threshold=rlz_threshold,
+                          weights=weights, label="All rlz" if not rlz_labeled else None,
+                          xscale="linear", yscale="log")
+        rlz_labeled = True
+
     print("\n--- Interpolación Sa vs PoE ---")
     for f in mean_files:
         try:
@@ -107,12 +160,11 @@ def plot_mean_and_rlz_hazard_curves(mean_files, rlz_files=None, periods=None, ti
                 elif not is_pga and T not in periods:
                     continue
 
-            df = pd.read_csv(f, header=None)
-            sa = df.iloc[1, 3:].astype(str).str.replace("poe-", "", regex=False).astype(float)
-            poes = df.iloc[2, 3:].astype(float)
+            table = read_oq_csv(f)
+            sa, poes = table.imls, table.poes[0]
 
-            lon = float(df.iloc[2, 0])
-            lat = float(df.iloc[2, 1])
+            lon = float(table.column("lon")[0])
+            lat = float(table.column("lat")[0])
             label = "PGA" if is_pga else f"SA({T:.2f})"
 
             ax1.plot(sa, poes, '-o' if is_pga else '-', linewidth=1.8 if is_pga else 1.5,
@@ -137,7 +189,7 @@ def plot_mean_and_rlz_hazard_curves(mean_files, rlz_files=None, periods=None, ti
     ax1.set_xlim(0.01, 2.0)
     ax1.set_ylim(1e-4, 1.0)
     ax1.set_xlabel("Spectral Acceleration [g]", fontweight="bold")
-    ax1.set_ylabel("PoE in 50y", fontweight="bold")
+    ax1.set_ylabel(f"PoE in {investigation_time:g}y", fontweight="bold")
     ax1.grid(True, which="both", linestyle="--", alpha=0.5)
     ax1.legend(loc='center left', bbox_to_anchor=(1.0, 0.5), fontsize=9)
     fig1.subplots_adjust(right=0.75)
@@ -182,9 +234,8 @@ def plot_mean_and_rlz_hazard_curves(mean_files, rlz_files=None, periods=None, ti
                 elif not is_pga and T not in periods:
                     continue
 
-            df = pd.read_csv(f, header=None)
-            sa = df.iloc[1, 3:].astype(str).str.replace("poe-", "", regex=False).astype(float)
-            poes = df.iloc[2, 3:].astype(float)
+            table = read_oq_csv(f)
+            sa, poes = table.imls, table.poes[0]
             inv_Tr = calculate_inv_Tr_from_poes(poes, N=investigation_time)
             label = "PGA" if is_pga else f"SA({T:.2f})"
 
@@ -230,6 +281,9 @@ def plot_mean_and_rlz_hazard_curves(mean_files, rlz_files=None, periods=None, ti
         fig2.savefig(f"{save_path}_hazardcurves_AnualExcedence.svg", format="svg", bbox_inches="tight")
         fig2.savefig(f"{save_path}_hazardcurves_AnualExcedence.pdf", format="pdf", bbox_inches="tight")
         print(f"Figures saved to {save_path}_linear.(svg/pdf) and {save_path}_log.(svg/pdf)")
+        if cache is not None:
+            cache.store_files(key, outputs)
+        return outputs
 
     else:
         plt.show()
\ No newline at end of file
@@ -0,0 +1,225 @@
+"""
+Level-of-detail Rendering of Realization Curves
+Author: Ing. Patricio Palacios Msc.
+Date: October 19, 2026
+
+Description:
+------------
+Logic trees with thousands of branches produce thousands of realization
+curves. Drawing each one as a line dominates the render time and bloats the
+SVG/PDF output without adding information. This module summarizes the
+realization tensor curves[rlz, x] (hazard curves over the IMLs, or spectra
+over the periods) with vectorized reductions and draws the summary instead:
+
+- 'lines': every realization (small logic trees)
+- 'bands': weighted percentile bands plus the median
+- 'density': 2D raster with the share of realizations crossing each cell
+- 'representative': a few realizations spread over the ensemble
+
+With mode='auto' the raw lines are kept up to `threshold` realizations and
+the percentile bands are used above it.
+"""
+
+import numpy as np
+
+from OpenQuakeUHS.core.weighted_statistics import weighted_percentiles
+
+LOD_MODES = ("lines", "bands", "density", "representative")
+
+
+def choose_lod_mode(n_curves, mode="auto", threshold=200):
+    """
+    Resolves the rendering mode for a number of realization curves.
+
+    Parameters:
+    -----------
+    n_curves : int
+        Number of realizations.
+    mode : str
+        'auto' or one of `LOD_MODES`.
+    threshold : int
+        Largest number of realizations drawn as raw lines in 'auto' mode.
+
+    Returns:
+    --------
+    str
+    """
+    if mode == "auto":
+        return "lines" if n_curves <= threshold else "bands"
+    if mode not in LOD_MODES:
+        raise ValueError(f"Unknown level-of-detail mode {mode}; use 'auto' or one of {LOD_MODES}.")
+    return mode
+
+
+def representative_curves(curves, n=10):
+    """
+    Picks realizations spread evenly over the ensemble, ranked by their mean
+    log value (curves closest to the 1/(n+1), ..., n/(n+1) ranks).
+
+    Parameters:
+    -----------
+    curves : ndarray (n_rlz, n_x)
+    n : int
+        Number of curves to keep.
+
+    Returns:
+    --------
+    ndarray of int
+        Indices of the selected realizations.
+    """
+    curves = np.asarray(curves, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        logs = np.where(curves > 0, np.log(curves), np.nan)
+    score = np.nanmean(logs, axis=1)
+    valid = np.flatnonzero(np.isfinite(score))
+    if len(valid) <= n:
+        return valid
+
+    ranked = valid[np.argsort(score[valid], kind="mergesort")]
+    picks = np.round(np.linspace(0, len(ranked) - 1, n + 2)[1:-1]).astype(int)
+    return ranked[np.unique(picks)]
+
+
+def _to_scale(values, scale):
+    if scale == "log":
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(values > 0, np.log10(values), np.nan)
+    return np.asarray(values, dtype=float)
+
+
+def _from_scale(values, scale):
+    return 10.0 ** values if scale == "log" else values
+
+
+def density_raster(x, curves, bins=(200, 150), xscale="log", yscale="log",
+                   weights=None, samples_per_segment=8):
+    """
+    Rasterizes realization curves into a 2D grid. Each curve is densified
+    between its points (linearly in the plotting scales) so steep segments
+    also fill the cells they cross. Each column is normalized to the share
+    of realizations passing through it.
+
+    Parameters:
+    -----------
+    x : array-like (n_x,)
+        Common abscissas of the curves.
+    curves : ndarray (n_rlz, n_x)
+    bins : tuple of int
+        Number of cells along x and y.
+    xscale, yscale : str
+        'log' or 'linear', the scales of the target axes.
+    weights : array-like (n_rlz,), optional
+        Logic-tree weights of the realizations.
+    samples_per_segment : int
+        Points sampled along every curve segment.
+
+    Returns:
+    --------
+    x_edges : ndarray (bins[0] + 1,)
+    y_edges : ndarray (bins[1] + 1,)
+    density : ndarray (bins[1], bins[0])
+        Share of weight per cell, np.nan where no curve passes.
+    """
+    curves = np.asarray(curves, dtype=float)
+    sx = _to_scale(np.asarray(x, dtype=float), xscale)
+    sy = _to_scale(curves, yscale)
+    w = np.ones(len(curves)) if weights is None else np.asarray(weights, dtype=float)
+
+    t = np.linspace(0.0, 1.0, samples_per_segment, endpoint=False)
+    px = (sx[:-1, None] + t * np.diff(sx)[:, None]).ravel()
+    py = (sy[:, :-1, None] + t * np.diff(sy, axis=1)[:, :, None]).reshape(len(curves), -1)
+    px = np.append(px, sx[-1])
+    py = np.concatenate([py, sy[:, -1:]], axis=1)
+    pw = np.broadcast_to(w[:, None], py.shape)
+
+    ok = np.isfinite(py) & np.isfinite(px)[None, :]
+    px_all = np.broadcast_to(px, py.shape)[ok]
+    if not ok.any():
+        raise ValueError("No finite curve values to rasterize.")
+
+    x_edges = np.linspace(np.nanmin(px), np.nanmax(px), bins[0] + 1)
+    y_edges = np.linspace(py[ok].min(), py[ok].max(), bins[1] + 1)
+    hist, _, _ = np.histogram2d(px_all, py[ok], bins=(x_edges, y_edges), weights=pw[ok])
+
+    column = hist.sum(axis=1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        density = np.where(hist > 0, hist / column, np.nan).T
+
+    return _from_scale(x_edges, xscale), _from_scale(y_edges, yscale), density
+
+
+def plot_realizations(ax, x, curves, mode="auto", threshold=200, weights=None,
+                      label="All rlz", color="lightgray", linestyle="-", linewidth=0.8,
+                      percentiles=(5, 25, 50, 75, 95), n_representative=10,
+                      xscale="log", yscale="log", cmap="Greys"):
+    """
+    Draws a realization ensemble with the level of detail chosen by `mode`.
+
+    Parameters:
+    -----------
+    ax : matplotlib.axes.Axes
+        Target axis.
+    x : array-like (n_x,)
+        Common abscissas of the curves (IMLs or periods).
+    curves : ndarray (n_rlz, n_x)
+        Realization values (PoEs or Sa).
+    mode : str
+        'auto' or one of `LOD_MODES`.
+    threshold : int
+        Largest number of realizations drawn as raw lines in 'auto' mode.
+    weights : array-like (n_rlz,), optional
+        Logic-tree weights used by the bands and the raster.
+    label : str
+        Legend label of the ensemble (None to omit it).
+    color, linestyle, linewidth :
+        Style of the lines and bands.
+    percentiles : sequence of float
+        Percentiles of the bands; drawn as nested pairs around the median.
+    n_representative : int
+        Number of curves in 'representative' mode.
+    xscale, yscale : str
+        Scales of `ax`, used by the density raster.
+    cmap : str
+        Colormap of the density raster.
+
+    Returns:
+    --------
+    str
+        The mode that was drawn.
+    """
+    x = np.asarray(x, dtype=float)
+    curves = np.atleast_2d(np.asarray(curves, dtype=float))
+    mode = choose_lod_mode(len(curves), mode, threshold)
+    style = {"color": color, "linestyle": linestyle, "linewidth": linewidth}
+
+    if mode == "lines" or mode == "representative":
+        if mode == "representative":
+            curves = curves[representative_curves(curves, n_representative)]
+            label = f"{label} ({len(curves)} representative)" if label else None
+        # Una sola llamada: matplotlib crea las líneas desde las columnas
+        lines = ax.plot(x, curves.T, **style)
+        if lines and label:
+            lines[0].set_label(label)
+
+    elif mode == "bands":
+        pct = sorted(percentiles)
+        values = weighted_percentiles(curves, pct, weights)
+        n_pairs = len(pct) // 2
+        for k in range(n_pairs):
+            alpha = 0.25 + 0.35 * k / max(n_pairs - 1, 1)
+            ax.fill_between(x, values[k], values[-1 - k], color=color, alpha=alpha, linewidth=0,
+                            label=f"{label} P{pct[k]:g}-P{pct[-1 - k]:g}" if label else None)
+        if len(pct) % 2:
+            ax.plot(x, values[n_pairs], **dict(style, color="gray"),
+                    label=f"{label} P{pct[n_pairs]:g}" if label else None)
+
+    else:
+        x_edges, y_edges, density = density_raster(x, curves, xscale=xscale, yscale=yscale,
+                                                   weights=weights)
+        ax.pcolormesh(x_edges, y_edges, density, cmap=cmap, shading="flat",
+                      rasterized=True, zorder=0)
+        if label:
+            ax.plot([], [], color="gray", linewidth=4, alpha=0.6,
+                    label=f"{label} (density, n={len(curves)})")
+
+    return mode
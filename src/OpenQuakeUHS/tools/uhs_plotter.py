@@ -1,19 +1,54 @@
 import matplotlib.pyplot as plt
 import os
 import re
+import numpy as np
+from OpenQuakeUHS.core.artifact_cache import artifact_key, resolve_cache
+from OpenQuakeUHS.core.disaggregation_realizations import realization_file_weight, realization_weight_table
 from OpenQuakeUHS.core.spectrum_parser import UHSSpectrum
+from OpenQuakeUHS.tools.realization_lod import plot_realizations
 
-def plot_uhs_sets(mean_files, quantile_files=None, rlz_files=None, poe=[0.687], PRY_name='PRY', title=None , save_path=None):
+def plot_uhs_sets(mean_files, quantile_files=None, rlz_files=None, poe=[0.687], PRY_name='PRY', title=None , save_path=None,
+                  rlz_mode='auto', rlz_threshold=200, cache=False, realizations=None):
     """
     Plots UHS spectra for multiple PoEs in a single figure:
-    - Realizations: dashed gray lines, labeled once per PoE
+    - Realizations: dashed gray lines, labeled once per PoE. Above
+      `rlz_threshold` realizations they are summarized as percentile bands
+      (rlz_mode='auto'); rlz_mode can also force 'lines', 'bands', 'density'
+      or 'representative' (see `realization_lod.plot_realizations`). Bands
+      are weighted with `realizations` ('realizations_<calc_id>.csv' path or
+      table, searched next to the rlz files when omitted; equal weights when
+      there is none)
     - Quantiles: dashed lines with legend including quantile and PoE
     - Mean: solid line with legend showing PGA and PoE
 
     Includes:
     - One figure with linear X scale
     - One figure with log X scale
+
+    When `save_path` and `cache` (True for the default cache, or an
+    `ArtifactCache`) are given, a call with the same input files and
+    parameters restores the saved files and returns without reading the
+    CSV files or drawing the figures. Returns the saved file paths.
     """
+    rlz_files = list(rlz_files or [])
+    rlz_table = realization_weight_table(rlz_files, realizations)
+
+    # --- Caché de figuras ---
+    outputs = [f"{save_path}_linear.svg", f"{save_path}_linear.pdf",
+               f"{save_path}_log.svg", f"{save_path}_log.pdf"]
+    cache = resolve_cache(cache) if save_path else None
+    if cache is not None:
+        key = artifact_key(
+            "plot_uhs_sets",
+            list(mean_files) + list(quantile_files or []) + rlz_files,
+            {"poe": list(poe), "PRY_name": PRY_name, "title": title,
+             "rlz_mode": rlz_mode, "rlz_threshold": rlz_threshold,
+             "rlz_weights": None if rlz_table is None else rlz_table.to_dict()},
+        )
+        if cache.restore_files(key, outputs):
+            print(f"Figures restored from cache to {save_path}_linear.(svg/pdf) and {save_path}_log.(svg/pdf)")
+            return outputs
+
     fig, ax = plt.subplots(figsize=(6, 4))
     
     fig_log, ax_log = plt.subplots(figsize=(6, 4))
@@ -31,27 +66,35 @@ def plot_uhs_sets(mean_files, quantile_files=None, rlz_files=None, poe=[0.687],
         f"PRY: {PRY_name}\n© 2025 - Patricio Palacios B.",
         ha='right', va='top', fontsize=9, color='gray', style='italic', multialignment='right'
     )
-
-
-
+    # Las realizaciones se leen una sola vez para todas las PoEs
+    rlz_spectra = []
+    for f in rlz_files:
+        try:
+            weight = realization_file_weight(f, rlz_table)
+            rlz_spectra.append((UHSSpectrum(f), weight))
+        except Exception as e:
+            print(f"[rlz] Skipping {f}: {e}")
 
     for p in poe:
         rlz_plotted = False
 
         # --- Realizaciones ---
-        if rlz_files is not None:
-            for f in rlz_files:
-                try:
-                    uhs = UHSSpectrum(f)
-                    T = uhs.mean.T()
-                    Sa = uhs.mean.Sa(p)
-                    label = f"All realizations (PoE={p})" if not rlz_plotted else None
-                    ax.plot(T, Sa, color="lightgray", linestyle="--", linewidth=0.8, label=label)
-                    ax_log.plot(T, Sa, color="lightgray", linestyle="--", linewidth=0.8, label=label)
-                    ymax = max(ymax, max(Sa))
-                    rlz_plotted = True
-                except Exception as e:
-                    print(f"[rlz] Skipping {f}: {e}")
+        groups = {}  # periodos -> (Sa, peso) de cada realización
+        for uhs, weight in rlz_spectra:
+            try:
+                groups.setdefault(tuple(uhs.mean.T()), []).append((uhs.mean.Sa(p), weight))
+            except Exception as e:
+                print(f"[rlz] Skipping {uhs.filename}: {e}")
+
+        for T, group in groups.items():
+            curves = np.array([c for c, _ in group])
+            label = f"All realizations (PoE={p})" if not rlz_plotted else None
+            style = dict(mode=rlz_mode, threshold=rlz_threshold, label=label, linestyle="--",
+                         yscale="linear", weights=np.array([w for _, w in group]))
+            plot_realizations(ax, np.array(T), curves, xscale="linear", **style)
+            plot_realizations(ax_log, np.array(T), curves, xscale="log", **style)
+            ymax = max(ymax, np.nanmax(curves))
+            rlz_plotted = True
 
         # --- Cuantiles ---
         if quantile_files is not None:
@@ -139,6 +182,9 @@ def plot_uhs_sets(mean_files, quantile_files=None, rlz_files=None, poe=[0.687],
         fig_log.savefig(f"{save_path}_log.svg", format="svg", bbox_inches="tight")
         fig_log.savefig(f"{save_path}_log.pdf", format="pdf", bbox_inches="tight")
         print(f"Figures saved to {save_path}_linear.(svg/pdf) and {save_path}_log.(svg/pdf)")
+        if cache is not None:
+            cache.store_files(key, outputs)
+        return outputs
 
     else:
         plt.show()
\ No newline at end of file
@@ -1,8 +1,9 @@
 import pandas as pd
+from OpenQuakeUHS.core.artifact_cache import artifact_key, resolve_cache
 from OpenQuakeUHS.core.spectrum_parser import UHSSpectrum
 import re
 
-def generate_uhs_table(mean_file, quantile_files, poe=0.1):
+def generate_uhs_table(mean_file, quantile_files, poe=0.1, cache=False):
     """
     Generate a table of spectral acceleration for a given PoE, combining
     mean and quantile spectra into a single DataFrame.
@@ -15,12 +16,22 @@ def generate_uhs_table(mean_file, quantile_files, poe=0.1):
         List of paths to quantile CSV files (e.g., q16, q50, q84).
     poe : float
         Probability of exceedance to extract.
+    cache : ArtifactCache or bool, optional
+        Artifact cache (True for the default one; disabled by default).
+        Tables of unchanged files and PoE are returned from the cache.
 
     Returns:
     --------
     df : pandas.DataFrame
         Table with columns: 'T', 'mean', 'q16', 'q50', 'q84'
     """
+    cache = resolve_cache(cache)
+    if cache is not None:
+        key = artifact_key("generate_uhs_table", [mean_file] + list(quantile_files), {"poe": poe})
+        df = cache.load_table(key)
+        if df is not None:
+            return df
+
     # Inicializar tabla con periodo y mean
     mean_uhs = UHSSpectrum(mean_file)
     T = mean_uhs.mean.T()
@@ -41,4 +52,6 @@ def generate_uhs_table(mean_file, quantile_files, poe=0.1):
 
     # Crear DataFrame
     df = pd.DataFrame(data)
+    if cache is not None:
+        cache.store_table(key, df)
     return df
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# El paquete vive en src/ (setup.py con package_dir); sin `pip install -e .`
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                    "src", "OpenQuakeUHS", "examples", "data")
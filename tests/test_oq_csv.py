@@ -0,0 +1,39 @@
+import os
+
+import numpy as np
+
+from OpenQuakeUHS.core.oq_csv import read_oq_csv
+from OpenQuakeUHS.core.spectrum_parser import UHSSpectrum
+
+from conftest import DATA
+
+UHS_MEAN = os.path.join(DATA, "uhs", "hazard_uhs-mean_18.csv")
+
+
+def _with_empty_cell(tmp_path, column):
+    lines = open(UHS_MEAN, encoding="utf-8").read().split("\n")
+    cells = lines[2].split(",")
+    cells[column] = ""
+    lines[2] = ",".join(cells)
+    path = tmp_path / "hazard_uhs-mean_18.csv"
+    path.write_text("\n".join(lines), encoding="utf-8")
+    return str(path)
+
+
+def test_empty_cell_in_the_middle_of_a_row_is_read_as_nan(tmp_path):
+    reference = read_oq_csv(UHS_MEAN)
+    table = read_oq_csv(_with_empty_cell(tmp_path, 5))
+
+    assert table.data.shape == reference.data.shape
+    assert np.isnan(table.data[0, 5])
+    others = np.arange(table.data.shape[1]) != 5
+    np.testing.assert_array_equal(table.data[0, others], reference.data[0, others])
+
+
+def test_uhs_spectrum_skips_the_empty_cell(tmp_path):
+    reference = UHSSpectrum(UHS_MEAN).mean
+    spectrum = UHSSpectrum(_with_empty_cell(tmp_path, 5)).mean
+
+    poe = max(reference.data)
+    assert len(spectrum.T()) == len(reference.T()) - 1
+    assert np.all(np.isfinite(spectrum.Sa(poe)))